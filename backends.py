@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import heapq
+import itertools
+import threading
+from config import PLAYER_BACKEND, SIM_SPEED, SIM_DURATION, SIM_OPEN_DELAY
+
+# 播放器状态 (与 libvlc 的 State 取值一致，上层直接比较整数)
+NOTHING, OPENING, BUFFERING, PLAYING, PAUSED, STOPPED, ENDED, ERROR = range(8)
+
+class VlcBackend:
+    """libvlc 播放后端：播放器即 vlc.MediaPlayer"""
+    name = "vlc"
+    # VLC 启动参数优化
+    # --file-caching=300: 将本地缓存降为 300ms，极大减少操作延迟
+    # --network-caching=1000: 网络流保持 1s 缓存
+    ARGS = (
+        "--no-xlib --no-osd --quiet "
+        "--avcodec-hw=any "
+        "--file-caching=300 "
+        "--network-caching=1000 "
+        "--clock-jitter=0 --clock-synchro=0 "
+        "--mmdevice-passthrough=disabled "
+    )
+
+    def __init__(self):
+        import vlc
+        self.vlc = vlc
+        try:
+            self.instance = vlc.Instance(self.ARGS)
+            if self.instance is None: raise Exception("VLC Init Failed")
+        except Exception as e:
+            print(f"VLC Init Error: {e}, using fallback mode.")
+            self.instance = vlc.Instance("--no-xlib --quiet")
+
+    def new_player(self): return self.instance.media_player_new()
+
+    def load(self, p, path, paused=False):
+        media = self.instance.media_new(os.path.abspath(path))
+        if paused: media.add_option(':start-paused')
+        p.set_media(media)
+
+    def bind(self, p, frame):
+        if not frame: return
+        if sys.platform.startswith('win'): p.set_hwnd(frame.winfo_id())
+        elif sys.platform.startswith('linux'): p.set_xwindow(frame.winfo_id())
+
+    def watch(self, p, on_end, on_playing):
+        em = p.event_manager()
+        em.event_attach(self.vlc.EventType.MediaPlayerEndReached, lambda e: on_end(p))
+        em.event_attach(self.vlc.EventType.MediaPlayerPlaying, lambda e: on_playing(p))
+
+    def sleep(self, s): time.sleep(s)
+
+class SimClock:
+    """虚拟时钟：按 speed 倍速流逝；单线程按到期顺序触发定时回调 (相当于 VLC 的事件线程)"""
+    def __init__(self, speed=1.0):
+        self.speed = max(0.001, float(speed))
+        self._r0 = time.monotonic()
+        self._heap = []; self._seq = itertools.count()
+        self._cond = threading.Condition()
+        threading.Thread(target=self._run, daemon=True, name="sim-clock").start()
+
+    def now(self):
+        """虚拟秒"""
+        return (time.monotonic() - self._r0) * self.speed
+
+    def at(self, t, fn):
+        with self._cond:
+            heapq.heappush(self._heap, (t, next(self._seq), fn)); self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap: self._cond.wait()
+                t, _, fn = self._heap[0]; left = (t - self.now()) / self.speed
+                if left > 0: self._cond.wait(left); continue
+                heapq.heappop(self._heap)
+            try: fn()
+            except Exception as e: print(f"Sim Clock Error: {e}")
+
+class SimPlayer:
+    """模拟播放器：实现上层用到的 MediaPlayer 接口；打开 -> 播放 -> 结束，按虚拟时钟推进"""
+    def __init__(self, backend):
+        self.b = backend; self.clock = backend.clock
+        self.path = None; self.length = 0; self.paused_start = False
+        self.state = NOTHING; self._pos = 0.0; self._since = 0.0
+        self._gen = 0 # 状态每变一次递增，作废已排队的旧定时事件
+        self._lock = threading.RLock()
+        self.on_end = self.on_playing = None
+        self.volume = 100; self.muted = False
+
+    # --- 内部 ---
+    def _set(self, st):
+        self._gen += 1; self.state = st; return self._gen
+
+    def _later(self, dt, fn):
+        g = self._gen
+        def fire():
+            with self._lock:
+                if g != self._gen: return
+                fn()
+        self.clock.at(self.clock.now() + dt, fire)
+
+    def _pos_now(self):
+        if self.state == PLAYING: return min(self.length, self._pos + self.clock.now() - self._since)
+        return self._pos
+
+    def _start(self):
+        self._since = self.clock.now(); self._set(PLAYING)
+        self._later(max(0.0, self.length - self._pos), self._end)
+        if self.on_playing: self.on_playing(self)
+
+    def _end(self):
+        self._pos = self.length; self._set(ENDED)
+        if self.on_end: self.on_end(self)
+
+    # --- MediaPlayer 接口 ---
+    def open(self, path, paused=False):
+        with self._lock:
+            self._set(NOTHING); self.path = path; self.paused_start = paused
+            self.length = self.b.duration(path); self._pos = 0.0
+
+    def play(self):
+        with self._lock:
+            if not self.path: return -1
+            if self.state in (PLAYING, OPENING): return 0
+            if self.state == PAUSED: self._start(); return 0
+            if self.state in (STOPPED, ENDED): self._pos = 0.0
+            self._set(OPENING)
+            # 打开/缓冲完成后：start-paused 停在首帧，否则开始播放
+            self._later(self.b.open_delay, lambda: self._set(PAUSED) if self.paused_start else self._start())
+            return 0
+
+    def pause(self):
+        with self._lock:
+            if self.state == PLAYING: self._pos = self._pos_now(); self._set(PAUSED)
+            elif self.state == PAUSED: self._start()
+
+    def set_pause(self, v):
+        with self._lock:
+            if v and self.state == PLAYING: self.pause()
+            elif not v and self.state == PAUSED: self.paused_start = False; self._start()
+            elif not v and self.state == OPENING: self.paused_start = False
+
+    def stop(self):
+        with self._lock:
+            if self.state != NOTHING: self._pos = 0.0; self._set(STOPPED)
+
+    def is_playing(self): return self.state == PLAYING
+    def get_state(self): return self.state
+    def get_time(self):
+        with self._lock: return int(self._pos_now() * 1000)
+    def get_length(self): return int(self.length * 1000)
+
+    def set_time(self, ms):
+        with self._lock:
+            self._pos = max(0.0, min(self.length, ms / 1000.0))
+            if self.state == PLAYING: self._start()
+
+    def audio_set_mute(self, m): self.muted = bool(m)
+    def audio_set_volume(self, v): self.volume = v
+    def set_fullscreen(self, v): pass
+
+class SimBackend:
+    """模拟播放后端：不依赖 libvlc 与窗口，时长取自元数据目录 (或固定 SIM_DURATION)，
+    状态迁移与 EndReached 事件由虚拟时钟驱动，可倍速运行用于压测/CI"""
+    name = "sim"
+    def __init__(self, speed=SIM_SPEED, duration=SIM_DURATION, open_delay=SIM_OPEN_DELAY):
+        self.clock = SimClock(speed); self.fixed = duration; self.open_delay = open_delay
+
+    def duration(self, path):
+        if self.fixed: return float(self.fixed)
+        from catalog import catalog
+        try: d = catalog.get_duration(path)
+        except Exception: d = 0
+        return float(d) if d > 0 else 10.0
+
+    def new_player(self): return SimPlayer(self)
+    def load(self, p, path, paused=False): p.open(os.path.abspath(path), paused)
+    def bind(self, p, frame): pass
+    def watch(self, p, on_end, on_playing): p.on_end = on_end; p.on_playing = on_playing
+    def sleep(self, s): time.sleep(s / self.clock.speed)
+
+BACKENDS = {"vlc": VlcBackend, "sim": SimBackend}
+
+def create(name=PLAYER_BACKEND):
+    if name not in BACKENDS: raise ValueError(f"unknown player backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,42 @@
+"""合成素材树：用 OpenCV 编码少量不同规格的小视频作为模板，按需复制成大量文件"""
+import os
+import json
+import shutil
+import cv2
+import numpy as np
+
+# (宽, 高, 帧数, fps)：不同时长/分辨率，让探测与缩略图走不同路径
+TEMPLATES = ((64, 48, 30, 15), (96, 54, 60, 30), (128, 72, 45, 25), (160, 90, 90, 30))
+
+def make_clip(path, w, h, frames, fps, seed=0):
+    rng = np.random.default_rng(seed)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (w, h))
+    base = rng.integers(0, 255, (h, w, 3), dtype=np.uint8)
+    for i in range(frames):
+        out.write(np.roll(base, i, axis=1))
+    out.release()
+    return path
+
+def build(root, clips, per_dir, unique=False):
+    """在 root 下生成 videos/ 素材树 (clips 个文件，每目录 per_dir 个)，返回 {dirs, files, biggest}。
+    同参数的树已存在时直接复用。unique=True 时每个文件都单独编码 (慢)。"""
+    vd = os.path.join(root, "videos"); marker = os.path.join(root, "fixture.json")
+    spec = {"clips": clips, "per_dir": per_dir, "unique": unique}
+    if os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f: info = json.load(f)
+        if info.get("spec") == spec: return info
+    shutil.rmtree(vd, ignore_errors=True); os.makedirs(vd)
+    tdir = os.path.join(root, "templates"); os.makedirs(tdir, exist_ok=True)
+    tpl = [make_clip(os.path.join(tdir, f"t{i}.mp4"), *t, seed=i) for i, t in enumerate(TEMPLATES)]
+    dirs = []; files = []
+    for i in range(clips):
+        if i % per_dir == 0:
+            # 两层目录：g0/d0, g0/d1 ...，模拟按活动/日期分组的素材库
+            d = os.path.join(vd, f"g{i // (per_dir * 10)}", f"d{i // per_dir}"); os.makedirs(d); dirs.append(d)
+        p = os.path.join(dirs[-1], f"clip_{i:05d}.mp4")
+        if unique: make_clip(p, *TEMPLATES[i % len(TEMPLATES)], seed=i)
+        else: shutil.copyfile(tpl[i % len(tpl)], p)
+        files.append(p)
+    info = {"spec": spec, "dirs": [os.path.relpath(d, vd) for d in dirs], "files": [os.path.relpath(p, vd) for p in files]}
+    with open(marker, 'w', encoding='utf-8') as f: json.dump(info, f)
+    return info
@@ -0,0 +1,218 @@
+"""控制接口与媒体工具的微基准测试
+
+    python bench/run.py                           # 默认规模，结果写到 bench/results/<时间>.json
+    python bench/run.py --clips 20000 --per-dir 500 -o big.json
+    python bench/run.py --compare old.json        # 跑完与旧结果比较，回归时退出码为 1
+    python bench/run.py --diff old.json new.json  # 只比较两份结果
+
+在普通 Linux 机器上即可运行：vlc / tkinter / screeninfo 用 bench/stubs.py 中的替身，
+素材库是 OpenCV 合成的小视频 (bench/fixtures.py)，所有文件都放在临时工作目录，不动仓库里的数据。
+每项报告 p50/p99/平均耗时 (毫秒) 以及单次调用的分配峰值与残留 (tracemalloc)。
+"""
+import os
+import sys
+import gc
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+import stubs
+import fixtures
+
+FORMAT = 1 # 结果文件格式版本
+
+def _pct(s, q):
+    return s[min(len(s) - 1, int(round(q * (len(s) - 1))))]
+
+def measure(fn, iters, setup=None, warmup=3, alloc_iters=20):
+    """计时与分配分两轮测：计时轮不开 tracemalloc (开了会让耗时失真)"""
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+    gc.collect(); ts = []
+    for _ in range(iters):
+        if setup: setup()
+        t0 = time.perf_counter(); fn(); ts.append((time.perf_counter() - t0) * 1000)
+    ts.sort()
+    peaks = []; kept = []
+    tracemalloc.start()
+    try:
+        for _ in range(min(iters, alloc_iters)):
+            if setup: setup()
+            gc.collect(); cur0 = tracemalloc.get_traced_memory()[0]; tracemalloc.reset_peak()
+            fn()
+            cur1, peak = tracemalloc.get_traced_memory(); peaks.append(peak - cur0); kept.append(cur1 - cur0)
+    finally: tracemalloc.stop()
+    return {"n": iters, "p50_ms": round(_pct(ts, 0.5), 4), "p99_ms": round(_pct(ts, 0.99), 4),
+            "mean_ms": round(sum(ts) / len(ts), 4), "max_ms": round(ts[-1], 4),
+            "alloc_peak_kb": round(sum(peaks) / len(peaks) / 1024, 2), "alloc_kept_kb": round(sum(kept) / len(kept) / 1024, 2)}
+
+def setup_env(work):
+    """替身模块 + 把 config 中的全部数据路径指向工作目录；必须在导入其它仓库模块之前调用"""
+    stubs.install()
+    sys.path.insert(0, ROOT)
+    import config
+    for k, sub in (("VIDEO_DIR", "videos"), ("THUMB_DIR", "thumbs"), ("IDLE_DIR", "idle_imgs"),
+                   ("BG_CACHE_DIR", "cache/idle"), ("SPRITE_DIR", "cache/sprites"), ("UPLOAD_STATE_DIR", "cache/uploads")):
+        p = os.path.join(work, sub); os.makedirs(p, exist_ok=True); setattr(config, k, p)
+    config.CONFIG_FILE = os.path.join(work, "config.json")
+    config.CATALOG_FILE = os.path.join(work, "media_catalog.db")
+    return config
+
+def warm(work, info, config):
+    """稳态：元数据目录已探测、缩略图已存在 (每个模板只真正解码一次，其余复制)"""
+    marker = os.path.join(work, "warm.json")
+    if os.path.exists(marker):
+        with open(marker, 'r', encoding='utf-8') as f:
+            if json.load(f) == info["spec"]: return
+    from catalog import catalog
+    from utils import render_thumbnail, record_thumbnail
+    vd, td = config.VIDEO_DIR, config.THUMB_DIR
+    shutil.rmtree(td, ignore_errors=True)
+    paths = [os.path.join(vd, r) for r in info["files"]]
+    for i in range(0, len(paths), 500): catalog.lookup_many(paths[i:i + 500])
+    tpl = {}
+    for i, (r, p) in enumerate(zip(info["files"], paths)):
+        tp = os.path.join(td, r + ".jpg"); os.makedirs(os.path.dirname(tp), exist_ok=True)
+        k = i % len(fixtures.TEMPLATES)
+        if k in tpl: shutil.copyfile(tpl[k], tp)
+        else: render_thumbnail(p, tp); tpl[k] = tp
+        record_thumbnail(p, tp)
+    with open(marker, 'w', encoding='utf-8') as f: json.dump(info["spec"], f)
+
+def cases(args, info, config):
+    """[(名称, 函数, 每次调用前的准备 (不计时), 迭代次数)]"""
+    from flask import Flask
+    import routes
+    import player_logic
+    from state import state
+    from library import library
+    from catalog import catalog
+    from thumb_pool import thumb_pool
+    from utils import generate_thumbnail, get_video_duration
+    # 缩略图进程池属于后台工作，不计入被测接口
+    thumb_pool.submit = lambda *a, **k: None
+    player_logic.init() # 与 main 一样在启动时创建播放器 (这里是 vlc 替身)
+    app = Flask("bench"); app.config['TESTING'] = True
+    app.register_blueprint(routes.main_bp); app.register_blueprint(routes.api_bp, url_prefix='/api')
+    c = app.test_client()
+
+    vd = config.VIDEO_DIR
+    paths = [os.path.join(vd, r) for r in info["files"]]
+    big = max(info["dirs"], key=lambda d: sum(1 for f in info["files"] if f.startswith(d + os.sep)))
+    state.playlist.load([{"name": os.path.basename(p), "path": p, "duration": 3} for p in paths[:args.playlist]])
+    state.current_idx = 0; state.touch()
+    rng = random.Random(1)
+    pick = lambda: rng.choice(paths)
+
+    def get(url):
+        def f():
+            r = c.get(url); assert r.status_code == 200, (url, r.status_code); r.get_data()
+        return f
+
+    slow = max(5, args.iters // 10)
+    lib = f"/api/library?path={big}"
+    out = [
+        ("api_status", get("/api/status"), None, args.iters),
+        ("api_status_no_playlist", get("/api/status?playlist=0"), None, args.iters),
+        ("api_library_warm", get(lib), None, args.iters),
+        ("api_library_page", get(lib + "&offset=0&limit=50&sort=mtime&order=desc"), None, args.iters),
+        ("api_library_cold", get(lib), lambda: library.invalidate(os.path.join(vd, big)), slow),
+        ("get_video_duration_warm", lambda: get_video_duration(pick()), None, args.iters),
+    ]
+    cold = []
+    def forget_one():
+        p = pick(); catalog.forget(p); cold[:] = [p]
+    out.append(("get_video_duration_cold", lambda: get_video_duration(cold[0]), forget_one, slow))
+    def thumb():
+        p = pick(); td = os.path.join(config.THUMB_DIR, os.path.dirname(os.path.relpath(p, vd)))
+        generate_thumbnail(p, td, os.path.basename(p), force=True)
+    out.append(("generate_thumbnail", thumb, None, slow))
+    vol = [0]
+    def bump(): vol[0] = (vol[0] + 1) % 100; state.volume = vol[0]
+    out.append(("save_state", state.save_state, bump, args.iters))
+    def save_flush(): state.save_state(); state.flush_state()
+    out.append(("save_state_flush", save_flush, bump, slow))
+    return out
+
+def meta(args):
+    try: rev = subprocess.run(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except Exception: rev = ""
+    return {"format": FORMAT, "rev": rev, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+            "params": {"clips": args.clips, "per_dir": args.per_dir, "playlist": args.playlist, "iters": args.iters, "unique": args.unique}}
+
+def diff(old, new, threshold):
+    """逐项比较 p50/p99；变慢超过 threshold (比例) 且绝对差超过 0.05ms 视为回归"""
+    if old["meta"].get("params") != new["meta"].get("params"): print("! 两份结果的规模参数不同，比较仅供参考")
+    bad = []
+    print(f"{'case':28} {'p50 old':>10} {'p50 new':>10} {'Δ':>8} {'p99 old':>10} {'p99 new':>10} {'Δ':>8}")
+    for name, n in new["results"].items():
+        o = old["results"].get(name)
+        if not o: print(f"{name:28} {'-':>10} {n['p50_ms']:>10.3f}"); continue
+        row = [name]
+        for k in ("p50_ms", "p99_ms"):
+            d = (n[k] - o[k]) / o[k] if o[k] else 0.0
+            row += [o[k], n[k], d]
+            if d > threshold and n[k] - o[k] > 0.05: bad.append(f"{name}.{k}")
+        print(f"{row[0]:28} {row[1]:>10.3f} {row[2]:>10.3f} {row[3]:>+8.1%} {row[4]:>10.3f} {row[5]:>10.3f} {row[6]:>+8.1%}")
+    if bad: print("回归: " + ", ".join(bad))
+    return not bad
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--clips", type=int, default=1000, help="合成视频数量 (几十到几万)")
+    ap.add_argument("--per-dir", type=int, default=200, help="每个目录的视频数")
+    ap.add_argument("--playlist", type=int, default=200, help="播放列表条目数")
+    ap.add_argument("--iters", type=int, default=200, help="快速项的迭代次数 (慢项取十分之一)")
+    ap.add_argument("--unique", action="store_true", help="每个视频单独编码 (默认复制模板)")
+    ap.add_argument("--workdir", help="工作目录 (保留可复用素材树，默认临时目录并在结束后删除)")
+    ap.add_argument("--only", help="只跑名称包含这些子串的项，逗号分隔")
+    ap.add_argument("-o", "--output", help="结果 JSON 路径")
+    ap.add_argument("--compare", help="与该结果文件比较")
+    ap.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="只比较两份结果文件")
+    ap.add_argument("--threshold", type=float, default=0.2, help="回归阈值 (比例)")
+    args = ap.parse_args()
+
+    if args.diff:
+        with open(args.diff[0], 'r', encoding='utf-8') as f: old = json.load(f)
+        with open(args.diff[1], 'r', encoding='utf-8') as f: new = json.load(f)
+        sys.exit(0 if diff(old, new, args.threshold) else 1)
+
+    work = args.workdir or tempfile.mkdtemp(prefix="ledbench-")
+    os.makedirs(work, exist_ok=True)
+    try:
+        config = setup_env(work)
+        t0 = time.time(); info = fixtures.build(work, args.clips, args.per_dir, args.unique)
+        warm(work, info, config); print(f"fixtures: {len(info['files'])} clips / {len(info['dirs'])} dirs ({time.time() - t0:.1f}s)")
+        only = [s for s in (args.only or "").split(",") if s]
+        results = {}
+        for name, fn, setup, iters in cases(args, info, config):
+            if only and not any(s in name for s in only): continue
+            r = results[name] = measure(fn, iters, setup)
+            print(f"{name:28} p50 {r['p50_ms']:9.3f}ms  p99 {r['p99_ms']:9.3f}ms  alloc {r['alloc_peak_kb']:9.1f}KB  kept {r['alloc_kept_kb']:8.1f}KB")
+        from state import state
+        state.flush_state()
+    finally:
+        if not args.workdir: shutil.rmtree(work, ignore_errors=True)
+
+    doc = {"meta": meta(args), "results": results}
+    out = args.output or os.path.join(HERE, "results", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f: json.dump(doc, f, indent=1, ensure_ascii=False)
+    print(f"-> {out}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f: old = json.load(f)
+        if not diff(old, doc, args.threshold): sys.exit(1)
+
+if __name__ == "__main__":
+    main()
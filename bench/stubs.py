@@ -0,0 +1,69 @@
+"""基准测试专用的替身模块：vlc / tkinter / screeninfo 换成纯 Python 实现，
+只保证被测代码能导入和调用，不做任何真实播放或窗口操作。只在 bench 进程内安装。"""
+import sys
+import types
+
+def _vlc():
+    m = types.ModuleType("vlc")
+    class EventType:
+        MediaPlayerEndReached = 'end'; MediaPlayerPlaying = 'playing'; MediaPlayerVout = 'vout'
+        MediaPlayerPositionChanged = 'pos'; MediaPlayerEncounteredError = 'err'
+    class State:
+        NothingSpecial = 0; Opening = 1; Buffering = 2; Playing = 3; Paused = 4; Stopped = 5; Ended = 6; Error = 7
+    class _EventManager:
+        def __init__(self): self.h = {}
+        def event_attach(self, t, cb, *a): self.h.setdefault(t, []).append(cb)
+        def event_detach(self, t): self.h.pop(t, None)
+    class Media:
+        def __init__(self, p): self.p = p
+        def parse_with_options(self, *a): return 0
+        def get_duration(self): return 0
+        def get_mrl(self): return self.p
+        def add_option(self, o): pass
+    class MediaPlayer:
+        def __init__(self): self.state = State.NothingSpecial; self.media = None; self.em = _EventManager(); self.t = 0
+        def event_manager(self): return self.em
+        def set_media(self, m): self.media = m
+        def get_media(self): return self.media
+        def play(self): self.state = State.Playing; return 0
+        def pause(self): self.state = State.Paused
+        def set_pause(self, v): self.state = State.Paused if v else State.Playing
+        def stop(self): self.state = State.Stopped
+        def is_playing(self): return self.state == State.Playing
+        def get_state(self): return self.state
+        def get_time(self): return self.t
+        def get_length(self): return 0
+        def set_time(self, t): self.t = t
+        def audio_set_mute(self, v): pass
+        def audio_set_volume(self, v): pass
+        def set_hwnd(self, h): pass
+        def set_xwindow(self, h): pass
+        def set_nsobject(self, h): pass
+        def set_fullscreen(self, v): pass
+    class Instance:
+        def __init__(self, *a): pass
+        def media_player_new(self): return MediaPlayer()
+        def media_new(self, p): return Media(p)
+    m.EventType = EventType; m.State = State; m.Media = Media; m.MediaPlayer = MediaPlayer; m.Instance = Instance
+    return m
+
+def _tkinter():
+    m = types.ModuleType("tkinter")
+    class _Widget:
+        def __init__(self, *a, **k): pass
+        def __getattr__(self, name): return lambda *a, **k: None
+    m.Tk = m.Frame = m.Label = m.Toplevel = _Widget
+    return m
+
+def _screeninfo():
+    m = types.ModuleType("screeninfo")
+    class Monitor:
+        def __init__(self, x, y, width, height, name):
+            self.x = x; self.y = y; self.width = width; self.height = height; self.name = name; self.is_primary = x == 0
+    m.Monitor = Monitor
+    m.get_monitors = lambda: [Monitor(0, 0, 1920, 1080, "BENCH-1")]
+    return m
+
+def install():
+    for name, make in (("vlc", _vlc), ("tkinter", _tkinter), ("screeninfo", _screeninfo)):
+        sys.modules[name] = make()
@@ -0,0 +1,134 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from config import BG_CACHE_DIR, BG_CACHE_MB
+from catalog import catalog
+
+class IdleImageCache:
+    """待机图预缩放缓存：磁盘上按 (源文件内容哈希, 目标尺寸) 保存已 fit 的变体 (总量超过 max_bytes 时淘汰最久未用的)，
+    内存中保留最近几张可直接显示的 PhotoImage (仅在 Tk 线程访问)"""
+    def __init__(self, cache_dir, max_photos=3, max_bytes=BG_CACHE_MB << 20):
+        self.cache_dir = cache_dir
+        self.max_photos = max_photos
+        self.max_bytes = max_bytes
+        self._hashes = {}              # 源路径 -> (size, mtime_ns, 哈希)
+        self._photos = OrderedDict()   # (哈希, w, h) -> PhotoImage
+        self._lock = threading.Lock()
+        self._busy = set()             # 正在后台运行的 (源, 尺寸组) 任务，防止同一请求重复开线程
+        self._making = {}              # 变体路径 -> Event：正在生成该文件，其他任务等它完成
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def source_hash(self, src, compute=True):
+        """源图内容键：优先用上传/去重时登记在元数据目录里的 sha256，没有时读文件计算 sha1；
+        compute=False 时不读文件 (Tk 线程)，算不出返回 None"""
+        st = os.stat(src)
+        c = self._hashes.get(src)
+        if c and c[0] == st.st_size and c[1] == st.st_mtime_ns: return c[2]
+        d = catalog.content_hash(src, st)
+        if d: d = d[:16]
+        elif not compute: return None
+        else:
+            h = hashlib.sha1()
+            with open(src, 'rb') as f:
+                for b in iter(lambda: f.read(1 << 20), b''): h.update(b)
+            d = h.hexdigest()[:16]
+        self._hashes[src] = (st.st_size, st.st_mtime_ns, d)
+        return d
+
+    def remember(self, src, digest):
+        """上传时已边写边算出 sha256，直接登记，免得再读一遍源图"""
+        st = os.stat(src); self._hashes[src] = (st.st_size, st.st_mtime_ns, digest[:16])
+
+    def variant_path(self, src, w, h):
+        return os.path.join(self.cache_dir, f"{self.source_hash(src)}_{w}x{h}.jpg")
+
+    def ensure_variant(self, src, w, h):
+        """生成 (或复用) 指定尺寸的变体文件，返回路径；较慢，不要在 Tk 线程调用"""
+        vp = self.variant_path(src, w, h)
+        with self._lock:
+            ev = self._making.get(vp); mine = ev is None and not os.path.exists(vp)
+            if mine: ev = self._making[vp] = threading.Event()
+        if not mine:
+            if ev: ev.wait()
+            return vp
+        # 不同尺寸组的任务可能共享同一变体：按输出路径互斥，临时文件名也按线程区分
+        tmp = f"{vp}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            img = ImageOps.fit(Image.open(src), (w, h), Image.Resampling.LANCZOS).convert('RGB')
+            img.save(tmp, "JPEG", quality=95); os.replace(tmp, vp)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+            with self._lock: self._making.pop(vp, None)
+            ev.set()
+        self._prune(vp)
+        return vp
+
+    def _prune(self, keep):
+        """磁盘变体总量超过上限时按 mtime (生成/最近显示时间) 从旧到新删除，刚生成的保留"""
+        fs = []
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if not e.name.endswith(".jpg"): continue
+                try: st = e.stat()
+                except OSError: continue
+                fs.append((st.st_mtime, st.st_size, e.path))
+        total = sum(f[1] for f in fs)
+        for _, size, fp in sorted(fs):
+            if total <= self.max_bytes: break
+            if fp == keep: continue
+            try: os.remove(fp); total -= size
+            except OSError: pass
+
+    def prepare_async(self, src, sizes, done=None):
+        """后台为多个尺寸生成变体 (上传时 / 缓存未命中时)，完成后回调 done()"""
+        sizes = [s for s in dict.fromkeys(sizes) if s[0] >= 100 and s[1] >= 100]
+        with self._lock:
+            key = (src, tuple(sizes))
+            if key in self._busy: return
+            self._busy.add(key)
+        def run():
+            try:
+                for w, h in sizes: self.ensure_variant(src, w, h)
+                if done: done()
+            except Exception as e: print(f"Idle Image Cache Error: {e}")
+            finally:
+                with self._lock: self._busy.discard(key)
+        threading.Thread(target=run, daemon=True).start()
+
+    def photo(self, src, w, h):
+        """Tk 线程：返回可直接显示的 PhotoImage；磁盘上还没有变体、或源图哈希还没算过 (不在 Tk 线程读整张图) 时返回 None，
+        调用方随后 prepare_async 在后台补齐"""
+        from PIL import ImageTk
+        d = self.source_hash(src, compute=False)
+        if d is None: return None
+        k = (d, w, h)
+        ph = self._photos.get(k)
+        if ph is not None: self._photos.move_to_end(k); return ph
+        vp = os.path.join(self.cache_dir, f"{d}_{w}x{h}.jpg")
+        if not os.path.exists(vp): return None
+        try: os.utime(vp) # 记录使用时间，磁盘淘汰时保留正在用的
+        except OSError: pass
+        ph = ImageTk.PhotoImage(Image.open(vp))
+        self._photos[k] = ph
+        while len(self._photos) > self.max_photos: self._photos.popitem(last=False)
+        return ph
+
+    def forget(self, src):
+        """源图删除前调用：清理其全部变体；去重后仍有其他同内容源图时保留 (变体按内容共享)"""
+        try:
+            st = os.stat(src); d = self.source_hash(src, compute=False); full = catalog.content_hash(src, st)
+        except OSError: st = d = full = None
+        c = self._hashes.pop(src, None)
+        d = d or (c and c[2])
+        if not d: return
+        if full and catalog.find_hash(full, st.st_size, exclude=src): return
+        if any(o[2] == d and os.path.exists(k) for k, o in list(self._hashes.items())): return
+        for f in os.listdir(self.cache_dir):
+            if f.startswith(d + "_"):
+                try: os.remove(os.path.join(self.cache_dir, f))
+                except OSError: pass
+
+# 全局单例
+bg_cache = IdleImageCache(BG_CACHE_DIR)
@@ -0,0 +1,230 @@
+import os
+import time
+import sqlite3
+import threading
+from config import VIDEO_DIR, CATALOG_FILE
+from metrics import latency
+
+probe_stat = latency("media_probe", "media header probe (duration/resolution) time")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    rel         TEXT PRIMARY KEY,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    duration    INTEGER NOT NULL DEFAULT 0,
+    width       INTEGER NOT NULL DEFAULT 0,
+    height      INTEGER NOT NULL DEFAULT 0,
+    fps         REAL NOT NULL DEFAULT 0,
+    codec       TEXT NOT NULL DEFAULT '',
+    thumb       TEXT,
+    thumb_mtime REAL NOT NULL DEFAULT 0,
+    thumb_hash  TEXT,
+    probed_at   REAL NOT NULL DEFAULT 0
+)
+"""
+_BLOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    rel         TEXT PRIMARY KEY,
+    hash        TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    mtime       REAL NOT NULL,
+    mode        TEXT NOT NULL DEFAULT ''
+)
+"""
+_COLS = ("rel", "size", "mtime", "duration", "width", "height", "fps", "codec", "thumb", "thumb_mtime", "thumb_hash", "probed_at")
+_BATCH = 500 # SQLite 参数上限保护
+
+def rel_key(p):
+    """目录键：VIDEO_DIR 内用相对路径 (统一 /)，外部文件用绝对路径"""
+    ap = os.path.abspath(p); root = os.path.abspath(VIDEO_DIR)
+    if ap == root or ap.startswith(root + os.sep): return os.path.relpath(ap, root).replace('\\', '/')
+    return ap.replace('\\', '/')
+
+def probe_video(p):
+    """用 OpenCV 读取一次视频头信息 (时长/分辨率/编码)"""
+    import cv2 # 启动路径 (state 加载存档) 只读目录不探测，OpenCV 推迟到真正需要解码时再导入
+    info = {"duration": 0, "width": 0, "height": 0, "fps": 0.0, "codec": ""}
+    t0 = time.perf_counter()
+    try:
+        c = cv2.VideoCapture(p)
+        if c.isOpened():
+            f = c.get(cv2.CAP_PROP_FRAME_COUNT); fps = c.get(cv2.CAP_PROP_FPS)
+            info["width"] = int(c.get(cv2.CAP_PROP_FRAME_WIDTH)); info["height"] = int(c.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            cc = int(c.get(cv2.CAP_PROP_FOURCC))
+            info["codec"] = "".join(chr((cc >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00 ') if cc > 0 else ""
+            if fps > 0: info["fps"] = round(fps, 3); info["duration"] = int(f / fps)
+        c.release()
+    except: pass
+    probe_stat.observe((time.perf_counter() - t0) * 1000)
+    return info
+
+class MediaCatalog:
+    """持久化媒体元数据目录，按 (相对路径, 大小, mtime) 校验，文件变化时自动重新探测"""
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            try: self._conn.execute("PRAGMA journal_mode=WAL"); self._conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.DatabaseError: pass
+            self._conn.execute(_SCHEMA); self._conn.execute(_BLOB_SCHEMA)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS blobs_hash ON blobs(hash)")
+            # 旧版数据库升级：补齐新增列
+            have = {r[1] for r in self._conn.execute("PRAGMA table_info(media)")}
+            if "thumb_hash" not in have: self._conn.execute("ALTER TABLE media ADD COLUMN thumb_hash TEXT")
+        return self._conn
+
+    def _fetch(self, keys):
+        rows = {}
+        with self._lock:
+            db = self._db()
+            for i in range(0, len(keys), _BATCH):
+                part = keys[i:i + _BATCH]
+                q = f"SELECT {','.join(_COLS)} FROM media WHERE rel IN ({','.join('?' * len(part))})"
+                for r in db.execute(q, part): rows[r[0]] = dict(zip(_COLS, r))
+        return rows
+
+    def _store(self, rows):
+        if not rows: return
+        with self._lock:
+            self._db().executemany(
+                f"INSERT OR REPLACE INTO media ({','.join(_COLS)}) VALUES ({','.join('?' * len(_COLS))})",
+                [tuple(r[c] for c in _COLS) for r in rows])
+
+    @staticmethod
+    def _fresh(row, st):
+        return row is not None and row["size"] == st.st_size and abs(row["mtime"] - st.st_mtime) < 1e-3
+
+    def lookup_many(self, paths, stats=None, probe=True):
+        """批量查询：一次索引查找，仅对新增/已变化的文件调用解码器。返回 {path: meta 或 None}"""
+        stats = stats or {}
+        res = {}; todo = {}
+        for p in paths:
+            st = stats.get(p)
+            if st is None:
+                try: st = os.stat(p)
+                except OSError: res[p] = None; continue
+            todo[p] = (rel_key(p), st)
+        rows = self._fetch([k for k, _ in todo.values()]) if todo else {}
+        probed = []
+        for p, (k, st) in todo.items():
+            row = rows.get(k)
+            if self._fresh(row, st): res[p] = row; continue
+            if not probe: res[p] = None; continue
+            # 自愈：文件被替换 (大小/mtime 变化) 时重新探测，旧缩略图记录作废
+            row = {"rel": k, "size": st.st_size, "mtime": st.st_mtime, "thumb": None, "thumb_mtime": 0, "thumb_hash": None, "probed_at": time.time()}
+            row.update(probe_video(p)); probed.append(row); res[p] = row
+        self._store(probed)
+        return res
+
+    def lookup(self, p, st=None, probe=True):
+        return self.lookup_many([p], {p: st} if st else None, probe).get(p)
+
+    def get_duration(self, p):
+        m = self.lookup(p)
+        return m["duration"] if m else 0
+
+    def record_thumb(self, p, thumb, thumb_mtime, info=None, thumb_hash=None, probe=True):
+        """登记缩略图 (名称 + mtime + 内容哈希)；目录中没有该视频时用 info (子进程已探测) 或现场探测入库，
+        probe=False 时不现场探测 (没有记录就跳过)"""
+        m = self.lookup(p, probe=probe and info is None)
+        if not m and info:
+            st = os.stat(p)
+            m = {"rel": rel_key(p), "size": st.st_size, "mtime": st.st_mtime, "probed_at": time.time()}; m.update(info)
+        if not m: return
+        m["thumb"] = thumb; m["thumb_mtime"] = thumb_mtime; m["thumb_hash"] = thumb_hash
+        self._store([m])
+
+    def clone(self, src, dst):
+        """内容相同的副本：复制源文件的元数据与缩略图记录 (按副本自身的 size/mtime)，不再探测"""
+        m = self.lookup(src, probe=False)
+        if not m: return False
+        st = os.stat(dst); m = dict(m)
+        m["rel"] = rel_key(dst); m["size"] = st.st_size; m["mtime"] = st.st_mtime
+        m["thumb"] = os.path.basename(dst) + ".jpg" if m["thumb"] else None
+        self._store([m]); return True
+
+    # --- 内容哈希 (上传去重) ---
+    def record_hash(self, p, h, mode=""):
+        """登记文件内容哈希；mode 为该文件与已有内容的共享方式 (reflink/hardlink/alias，空为原件)"""
+        st = os.stat(p)
+        with self._lock:
+            self._db().execute("INSERT OR REPLACE INTO blobs (rel, hash, size, mtime, mode) VALUES (?,?,?,?,?)",
+                               (rel_key(p), h, st.st_size, st.st_mtime, mode))
+
+    def content_hash(self, p, st=None):
+        """文件未变化时返回已登记的内容哈希，否则 None"""
+        st = st or os.stat(p)
+        with self._lock: r = self._db().execute("SELECT hash, size, mtime FROM blobs WHERE rel=?", (rel_key(p),)).fetchone()
+        return r[0] if r and r[1] == st.st_size and abs(r[2] - st.st_mtime) < 1e-3 else None
+
+    def find_hash(self, h, size, exclude=None):
+        """同内容的现存文件 (大小/mtime 仍与登记一致)，优先原件；没有返回 None"""
+        with self._lock:
+            rows = self._db().execute("SELECT rel, size, mtime FROM blobs WHERE hash=? AND size=? ORDER BY mode != '', rel", (h, size)).fetchall()
+        ex = rel_key(exclude) if exclude else None
+        for rel, sz, mt in rows:
+            if rel == ex: continue
+            p = rel if os.path.isabs(rel) else os.path.join(VIDEO_DIR, rel)
+            try: st = os.stat(p)
+            except OSError: continue
+            if st.st_size == sz and abs(st.st_mtime - mt) < 1e-3: return p
+        return None
+
+    def dedup_stats(self):
+        """仍共享同一内容的现存文件：{mode: (文件数, 字节数)}。每个哈希只算 (现存份数 - 1) 个副本，
+        第一份 (优先原件) 视为本体；已删除或已变化的文件不计"""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT rel, hash, size, mtime, mode FROM blobs WHERE hash IN "
+                "(SELECT hash FROM blobs GROUP BY hash HAVING COUNT(*) > 1) ORDER BY hash, mode != '', rel").fetchall()
+        out = {}; groups = {}
+        for rel, h, sz, mt, mode in rows:
+            p = rel if os.path.isabs(rel) else os.path.join(VIDEO_DIR, rel)
+            try: st = os.stat(p)
+            except OSError: continue
+            if st.st_size == sz and abs(st.st_mtime - mt) < 1e-3: groups.setdefault(h, []).append((mode, sz))
+        for files in groups.values():
+            for mode, sz in files[1:]:
+                if not mode: continue # 去重之前就存在的独立副本，不算节省也不算别名
+                n, b = out.get(mode, (0, 0)); out[mode] = (n + 1, b + sz)
+        return out
+
+    def forget(self, p, tree=False):
+        """文件/文件夹被删除后清理记录"""
+        k = rel_key(p)
+        with self._lock:
+            db = self._db()
+            for t in ("media", "blobs"):
+                db.execute(f"DELETE FROM {t} WHERE rel=?", (k,))
+                if tree: db.execute(f"DELETE FROM {t} WHERE substr(rel, 1, ?) = ?", (len(k) + 1, k + "/"))
+
+    def rename(self, old, new):
+        """重命名保留 size/mtime，直接迁移记录，避免重新探测"""
+        ok, nk = rel_key(old), rel_key(new)
+        with self._lock:
+            db = self._db()
+            for t in ("media", "blobs"):
+                db.execute(f"DELETE FROM {t} WHERE rel=? OR substr(rel, 1, ?) = ?", (nk, len(nk) + 1, nk + "/"))
+                db.execute(f"UPDATE {t} SET rel=? WHERE rel=?", (nk, ok))
+                db.execute(f"UPDATE {t} SET rel=? || substr(rel, ?) WHERE substr(rel, 1, ?) = ?", (nk, len(ok) + 1, len(ok) + 1, ok + "/"))
+
+    def prune(self):
+        """清理磁盘上已不存在的文件记录 (启动时后台执行)"""
+        n = 0
+        for t in ("media", "blobs"):
+            with self._lock: keys = [r[0] for r in self._db().execute(f"SELECT rel FROM {t}")]
+            gone = [k for k in keys if not os.path.exists(k if os.path.isabs(k) else os.path.join(VIDEO_DIR, k))]
+            with self._lock:
+                for i in range(0, len(gone), _BATCH):
+                    part = gone[i:i + _BATCH]
+                    self._db().execute(f"DELETE FROM {t} WHERE rel IN ({','.join('?' * len(part))})", part)
+            n += len(gone)
+        return n
+
+# 全局单例
+catalog = MediaCatalog(CATALOG_FILE)
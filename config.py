@@ -8,14 +8,74 @@ VIDEO_DIR = os.path.join(BASE_DIR, "videos")
 THUMB_DIR = os.path.join(BASE_DIR, "thumbs")
 IDLE_DIR  = os.path.join(BASE_DIR, "idle_imgs")
 CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
+CATALOG_FILE = os.path.join(BASE_DIR, "media_catalog.db") # 媒体元数据目录 (SQLite)
+BG_CACHE_DIR = os.path.join(BASE_DIR, "cache", "idle")    # 待机图按分辨率预缩放的变体
+SPRITE_DIR = os.path.join(BASE_DIR, "cache", "sprites")   # 封面工坊拖动预览雪碧图 + VTT
+UPLOAD_STATE_DIR = os.path.join(BASE_DIR, "cache", "uploads") # 分块上传的续传记录
 
 # 服务端口
 PORT = 8080
 
+# HTTP 服务："pooled" = 分池线程服务 (生产)，"dev" = Flask 开发服务器
+SERVER_MODE = "pooled"
+HTTP_CONTROL_THREADS = 8        # 控制/状态等短请求
+HTTP_STREAM_THREADS = 6         # 上传/视频流等长请求
+HTTP_EVENT_THREADS = 16         # 事件推送 (SSE) 连接不会结束，单独成池且不排队，满了直接 503
+HTTP_MAX_CONNECTIONS = 64       # 同时处理 + 排队的连接上限，超出直接 503
+HTTP_QUEUE = 32                 # 每个线程池的等待队列长度
+HTTP_QUEUE_WAIT = 5             # 在等待队列中超过此秒数仍未被处理的连接以 503 拒绝
+HTTP_REQUEST_TIMEOUT = 15       # 短请求套接字超时 (秒)
+HTTP_STREAM_TIMEOUT = 120       # 长请求两次读写之间的最长等待 (秒)
+MAX_UPLOAD_BYTES = 16 << 30     # 单个请求体上限
+
+# 无界面模式：不创建 Tk 窗口，GUI 指令由空界面吸收 (压测/CI)；环境变量 LEDPRO_HEADLESS=1 开启
+HEADLESS = os.environ.get("LEDPRO_HEADLESS") == "1"
+HEADLESS_MONITORS = [(1920, 1080)] # 无界面时上报的虚拟显示器
+# 显示器拓扑：完整枚举间隔 (秒)；Windows 上廉价变化探测的间隔 (秒)
+DISPLAY_REFRESH = 5.0
+DISPLAY_PROBE = 1.0
+# 播放后端："vlc" 真实播放，"sim" 虚拟时钟模拟 (无需 libvlc)；无界面模式默认 sim，可用 LEDPRO_PLAYER 指定
+PLAYER_BACKEND = os.environ.get("LEDPRO_PLAYER", "sim" if HEADLESS else "vlc")
+SIM_SPEED = float(os.environ.get("LEDPRO_SIM_SPEED", 1.0)) # 模拟时钟倍速
+SIM_DURATION = 0         # 模拟时长 (秒)，0 = 取媒体真实时长
+SIM_OPEN_DELAY = 0.05    # 模拟打开/缓冲耗时 (虚拟秒)
+
+# 无缝播放：当前条目播放时在第二个播放器上预加载下一条，结束时直接切换画面
+GAPLESS = True
+
+# "上一首" 回溯的播放历史条数
+PLAY_HISTORY = 200
+
+# 状态持久化：防抖窗口 (秒) 内的连续修改合并为一次写入；小改动追加到日志
+STATE_DEBOUNCE = 0.5
+STATE_JOURNAL = True
+
+# 待机图按分辨率预缩放的变体磁盘缓存上限 (MB)，超出时按最近使用时间淘汰
+BG_CACHE_MB = 256
+
+# 拖动预览雪碧图磁盘缓存上限 (MB)，超出时按最近使用时间淘汰
+SPRITE_CACHE_MB = 256
+
+# 后台缩略图进程数 (播放机 CPU 较弱，默认最多 2 个)
+THUMB_WORKERS = max(1, min(2, (os.cpu_count() or 2) // 2))
+
+# 预览视频流最大并发数 (超出返回 503)，避免网页预览抢占播放的磁盘 I/O
+STREAM_MAX = 3
+
+# 硬件监控：采样间隔 (秒)；近期原始采样保留时长 (秒)；按分钟聚合的长期历史保留天数
+SYS_SAMPLE_INTERVAL = 1.5
+SYS_HISTORY_RAW = 6 * 3600
+SYS_HISTORY_DAYS = 30
+
+# 文件监视：是否启用；新文件大小/mtime 稳定多少秒视为拷贝完成；轮询模式 (无 inotify) 扫描间隔
+WATCH_ENABLED = True
+WATCH_SETTLE = 2.0
+WATCH_POLL = 3.0
+
 # 允许的文件格式
 ALLOWED_VIDEO_EXT = {'mp4', 'avi', 'mkv', 'mov', 'wmv', 'flv', 'ts', 'webm', 'm4v', 'mpg'}
 ALLOWED_IMG_EXT = {'jpg', 'jpeg', 'png', 'bmp', 'webp', 'gif'}
 
 # 自动创建必要目录
 for d in [VIDEO_DIR, THUMB_DIR, IDLE_DIR]:
-    os.makedirs(d, exist_ok=True)
\ No newline at end of file
+    os.makedirs(d, exist_ok=True)
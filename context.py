@@ -1,17 +1,47 @@
-import queue
+import time
+import threading
+from collections import deque
+from metrics import gauge
+
+# 连续重复时只保留最后一条的 GUI 指令 (其余都是幂等的界面刷新/图层切换)
+_GUI_NO_COLLAPSE = {'screen_test'}
 
 class AppContext:
     """全局上下文，用于在 Flask 线程和 Tkinter 主线程之间共享对象"""
     def __init__(self):
         self.root = None          # Tkinter 主窗口
-        self.video_frame = None   # 视频播放区域
+        self.video_frame = None   # 视频播放区域 (当前可见的那一层)
+        self.video_frames = []    # 无缝播放用的两层视频区域，与两个播放器一一对应
         self.idle_label = None    # 背景图片区域
-        self.gui_queue = queue.Queue() # 线程通信消息队列
-        self.player = None        # VLC 播放器实例
-        
+        self.gui_queue = deque()  # 线程通信消息队列: (指令, 参数, 入队时间)
+        self.player = None        # 当前播放中的 VLC 播放器实例 (无缝切换后会指向另一个)
+        self.gui_wake_ok = True   # Tcl 非线程版不支持跨线程 event_generate，此时退回定时轮询
+        self.on_wake = None       # 无界面模式的唤醒回调 (替代 Tk 事件)
+        self._wake_lost = False   # 上次唤醒失败 (如主循环尚未启动)：下一条指令无论队列是否为空都重新唤醒
+        self._gui_lock = threading.Lock()
+
     def gui_invoke(self, cmd, *args):
-        """向 GUI 线程发送指令"""
-        self.gui_queue.put((cmd, args))
+        """向 GUI 线程发送指令，队列由空变为非空时立即唤醒 Tk 主循环"""
+        with self._gui_lock:
+            q = self.gui_queue
+            if q and q[-1][0] == cmd and cmd not in _GUI_NO_COLLAPSE:
+                q[-1] = (cmd, args, q[-1][2]); return # 合并连续重复指令，保留最早的入队时间
+            wake = not q or self._wake_lost
+            q.append((cmd, args, time.perf_counter()))
+        if wake: self._wake()
+
+    def _wake(self):
+        if self.on_wake: self.on_wake(); return
+        if self.root is None or not self.gui_wake_ok: return
+        try: self.root.event_generate('<<GuiWake>>', when='tail'); self._wake_lost = False
+        except Exception as e: self._wake_lost = True; print(f"GUI Wake Error: {e}")
+
+    def gui_take(self):
+        """GUI 线程一次性取走全部待处理指令"""
+        with self._gui_lock:
+            items = list(self.gui_queue); self.gui_queue.clear()
+        return items
 
 # 单例实例
-ctx = AppContext()
\ No newline at end of file
+ctx = AppContext()
+gauge("gui_queue_depth", "pending GUI commands", lambda: len(ctx.gui_queue))
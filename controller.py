@@ -0,0 +1,141 @@
+import time
+import itertools
+import threading
+from collections import deque
+from state import state
+from context import ctx
+from metrics import latency, gauge
+import player_logic
+
+queue_stat = latency("controller_queue", "player command queue -> execution latency")
+exec_stat = latency("controller_exec", "player command execution time")
+
+# 绝对目标类命令：排在它前面、尚未执行的跳转类命令都会被它取代
+_SUPERSEDES = {
+    "play": {"play", "step", "stop", "end"},
+    "stop": {"play", "step", "stop", "end", "toggle_pause"},
+}
+_LATEST_WINS = {"seek", "volume"} # 只保留最后一次
+
+class Command:
+    __slots__ = ("id", "name", "args", "t0", "done", "result")
+    def __init__(self, cid, name, args):
+        self.id = cid; self.name = name; self.args = list(args)
+        self.t0 = time.perf_counter(); self.done = None; self.result = None
+
+_ABSORBED = Command(0, "absorbed", ()) # 与队列中命令抵消，无需执行
+
+class PlaybackController:
+    """播放控制线程：所有播放器/播放列表命令排队后在同一线程串行执行，
+    入队时合并被取代的命令 (连按十次"下一首"只执行一次跳转)"""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._q = deque()
+        self._ids = itertools.count(1)
+        self.last = {} # 命令名 -> 最近一次排队耗时 (ms)
+        self.done_id = 0   # 已执行完的最大命令编号 (队列按编号先进先出)
+        self.done_rev = 0  # 执行完 done_id 后的状态版本
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True); self._thread.start()
+
+    def submit(self, name, *args):
+        """排队并立即返回命令编号 (被合并/抵消时返回已有命令的编号或 0)"""
+        with self._cond:
+            self._ensure_started()
+            cmd = self._coalesce(name, args)
+            if cmd is None:
+                cmd = Command(next(self._ids), name, args); self._q.append(cmd)
+            self._cond.notify()
+            return cmd.id
+
+    def call(self, fn, timeout=10):
+        """在控制线程上执行 fn 并等待结果 (播放列表修改等需要返回值的操作)"""
+        if threading.current_thread() is self._thread: return fn()
+        cmd = Command(next(self._ids), "call", (fn,)); cmd.done = threading.Event()
+        with self._cond: self._ensure_started(); self._q.append(cmd); self._cond.notify()
+        if not cmd.done.wait(timeout): raise TimeoutError("controller busy")
+        if isinstance(cmd.result, BaseException): raise cmd.result
+        return cmd.result
+
+    def wait_done(self, cid, timeout):
+        """等待编号 cid 的命令 (被合并/取代的也算) 执行完，返回执行后的状态版本；超时返回 None"""
+        end = time.monotonic() + timeout
+        with self._cond:
+            while self.done_id < cid:
+                left = end - time.monotonic()
+                if left <= 0: return None
+                self._cond.wait(left)
+            return self.done_rev
+
+    def _coalesce(self, name, args):
+        q = self._q
+        if name in _SUPERSEDES:
+            kill = _SUPERSEDES[name]
+            while q and q[-1].name in kill: q.pop()
+            return None
+        if name in _LATEST_WINS:
+            # 只合并队尾的同名命令：排在 play/step 之前的 seek 若被提前合并，执行顺序就变了
+            if q and q[-1].name == name: q[-1].args = list(args); return q[-1]
+            return None
+        if name == "step" and q and q[-1].name == "step":
+            c = q[-1]; c.args[0] += args[0]
+            if c.args[0] == 0: q.pop(); return _ABSORBED # 下一首 + 上一首 互相抵消
+            return c
+        if name == "toggle_pause" and len(q) == 1 and q[0].name == "toggle_pause" and ctx.player and ctx.player.is_playing():
+            # 播放中连按两次 = 暂停再继续，互相抵消；从空闲/停止状态开始的切换会开播，不能抵消
+            q.pop(); return _ABSORBED
+        return None
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._q: self._cond.wait()
+                cmd = self._q.popleft()
+            t1 = time.perf_counter()
+            wait_ms = (t1 - cmd.t0) * 1000
+            queue_stat.observe(wait_ms); self.last[cmd.name] = round(wait_ms, 3)
+            try: cmd.result = self._exec(cmd)
+            except Exception as e:
+                cmd.result = e; print(f"Controller Error ({cmd.name}): {e}")
+            exec_stat.observe((time.perf_counter() - t1) * 1000)
+            rev = state.touch()
+            with self._cond: self.done_id = cmd.id; self.done_rev = rev; self._cond.notify_all()
+            if cmd.done: cmd.done.set()
+
+    def _exec(self, cmd):
+        n, a = cmd.name, cmd.args
+        if n == "call": return a[0]()
+        if n == "play": player_logic.play_by_index(a[0])
+        elif n == "step": self._step(a[0])
+        elif n == "end": player_logic.auto_next()
+        elif n == "swapped": player_logic.retire(a[0])
+        elif n == "stop":
+            player_logic.stop_all(); state.current_idx = -1; ctx.gui_invoke('show_bg_layer'); state.save_state() # 停止后开机不再续播
+        elif n == "toggle_pause":
+            if ctx.player.is_playing(): ctx.player.pause(); state.paused = True
+            elif state.current_idx == -1 and len(state.playlist) > 0: player_logic.play_by_index(0)
+            else: ctx.player.play(); state.paused = False; ctx.gui_invoke('hide_bg_layer')
+            state.touch()
+        elif n == "seek": ctx.player.set_time(int(a[0] * 1000))
+        elif n == "volume":
+            state.volume = a[0]; state.is_muted = False
+            ctx.player.audio_set_mute(False); ctx.player.audio_set_volume(a[0]); state.save_state()
+        elif n == "mute":
+            state.is_muted = not state.is_muted; ctx.player.audio_set_mute(state.is_muted); state.save_state()
+
+    def _step(self, delta):
+        """合并后的相对跳转：列表模式按位移直接定位，随机/单曲模式只执行一次"""
+        if not state.playlist: return
+        if delta > 0:
+            if state.loop_mode == "list" and state.current_idx >= 0:
+                player_logic.play_by_index((state.current_idx + delta) % len(state.playlist))
+            else: player_logic.auto_next()
+        elif delta < 0:
+            player_logic.play_previous(-delta)
+
+# 全局单例
+controller = PlaybackController()
+gauge("controller_queue_depth", "player commands waiting for the control thread", lambda: len(controller._q))
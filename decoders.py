@@ -0,0 +1,217 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from config import VIDEO_DIR, SPRITE_DIR, SPRITE_CACHE_MB
+from events import bus
+from catalog import catalog
+
+SPRITE_FRAMES = 60              # 每个视频的预览帧数
+SPRITE_SIZE = (160, 90)         # 单帧尺寸
+SPRITE_COLS = 10
+FORWARD_READ_MS = 2000          # 目标在当前位置之后 2 秒内：顺序读帧，比重新 seek (从关键帧解码) 更快
+
+class _Decoder:
+    __slots__ = ("path", "cap", "key", "lock", "pos_ms", "used", "refs", "dead")
+    def __init__(self, path, key):
+        self.path = path; self.cap = None; self.key = key # cap 在池锁之外、持 self.lock 时才打开
+        self.lock = threading.Lock(); self.pos_ms = -1.0; self.used = time.monotonic()
+        self.refs = 0; self.dead = False # refs：正在使用的请求数；dead：已移出池，最后一个使用者负责关闭
+
+class DecoderPool:
+    """按文件缓存已打开的解码器 (LRU)，同一片段反复取帧时复用解码状态。
+    打开文件 (网络共享上可能很慢) 不持池锁；使用中的解码器被淘汰/释放时推迟到用完再关闭"""
+    def __init__(self, max_open=4, idle_ttl=120):
+        self.max_open = max_open; self.idle_ttl = idle_ttl
+        self._lock = threading.Lock()
+        self._decs = OrderedDict() # 绝对路径 -> _Decoder
+
+    def _get(self, path):
+        """取出并占用 (refs+1) 解码器，用完必须 _put"""
+        ap = os.path.abspath(path); st = os.stat(ap); key = (st.st_size, st.st_mtime_ns)
+        drop = []
+        with self._lock:
+            d = self._decs.get(ap)
+            if d and d.key != key: drop.append(self._retire(self._decs.pop(ap))); d = None # 文件已被替换
+            if d is None: d = self._decs[ap] = _Decoder(ap, key)
+            self._decs.move_to_end(ap); d.used = time.monotonic(); d.refs += 1
+            now = d.used
+            for k in list(self._decs):
+                if len(self._decs) <= self.max_open and now - self._decs[k].used < self.idle_ttl: break
+                if k != ap: drop.append(self._retire(self._decs.pop(k)))
+        for x in drop:
+            if x: self._close(x)
+        return d
+
+    @staticmethod
+    def _retire(d):
+        """(持池锁) 移出池：没人在用返回它以便关闭，否则交给最后一个使用者"""
+        d.dead = True
+        return d if d.refs == 0 else None
+
+    def _put(self, d):
+        with self._lock:
+            d.refs -= 1; close = d.dead and d.refs == 0
+        if close: self._close(d)
+
+    @staticmethod
+    def _close(d):
+        with d.lock:
+            if d.cap is not None: d.cap.release(); d.cap = None
+
+    def frame_at(self, path, ms):
+        """返回 ms 处的一帧 (BGR ndarray)，失败返回 None"""
+        d = self._get(path)
+        try:
+            with d.lock:
+                if d.cap is None: d.cap = cv2.VideoCapture(d.path)
+                cap = d.cap
+                if not cap.isOpened(): return None
+                if not (d.pos_ms <= ms <= d.pos_ms + FORWARD_READ_MS):
+                    cap.set(cv2.CAP_PROP_POS_MSEC, ms)
+                # 顺序读到目标时间戳 (seek 后通常已在目标处，一次 read 即可)
+                ret, f = cap.read()
+                while ret and cap.get(cv2.CAP_PROP_POS_MSEC) < ms:
+                    ret, nf = cap.read()
+                    if ret: f = nf
+                d.pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC) if ret else -1.0
+                return f if ret else None
+        finally: self._put(d)
+
+    def release(self, path, tree=False):
+        """删除/重命名前释放文件句柄 (Windows 下打开的文件无法删除)；正在取帧的在取完后关闭"""
+        ap = os.path.abspath(path); drop = []
+        with self._lock:
+            for k in list(self._decs):
+                if k == ap or (tree and k.startswith(ap + os.sep)): drop.append(self._retire(self._decs.pop(k)))
+        for x in drop:
+            if x: self._close(x)
+
+class SpriteSheets:
+    """拖动预览用的雪碧图 + WebVTT 轨：N 帧等间隔缩略图拼成一张图，封面工坊拖动时只加载这一张。
+    磁盘上按最近使用 (vtt 的 mtime) 淘汰到 max_bytes 以内；源文件删除时清理其雪碧图"""
+    def __init__(self, out_dir, max_bytes=SPRITE_CACHE_MB << 20):
+        self.out_dir = out_dir; self.max_bytes = max_bytes
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprite")
+        self._busy = set(); self._lock = threading.Lock()
+        self._lru = None      # 键 -> 占用字节，最近使用的在末尾；首次用到时从目录重建
+        self._owners = {}     # 绝对路径 -> 键 (本次运行中取过键的文件)
+        os.makedirs(out_dir, exist_ok=True)
+
+    def key(self, vp):
+        st = os.stat(vp)
+        # 已登记内容哈希的文件按内容取键：重复上传的副本共用同一份雪碧图
+        h = catalog.content_hash(vp, st)
+        k = h[:16] if h else hashlib.sha1(f"{os.path.abspath(vp)}|{st.st_size}|{st.st_mtime_ns}".encode('utf-8', 'surrogatepass')).hexdigest()[:16]
+        with self._lock: self._owners[os.path.abspath(vp)] = k
+        return k
+
+    def _files(self, k): return [os.path.join(self.out_dir, k + e) for e in (".jpg", ".vtt")]
+
+    def _index(self):
+        """(持锁调用) 键 -> 字节数的 LRU 表"""
+        if self._lru is None:
+            sizes = {}; used = {}
+            with os.scandir(self.out_dir) as it:
+                for e in it:
+                    k, ext = os.path.splitext(e.name)
+                    if ext not in (".jpg", ".vtt"): continue
+                    try: st = e.stat()
+                    except OSError: continue
+                    sizes[k] = sizes.get(k, 0) + st.st_size
+                    if ext == ".vtt": used[k] = st.st_mtime
+            self._lru = OrderedDict((k, sizes[k]) for k in sorted(sizes, key=lambda k: used.get(k, 0)))
+        return self._lru
+
+    def _touch(self, k, size=None):
+        with self._lock:
+            lru = self._index()
+            if size is not None: lru[k] = size
+            if k in lru: lru.move_to_end(k)
+            # 超出预算时从最久未用的开始删 (刚用到的这一份除外)
+            drop = []; total = sum(lru.values())
+            while total > self.max_bytes and len(lru) > 1:
+                old, n = next(iter(lru.items()))
+                if old == k: break
+                del lru[old]; total -= n; drop.append(old)
+        for old in drop: self._remove(old)
+
+    def _remove(self, k):
+        for f in self._files(k):
+            try: os.remove(f)
+            except OSError: pass
+
+    def forget(self, p, tree=False):
+        """源文件/文件夹被删除后调用：没有其他已知文件共用的雪碧图一并删除"""
+        ap = os.path.abspath(p)
+        with self._lock:
+            gone = {k for q, k in self._owners.items() if q == ap or (tree and q.startswith(ap + os.sep))}
+            self._owners = {q: k for q, k in self._owners.items() if not (q == ap or (tree and q.startswith(ap + os.sep)))}
+            gone -= set(self._owners.values()) | self._busy
+            if self._lru is not None:
+                for k in gone: self._lru.pop(k, None)
+        for k in gone: self._remove(k)
+
+    def info(self, vp):
+        """已生成返回 {image, vtt, count, interval}，否则返回 None"""
+        k = self.key(vp); vtt = os.path.join(self.out_dir, k + ".vtt")
+        if not os.path.exists(vtt): return None
+        try: os.utime(vtt) # 记录使用时间，重启后重建 LRU 顺序
+        except OSError: pass
+        self._touch(k)
+        with open(vtt, 'r', encoding='utf-8') as f: head = f.readline()
+        try: _, _, n, iv = head.split()
+        except ValueError: return None
+        return {"image": f"/sprites/{k}.jpg", "vtt": f"/sprites/{k}.vtt", "count": int(n), "interval": float(iv)}
+
+    def request(self, vp):
+        """后台生成 (已生成/生成中时不重复排队)"""
+        k = self.key(vp)
+        with self._lock:
+            if k in self._busy or os.path.exists(os.path.join(self.out_dir, k + ".vtt")): return
+            self._busy.add(k)
+        self._exec.submit(self._run, vp, k)
+
+    def _run(self, vp, k):
+        try: self._build(vp, k)
+        except Exception as e: print(f"Sprite Error: {e}")
+        finally:
+            with self._lock: self._busy.discard(k)
+
+    def _build(self, vp, k):
+        c = cv2.VideoCapture(vp)
+        try:
+            fps = c.get(cv2.CAP_PROP_FPS) or 0; fc = c.get(cv2.CAP_PROP_FRAME_COUNT) or 0
+            dur = fc / fps if fps > 0 else 0
+            if dur <= 0: return
+            n = max(1, min(SPRITE_FRAMES, int(dur))); iv = dur / n
+            w, h = SPRITE_SIZE; cols = min(SPRITE_COLS, n); rows = (n + cols - 1) // cols
+            sheet = np.zeros((rows * h, cols * w, 3), np.uint8)
+            for i in range(n):
+                c.set(cv2.CAP_PROP_POS_MSEC, i * iv * 1000); ret, f = c.read()
+                if not ret: continue
+                y, x = divmod(i, cols)
+                sheet[y*h:(y+1)*h, x*w:(x+1)*w] = cv2.resize(f, (w, h), interpolation=cv2.INTER_AREA)
+        finally: c.release()
+        img = os.path.join(self.out_dir, k + ".jpg"); vtt = os.path.join(self.out_dir, k + ".vtt")
+        cv2.imencode(".jpg", sheet, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tofile(img + ".tmp"); os.replace(img + ".tmp", img)
+        lines = [f"WEBVTT - {n} {iv:.3f}", ""] # 头行附带帧数与间隔，info() 读取
+        for i in range(n):
+            y, x = divmod(i, cols)
+            lines += [f"{_vtt_ts(i * iv)} --> {_vtt_ts((i + 1) * iv)}", f"/sprites/{k}.jpg#xywh={x*w},{y*h},{w},{h}", ""]
+        with open(vtt + ".tmp", 'w', encoding='utf-8') as f: f.write("\n".join(lines))
+        os.replace(vtt + ".tmp", vtt)
+        self._touch(k, sum(os.path.getsize(f) for f in (img, vtt)))
+        bus.publish("sprite", {"path": os.path.relpath(vp, VIDEO_DIR).replace('\\', '/'), **self.info(vp)})
+
+def _vtt_ts(s):
+    m, s = divmod(s, 60); h, m = divmod(int(m), 60)
+    return f"{h:02d}:{m:02d}:{s:06.3f}"
+
+# 全局单例
+decoders = DecoderPool()
+sprites = SpriteSheets(SPRITE_DIR)
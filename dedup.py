@@ -0,0 +1,101 @@
+import os
+import sys
+import shutil
+import hashlib
+import threading
+from config import VIDEO_DIR, THUMB_DIR
+from catalog import catalog
+
+CHUNK = 1 << 20
+FICLONE = 0x40049409 # linux/fs.h
+
+def hash_file(p):
+    h = hashlib.sha256()
+    with open(p, 'rb') as f:
+        for b in iter(lambda: f.read(CHUNK), b''): h.update(b)
+    return h.hexdigest()
+
+def save_hashed(stream, dst, extra=()):
+    """边写边算哈希 (不再二次读文件)；先写临时文件再改名，不会改写可能与其它文件共享的 inode。
+    extra 中的哈希对象同步更新；返回 (大小, sha256)"""
+    h = hashlib.sha256(); n = 0; tmp = dst + ".upload"
+    try:
+        with open(tmp, 'wb') as f:
+            for b in iter(lambda: stream.read(CHUNK), b''):
+                f.write(b); h.update(b); n += len(b)
+                for x in extra: x.update(b)
+        os.replace(tmp, dst)
+    except:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return n, h.hexdigest()
+
+def _reflink(src, tmp):
+    if not sys.platform.startswith('linux'): return False
+    import fcntl
+    try:
+        with open(src, 'rb') as s, open(tmp, 'wb') as d: fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        try: os.remove(tmp)
+        except OSError: pass
+        return False
+
+def _hardlink(src, tmp):
+    try: os.link(src, tmp); return True
+    except (OSError, AttributeError): return False
+
+class ContentStore:
+    """上传去重：按内容 sha256 查找已有文件，副本改为 reflink/硬链接 (同一份数据)，
+    文件系统不支持时保留文件、仅在目录中记为别名；元数据与缩略图直接复用原件的"""
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def absorb(self, p, digest=None):
+        """新文件落盘后调用。返回 {"dup_of", "mode", "saved", "thumb"}；dup_of 为 None 表示内容是新的，
+        thumb 为真表示已复用原件缩略图 (无需再生成)"""
+        digest = digest or hash_file(p)
+        with self._lock:
+            size = os.path.getsize(p)
+            src = catalog.find_hash(digest, size, exclude=p)
+            if not src or os.path.samefile(src, p):
+                catalog.record_hash(p, digest); return {"dup_of": None, "mode": "", "saved": 0, "thumb": False}
+            tmp = p + ".dedup"; mode = "alias"
+            for m, fn in (("reflink", _reflink), ("hardlink", _hardlink)):
+                if fn(src, tmp):
+                    try: os.replace(tmp, p); mode = m; break
+                    except OSError:
+                        try: os.remove(tmp)
+                        except OSError: pass
+            catalog.record_hash(p, digest, mode)
+        thumb = self._under_videos(p) and self._under_videos(src) and self._reuse_thumb(src, p)
+        return {"dup_of": src, "mode": mode, "saved": 0 if mode == "alias" else size, "thumb": thumb}
+
+    @staticmethod
+    def _under_videos(p):
+        return os.path.abspath(p).startswith(os.path.abspath(VIDEO_DIR) + os.sep)
+
+    def _reuse_thumb(self, src, p):
+        """复制原件缩略图 (小文件直接复制，不共享 inode，之后单独改封面互不影响) 并克隆元数据记录"""
+        st = os.path.join(THUMB_DIR, os.path.relpath(src, VIDEO_DIR) + ".jpg")
+        dt = os.path.join(THUMB_DIR, os.path.relpath(p, VIDEO_DIR) + ".jpg")
+        try:
+            if not os.path.exists(st): return False
+            os.makedirs(os.path.dirname(dt), exist_ok=True); shutil.copyfile(st, dt)
+            if not catalog.clone(src, p): return False
+            from utils import record_thumbnail
+            record_thumbnail(p, dt); return True
+        except Exception as e: print(f"Dedup Thumb Error: {e}"); return False
+
+    def report(self):
+        """已节省空间报告：链接共享的副本数/字节数，以及只能记为别名 (仍占空间) 的副本"""
+        st = catalog.dedup_stats()
+        linked = [st.get(m, (0, 0)) for m in ("reflink", "hardlink")]
+        alias = st.get("alias", (0, 0))
+        return {"linked_files": sum(n for n, _ in linked), "reclaimed_bytes": sum(s for _, s in linked),
+                "by_mode": {m: {"files": n, "bytes": s} for m, (n, s) in st.items()},
+                "alias_files": alias[0], "duplicate_bytes": alias[1]}
+
+# 全局单例
+store = ContentStore()
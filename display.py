@@ -0,0 +1,87 @@
+import sys
+import time
+import threading
+from screeninfo import get_monitors, Monitor
+from config import HEADLESS, HEADLESS_MONITORS, DISPLAY_REFRESH, DISPLAY_PROBE
+from events import bus
+
+def _virtual():
+    out = []; x = 0
+    for i, (w, h) in enumerate(HEADLESS_MONITORS):
+        out.append(Monitor(x=x, y=0, width=w, height=h, name=f"VIRTUAL-{i + 1}", is_primary=i == 0)); x += w
+    return out
+
+def _win_probe():
+    """Windows：显示器数量 + 虚拟桌面矩形 + 主屏尺寸，几个 GetSystemMetrics 调用，不枚举显示设备"""
+    import ctypes
+    gm = ctypes.windll.user32.GetSystemMetrics
+    return tuple(gm(i) for i in (80, 76, 77, 78, 79, 0, 1)) # SM_CMONITORS, SM_XVIRTUALSCREEN.., SM_CXSCREEN, SM_CYSCREEN
+
+class DisplayTopology:
+    """显示器拓扑缓存：读接口只返回缓存；后台按 DISPLAY_REFRESH 重新枚举，
+    Windows 上另以 DISPLAY_PROBE 间隔做廉价探测，发现变化立即重新枚举。
+    几何信息真正变化时递增 version、通知监听者并发布 display 事件"""
+    def __init__(self):
+        self.version = 0
+        self._mons = ()
+        self._sig = None
+        self._json = []
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._thread = None
+        self._probe = _win_probe if sys.platform.startswith('win') and not HEADLESS else None
+
+    def monitors(self):
+        if self._sig is None: self.refresh()
+        return self._mons
+
+    def to_json(self):
+        """[{id, width, height, x, y}]，按版本缓存"""
+        if self._sig is None: self.refresh()
+        return self._json
+
+    def listen(self, fn):
+        """fn(version, monitors) 在拓扑变化时于后台线程调用"""
+        self._listeners.append(fn)
+
+    def refresh(self):
+        """重新枚举；几何变化返回 True"""
+        if HEADLESS: ms = _virtual()
+        else:
+            try: ms = get_monitors()
+            except Exception as e:
+                print(f"Display Enumerate Error: {e}")
+                if self._sig is not None: return False
+                ms = []
+        sig = tuple((m.x, m.y, m.width, m.height) for m in ms)
+        with self._lock:
+            if sig == self._sig: return False
+            first = self._sig is None
+            self._mons = tuple(ms); self._sig = sig; self.version += 1
+            self._json = [{"id": i, "width": m.width, "height": m.height, "x": m.x, "y": m.y} for i, m in enumerate(ms)]
+        if first: return True
+        print(f"Display topology changed (v{self.version}): {sig}")
+        bus.publish("display", {"version": self.version, "monitors": self._json})
+        for fn in self._listeners:
+            try: fn(self.version, self._mons)
+            except Exception as e: print(f"Display Listener Error: {e}")
+        return True
+
+    def start(self):
+        if self._thread: return
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+
+    def _run(self):
+        last = time.monotonic(); probe = None
+        while True:
+            time.sleep(DISPLAY_PROBE if self._probe else DISPLAY_REFRESH)
+            try:
+                if self._probe:
+                    p = self._probe()
+                    if probe is not None and p != probe: self.refresh(); last = time.monotonic()
+                    probe = p
+                if time.monotonic() - last >= DISPLAY_REFRESH: self.refresh(); last = time.monotonic()
+            except Exception as e: print(f"Display Monitor Error: {e}")
+
+# 全局单例
+display = DisplayTopology()
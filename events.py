@@ -0,0 +1,66 @@
+import json
+import time
+import threading
+from collections import deque
+
+class EventBus:
+    """带递增序号的事件总线，长轮询和 SSE 推送共用同一份环形日志"""
+    def __init__(self, maxlen=2000):
+        self._cond = threading.Condition()
+        self._log = deque(maxlen=maxlen)
+        self._seq = 0
+        self._listeners = []
+
+    def listen(self, fn, kinds=None):
+        """进程内同步回调 (用于缓存失效)，回调必须很快且不抛异常"""
+        self._listeners.append((fn, kinds))
+
+    @property
+    def seq(self): return self._seq
+
+    def publish(self, kind, data=None):
+        with self._cond:
+            self._seq += 1
+            self._log.append((self._seq, kind, data))
+            self._cond.notify_all()
+            seq = self._seq
+        for fn, kinds in self._listeners:
+            if not kinds or kind in kinds:
+                try: fn(seq, kind, data)
+                except Exception as e: print(f"Event Listener Error: {e}")
+        return seq
+
+    def _since(self, seq, kinds):
+        out = [e for e in self._log if e[0] > seq and (not kinds or e[1] in kinds)]
+        if self._log and seq < self._log[0][0] - 1: out.insert(0, (self._log[0][0] - 1, "reset", None))
+        return out
+
+    def since(self, seq, kinds=None):
+        """返回序号大于 seq 的事件；日志已被覆盖时首项为 reset 事件 (客户端应全量刷新)"""
+        with self._cond: return self._since(seq, kinds), self._seq
+
+    def wait(self, seq, timeout=25, kinds=None):
+        """阻塞直到有新事件或超时 (长轮询)，返回 (事件列表, 已检查到的序号)"""
+        end = time.time() + timeout
+        with self._cond:
+            while True:
+                ev = self._since(seq, kinds)
+                if ev: return ev, self._seq
+                seq = self._seq # 被过滤掉的事件不再重复检查
+                left = end - time.time()
+                if left <= 0: return [], seq
+                self._cond.wait(left)
+
+def sse_format(seq, kind, data):
+    return f"id: {seq}\nevent: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_stream(bus, seq, kinds=None, heartbeat=15):
+    """SSE 生成器：按序推送事件，空闲时发送注释心跳保持连接"""
+    yield "retry: 2000\n\n"
+    while True:
+        ev, seq = bus.wait(seq, heartbeat, kinds)
+        if not ev: yield ": ping\n\n"; continue
+        for s, k, d in ev: yield sse_format(s, k, d)
+
+# 全局单例
+bus = EventBus()
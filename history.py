@@ -0,0 +1,87 @@
+import math
+import threading
+from array import array
+
+SERIES = ("cpu", "mem", "gpu", "net_up", "net_down", "playing")
+MAX_POINTS = 2000 # 单次查询最多返回的桶数
+
+class Ring:
+    """定长环形缓冲 (array 连续存储)，写满后覆盖最旧的数据"""
+    __slots__ = ("cap", "buf", "n", "head")
+    def __init__(self, cap, typecode='f'):
+        self.cap = cap; self.buf = array(typecode, [0]) * cap; self.n = 0; self.head = 0
+    def append(self, v):
+        self.buf[self.head] = v; self.head = (self.head + 1) % self.cap
+        if self.n < self.cap: self.n += 1
+    def values(self):
+        """按时间先后返回 (旧 -> 新)"""
+        if self.n < self.cap: return self.buf[:self.n]
+        return self.buf[self.head:] + self.buf[:self.head]
+
+class History:
+    """硬件监控时间序列：近期原始采样 + 长期按分钟聚合 (min/avg/max)，内存固定"""
+    def __init__(self, interval, raw_seconds, days, bucket=60):
+        self.interval = interval; self.bucket = bucket
+        cap = max(2, int(raw_seconds / interval) + 1)
+        self.raw_t = Ring(cap, 'd'); self.raw = {n: Ring(cap) for n in SERIES}
+        cap = max(2, int(days * 86400 / bucket))
+        self.agg_t = Ring(cap, 'd'); self.agg = {n: (Ring(cap), Ring(cap), Ring(cap)) for n in SERIES}
+        self._acc = None # 当前分钟: [起始时间, 样本数, {名称: [min, sum, max]}]
+        self._lock = threading.Lock()
+
+    def add(self, t, sample):
+        with self._lock:
+            self.raw_t.append(t)
+            for n in SERIES: self.raw[n].append(sample.get(n, 0))
+            b = t - t % self.bucket
+            if self._acc and self._acc[0] != b: self._flush()
+            if not self._acc: self._acc = [b, 0, {n: [math.inf, 0.0, -math.inf] for n in SERIES}]
+            self._acc[1] += 1
+            for n in SERIES:
+                v = sample.get(n, 0); a = self._acc[2][n]
+                if v < a[0]: a[0] = v
+                if v > a[2]: a[2] = v
+                a[1] += v
+
+    def _flush(self):
+        b, cnt, acc = self._acc; self._acc = None
+        self.agg_t.append(b)
+        for n in SERIES:
+            lo, s, hi = acc[n]; r = self.agg[n]
+            r[0].append(lo); r[1].append(s / cnt); r[2].append(hi)
+
+    def query(self, now, window, step=0, names=SERIES):
+        """最近 window 秒、每 step 秒一个桶的 min/avg/max；原始采样覆盖不到时改用分钟聚合"""
+        names = [n for n in names if n in SERIES] or list(SERIES)
+        window = max(self.interval, float(window)); start = now - window
+        step = max(float(step or 0), window / MAX_POINTS, self.interval)
+        with self._lock:
+            rt = self.raw_t.values()
+            if rt and rt[0] <= start + self.interval:
+                ts = rt; cols = {n: (v, v, v) for n in names for v in [self.raw[n].values()]}
+            else:
+                step = max(step, self.bucket)
+                ts = self.agg_t.values(); cols = {n: tuple(r.values() for r in self.agg[n]) for n in names}
+                if self._acc: # 还没写入聚合的当前分钟也算上，否则最近一分钟总是空的
+                    b, c, acc = self._acc; ts.append(b)
+                    for n in names:
+                        lo, sm, hi = acc[n]; col = cols[n]
+                        col[0].append(lo); col[1].append(sm / c); col[2].append(hi)
+        nb = int(math.ceil(window / step))
+        out = {n: {"min": [None] * nb, "avg": [None] * nb, "max": [None] * nb} for n in names}
+        cnt = [0] * nb; sums = {n: [0.0] * nb for n in names}
+        for i, t in enumerate(ts):
+            k = int((t - start) // step)
+            if k < 0 or k >= nb: continue
+            cnt[k] += 1
+            for n in names:
+                lo, av, hi = cols[n][0][i], cols[n][1][i], cols[n][2][i]; o = out[n]
+                if o["min"][k] is None or lo < o["min"][k]: o["min"][k] = lo
+                if o["max"][k] is None or hi > o["max"][k]: o["max"][k] = hi
+                sums[n][k] += av
+        for n in names:
+            o = out[n]
+            for k in range(nb):
+                if cnt[k]:
+                    o["avg"][k] = round(sums[n][k] / cnt[k], 2); o["min"][k] = round(o["min"][k], 2); o["max"][k] = round(o["max"][k], 2)
+        return {"start": start, "step": step, "t": [round(start + k * step, 3) for k in range(nb)], "series": out}
@@ -0,0 +1,91 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from events import bus
+
+MAX_RESULTS = 200    # 每个任务保留的部分结果/错误条数
+KEEP_FINISHED = 100  # 保留的已结束任务数
+PUBLISH_EVERY = 0.25 # 进度事件最短间隔 (秒)
+
+class Cancelled(Exception):
+    pass
+
+class Job:
+    """后台任务：进度、部分结果、错误，可取消"""
+    def __init__(self, kind, total=0, meta=None):
+        self.id = uuid.uuid4().hex[:12]; self.kind = kind; self.meta = meta or {}
+        self.state = "queued"; self.total = total; self.done = 0
+        self.results = []; self.errors = []; self.value = None
+        self.created = time.time(); self.started = self.finished = None
+        self._cancel = threading.Event(); self._end = threading.Event(); self._pub = 0.0
+
+    @property
+    def cancelled(self): return self._cancel.is_set()
+
+    def check(self):
+        """工作函数在循环中调用：已取消时抛出 Cancelled"""
+        if self._cancel.is_set(): raise Cancelled()
+
+    def step(self, result=None, error=None, n=1):
+        self.done += n
+        if result is not None and len(self.results) < MAX_RESULTS: self.results.append(result)
+        if error is not None and len(self.errors) < MAX_RESULTS: self.errors.append(error)
+        self._publish()
+
+    def _publish(self, force=False):
+        now = time.monotonic()
+        if force or now - self._pub >= PUBLISH_EVERY:
+            self._pub = now; bus.publish("job", self.brief())
+
+    def wait(self, timeout=None): return self._end.wait(timeout)
+
+    def brief(self):
+        return {"id": self.id, "kind": self.kind, "state": self.state, "done": self.done, "total": self.total, "errors": len(self.errors)}
+
+    def to_json(self):
+        d = self.brief()
+        d.update({"meta": self.meta, "results": self.results, "error_list": self.errors, "value": self.value,
+                  "created": self.created, "started": self.started, "finished": self.finished})
+        return d
+
+class JobManager:
+    """有界线程池执行的后台任务；提交立即返回任务 id，进度通过轮询或 job 事件获取"""
+    def __init__(self, workers=2):
+        self._exec = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, total=0, meta=None):
+        """fn(job) 在后台执行，返回值存入 job.value"""
+        job = Job(kind, total, meta)
+        with self._lock:
+            self._jobs[job.id] = job
+            done = [k for k, j in self._jobs.items() if j.finished]
+            for k in done[:max(0, len(done) - KEEP_FINISHED)]: del self._jobs[k]
+        job._publish(True)
+        self._exec.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job.cancelled: job.state = "cancelled"
+        else:
+            job.state = "running"; job.started = time.time(); job._publish(True)
+            try: job.value = fn(job); job.state = "cancelled" if job.cancelled else "done"
+            except Cancelled: job.state = "cancelled"
+            except Exception as e: job.state = "failed"; job.errors.append(str(e))
+        job.finished = time.time(); job._end.set(); job._publish(True)
+
+    def get(self, jid): return self._jobs.get(jid)
+
+    def list(self):
+        with self._lock: return [j.brief() for j in self._jobs.values()]
+
+    def cancel(self, jid):
+        j = self._jobs.get(jid)
+        if not j or j.finished: return False
+        j._cancel.set(); return True
+
+# 全局单例
+jobs = JobManager()
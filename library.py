@@ -0,0 +1,130 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from config import VIDEO_DIR, THUMB_DIR
+from catalog import catalog
+from events import bus
+from thumb_pool import thumb_pool
+from utils import is_video, record_thumbnail
+
+SORT_KEYS = {
+    "name": lambda f: f["name"],
+    "mtime": lambda f: f["mtime"],
+    "duration": lambda f: f["duration"],
+}
+
+class DirSnapshot:
+    """单个目录的扫描结果 (scandir 一次取全)，version 在缩略图就绪等局部更新时递增"""
+    __slots__ = ("path", "mtime_ns", "dirs", "files", "by_name", "version", "orders", "queued")
+    def __init__(self, path, mtime_ns, dirs, files):
+        self.path = path; self.mtime_ns = mtime_ns
+        self.dirs = dirs; self.files = files
+        self.by_name = {f["name"]: f for f in files}
+        self.version = 0
+        self.orders = {} # (sort, desc) -> 排好序的文件列表
+        self.queued = False # 缺失的缩略图是否已整体排队
+
+    def sorted_files(self, sort, desc):
+        k = (sort, desc)
+        if k not in self.orders:
+            self.orders[k] = sorted(self.files, key=SORT_KEYS[sort], reverse=desc)
+        return self.orders[k]
+
+class LibraryIndex:
+    """素材库目录缓存：按目录 mtime 失效，LRU 保留最近浏览的若干目录；
+    文件监视运行时 (watched) 由监视线程主动失效，命中缓存不再 stat 目录"""
+    def __init__(self, max_dirs=64):
+        self.max_dirs = max_dirs
+        self.watched = False
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        bus.listen(self._on_thumb, {"thumb"})
+
+    def invalidate(self, av):
+        with self._lock: self._cache.pop(os.path.abspath(av), None)
+
+    def clear(self):
+        with self._lock: self._cache.clear()
+
+    def snapshot(self, av):
+        av = os.path.abspath(av)
+        if self.watched:
+            with self._lock:
+                snap = self._cache.get(av)
+                if snap: self._cache.move_to_end(av); return snap
+        mtime_ns = os.stat(av).st_mtime_ns
+        with self._lock:
+            snap = self._cache.get(av)
+            if snap and snap.mtime_ns == mtime_ns:
+                self._cache.move_to_end(av); return snap
+        snap = self._scan(av, mtime_ns)
+        with self._lock:
+            self._cache[av] = snap; self._cache.move_to_end(av)
+            while len(self._cache) > self.max_dirs: self._cache.popitem(last=False)
+        return snap
+
+    def _scan(self, av, mtime_ns):
+        dirs, vids, stats = [], [], {}
+        with os.scandir(av) as it:
+            for e in it:
+                try:
+                    if e.is_dir():
+                        ts = None
+                        try: ts = int(os.stat(os.path.join(e.path, "_folder_cover.jpg")).st_mtime)
+                        except OSError: pass
+                        dirs.append({"name": e.name, "cover_ts": ts})
+                    elif is_video(e.name):
+                        # DirEntry.stat() 在 Windows 上直接来自目录枚举结果，无额外系统调用
+                        stats[e.path] = e.stat(); vids.append(e)
+                except OSError: continue
+        dirs.sort(key=lambda d: d["name"])
+        at = os.path.abspath(os.path.join(THUMB_DIR, os.path.relpath(av, VIDEO_DIR)))
+        metas = catalog.lookup_many([e.path for e in vids], stats, probe=False)
+        files = []
+        for e in vids:
+            st = stats[e.path]; m = metas.get(e.path)
+            f = {"name": e.name, "path": e.path, "size": st.st_size, "mtime": int(st.st_mtime),
+                 "duration": m["duration"] if m else 0, "ts": 0, "v": "", "pending": False, "tp": os.path.join(at, e.name + ".jpg")}
+            if m and m["thumb"] and m["thumb_hash"]: f["ts"] = int(m["thumb_mtime"]); f["v"] = m["thumb_hash"]
+            else:
+                try: f["ts"] = int(os.stat(f["tp"]).st_mtime)
+                except OSError: f["pending"] = True
+                else:
+                    # 缩略图已有但没登记哈希：目录有记录就只补哈希；没有记录的交给后台池探测 (缩略图已存在不会重画)，列目录时不解码
+                    f["v"] = record_thumbnail(e.path, f["tp"], probe=False) or ""
+                    if not m: f["pending"] = True
+            files.append(f)
+        return DirSnapshot(av, mtime_ns, dirs, files)
+
+    def page(self, snap, sort="name", desc=False, offset=0, limit=0):
+        fs = snap.sorted_files(sort, desc)
+        sel = fs[offset:offset + limit] if limit > 0 else fs[offset:]
+        # 待生成缩略图：整个文件夹排队一次，每次翻页再把当前页提到最前
+        if not snap.queued:
+            snap.queued = True; low = thumb_pool.new_priority()
+            for f in fs:
+                if f["pending"]: thumb_pool.submit(f["path"], f["tp"], low)
+        hi = thumb_pool.new_priority()
+        for f in sel:
+            if f["pending"]: thumb_pool.submit(f["path"], f["tp"], hi)
+        return sel, len(fs)
+
+    @staticmethod
+    def etag(snap, *params):
+        raw = f"{snap.path}|{snap.mtime_ns}|{snap.version}|" + "|".join(map(str, params))
+        return hashlib.sha1(raw.encode('utf-8', 'surrogatepass')).hexdigest()[:20]
+
+    def _on_thumb(self, seq, kind, data):
+        """缩略图生成完成：原地更新快照条目，不重新扫描目录"""
+        av = os.path.abspath(os.path.join(VIDEO_DIR, os.path.dirname(data["path"])))
+        with self._lock:
+            snap = self._cache.get(av)
+            f = snap.by_name.get(os.path.basename(data["path"])) if snap else None
+            if not f: return
+            f["ts"] = data.get("ts", 0); f["v"] = data.get("v", ""); f["pending"] = False; snap.version += 1
+            if "duration" in data and data["duration"] != f["duration"]:
+                f["duration"] = data["duration"]; snap.orders.pop(("duration", False), None); snap.orders.pop(("duration", True), None)
+
+# 全局单例
+library = LibraryIndex()
@@ -1,19 +1,24 @@
 import threading
-import tkinter as tk
 import time
+_T0 = time.perf_counter() # 开机计时起点
 import os
 import ctypes
 import sys
-from PIL import ImageTk, Image, ImageOps
-from screeninfo import get_monitors
-from flask import Flask
+# 无界面模式 (构建/测试机) 可以没有 Tk
+try: import tkinter as tk
+except ImportError: tk = None
 
-from config import PORT, IDLE_DIR
+from config import PORT, IDLE_DIR, SERVER_MODE, MAX_UPLOAD_BYTES, WATCH_ENABLED, HEADLESS
 from state import state
 from context import ctx
-from routes import main_bp, api_bp
-from utils import create_system_background, sys_monitor # 引入监控实例
+from utils import ensure_system_background, sys_monitor # 引入监控实例
+from display import display
+from catalog import catalog
+from bg_cache import bg_cache
+from watcher import watcher
+from metrics import latency, instrument
 import player_logic
+from controller import controller
 
 # DPI 适配
 try: ctypes.windll.shcore.SetProcessDpiAwareness(1)
@@ -29,34 +34,55 @@ try:
         ctypes.windll.kernel32.SetPriorityClass(h, 0x00000080) 
 except: pass
 
+gui_stat = latency("gui_dispatch", "gui_invoke -> Tk execution latency")
+
+class BootTimer:
+    """开机分阶段计时：每个阶段完成时打印本阶段耗时与距进程启动的累计时间"""
+    def __init__(self, t0): self.t0 = self.last = t0; self._lock = threading.Lock()
+    def mark(self, name):
+        with self._lock:
+            now = time.perf_counter(); d = (now - self.last) * 1000; self.last = now
+            print(f"Startup {name:<12} +{d:6.0f}ms  @{(now - self.t0) * 1000:6.0f}ms")
+
+boot = BootTimer(_T0)
+
 def get_player_state_safe():
     if not ctx.player: return False
     # 1=Opening, 2=Buffering, 3=Playing, 4=Paused
     return ctx.player.get_state() in [1, 2, 3, 4]
 
+def _bg_target_size():
+    ms = display.monitors()
+    if state.target_monitor != -1 and state.target_monitor < len(ms):
+        m = ms[state.target_monitor]; tw, th = m.width, m.height
+    else: tw, th = ctx.root.winfo_screenwidth(), ctx.root.winfo_screenheight()
+    if tw < 100: tw, th = 1920, 1080
+    return tw, th
+
 def update_bg_display():
     if not state.idle_image: ctx.idle_label.config(image='', bg='black'); return
     p = os.path.join(IDLE_DIR, state.idle_image)
     if os.path.exists(p):
         try:
-            ms = get_monitors()
-            if state.target_monitor != -1 and state.target_monitor < len(ms):
-                m = ms[state.target_monitor]; tw, th = m.width, m.height
-            else: tw, th = ctx.root.winfo_screenwidth(), ctx.root.winfo_screenheight()
-            if tw < 100: tw, th = 1920, 1080
-            img = Image.open(p)
-            img = ImageOps.fit(img, (tw, th), Image.Resampling.LANCZOS)
-            tk_img = ImageTk.PhotoImage(img)
+            tw, th = _bg_target_size()
+            tk_img = bg_cache.photo(p, tw, th)
+            if tk_img is None:
+                # 该分辨率的变体尚未生成：后台缩放，完成后再刷新，Tk 线程不做 LANCZOS
+                bg_cache.prepare_async(p, [(tw, th)], lambda: ctx.gui_invoke('update_bg')); return
             ctx.idle_label.config(image=tk_img, bg='black')
             ctx.idle_label.image = tk_img 
             if not get_player_state_safe(): show_bg_layer()
         except: pass
 
 def show_bg_layer(): ctx.idle_label.place(relx=0, rely=0, relwidth=1, relheight=1); ctx.idle_label.lift()
-def hide_bg_layer(): ctx.idle_label.place_forget(); ctx.video_frame.update()
+def hide_bg_layer(): ctx.idle_label.place_forget(); ctx.video_frame.lift(); ctx.video_frame.update()
+def swap_video(i):
+    # 无缝切换：预加载层提升到最上面，背景层如有显示也一并隐藏
+    ctx.video_frames[i].lift(); ctx.idle_label.place_forget(); ctx.video_frames[i].update_idletasks()
+    player_logic.swapped(i) # 图层换完，才能停止旧播放器并在它上面预加载下一条
 
 def _gui_screen_test():
-    ms = get_monitors()
+    ms = display.monitors()
     def show_monitor(idx):
         if idx >= len(ms): return
         m = ms[idx]
@@ -66,56 +92,165 @@ def _gui_screen_test():
         ctx.root.after(1500, lambda: (win.destroy(), show_monitor(idx + 1)))
     show_monitor(0)
 
-def gui_loop():
+def _on_display_change(ver, ms):
+    """显示器插拔/分辨率变化 (几何不变时不会触发)：重新布局窗口并按新分辨率重新适配待机图"""
+    state.touch()
+    p = os.path.join(IDLE_DIR, state.idle_image) if state.idle_image else None
+    if p and os.path.exists(p): bg_cache.prepare_async(p, [(m.width, m.height) for m in ms])
+    if state.target_monitor != -1 and state.target_monitor < len(ms): ctx.gui_invoke('move_window', state.target_monitor)
+    else: ctx.gui_invoke('update_bg')
+
+def _resume():
+    """续播存档中的当前条目：窗口与播放器就绪后立即开始，不等 Web 服务和监控线程"""
+    i = state.playlist.index_of(state.resume_id) if state.resume_id is not None else -1
+    if i < 0: return False
+    player_logic.when_playing(lambda: boot.mark("first_frame"))
+    controller.submit("play", i); return True # 播放器只由控制线程驱动
+
+def _system_bg():
+    """二维码待机图：IP/端口与上次相同则沿用已有图片 (后台线程，开机首帧不等它)"""
     try:
+        fn, key, fresh = ensure_system_background(state.sys_bg_key)
+        if not fn: return
+        def apply():
+            # 状态只在控制线程修改
+            first = not state.idle_image
+            if first: state.idle_image = fn
+            if fresh: state.sys_bg_key = key
+            if fresh or first: state.save_state()
+            if state.idle_image == fn and (fresh or first): ctx.gui_invoke('update_bg')
+        controller.call(apply)
+        boot.mark("system_bg" if fresh else "system_bg (cached)")
+    except Exception as e: print(f"System Background Error: {e}")
+
+def _gui_exec(cmd, args):
+    if cmd == 'move_window':
+        i = args[0]; ms = display.monitors()
+        if i < len(ms):
+            m = ms[i]
+            ctx.root.attributes('-fullscreen', False); ctx.root.deiconify()
+            ctx.root.geometry(f"{m.width}x{m.height}+{m.x}+{m.y}")
+            ctx.root.update(); ctx.root.attributes('-fullscreen', True)
+            update_bg_display()
+            if not get_player_state_safe(): show_bg_layer()
+    elif cmd == 'hide_window': ctx.root.withdraw()
+    elif cmd == 'screen_test': _gui_screen_test()
+    elif cmd == 'show_bg_layer': show_bg_layer()
+    elif cmd == 'hide_bg_layer': hide_bg_layer()
+    elif cmd == 'update_bg': update_bg_display()
+    elif cmd == 'lift_video': hide_bg_layer()
+    elif cmd == 'swap_video': swap_video(*args)
+
+class NullSurface:
+    """无界面模式的空 "屏幕"：GUI 指令不做绘制，只记录最终的图层/窗口状态供调试"""
+    def __init__(self):
+        self.layer = "bg"; self.video = 0; self.monitor = -1; self.hidden = False; self.count = 0
+        self._wake = threading.Event()
+        ctx.on_wake = self._wake.set
+
+    def exec(self, cmd, args):
+        self.count += 1
+        if cmd == 'show_bg_layer': self.layer = "bg"
+        elif cmd in ('hide_bg_layer', 'lift_video'): self.layer = "video"
+        elif cmd == 'swap_video': self.layer = "video"; self.video = args[0]; player_logic.swapped(args[0])
+        elif cmd == 'move_window': self.monitor = args[0]; self.hidden = False
+        elif cmd == 'hide_window': self.hidden = True
+
+    def run(self):
+        """主线程循环：被 gui_invoke 唤醒后处理队列 (替代 Tk mainloop)"""
         while True:
-            cmd, args = ctx.gui_queue.get_nowait()
-            if cmd == 'move_window':
-                i = args[0]; ms = get_monitors()
-                if i < len(ms):
-                    m = ms[i]
-                    ctx.root.attributes('-fullscreen', False); ctx.root.deiconify()
-                    ctx.root.geometry(f"{m.width}x{m.height}+{m.x}+{m.y}")
-                    ctx.root.update(); ctx.root.attributes('-fullscreen', True)
-                    update_bg_display()
-                    if not get_player_state_safe(): show_bg_layer()
-            elif cmd == 'hide_window': ctx.root.withdraw()
-            elif cmd == 'screen_test': _gui_screen_test()
-            elif cmd == 'show_bg_layer': show_bg_layer()
-            elif cmd == 'hide_bg_layer': hide_bg_layer()
-            elif cmd == 'update_bg': update_bg_display()
-            elif cmd == 'lift_video': hide_bg_layer()
-    except: pass
-    ctx.root.after(100, gui_loop)
+            self._wake.wait(1.0); self._wake.clear(); gui_dispatch()
+
+_surface_exec = _gui_exec # GUI 指令的执行者：Tk 界面，或无界面模式下的 NullSurface.exec
+
+def gui_dispatch(event=None):
+    """由 <<GuiWake>> 虚拟事件触发，处理队列中全部指令"""
+    items = ctx.gui_take()
+    # move_window 内部会刷新背景，之前排队的 update_bg 可以跳过
+    if any(c == 'move_window' for c, _, _ in items):
+        last_move = max(i for i, (c, _, _) in enumerate(items) if c == 'move_window')
+        items = [x for i, x in enumerate(items) if not (x[0] == 'update_bg' and i < last_move)]
+    for cmd, args, t0 in items:
+        gui_stat.observe((time.perf_counter() - t0) * 1000)
+        try: _surface_exec(cmd, args)
+        except Exception as e: print(f"GUI Error ({cmd}): {e}")
+
+def gui_poll():
+    # Tcl 非线程版 (无法跨线程 event_generate) 时 100ms 轮询；否则保留 1 秒一次的慢速兜底，唤醒事件丢失时队列也能排空
+    if ctx.gui_queue: gui_dispatch()
+    ctx.root.after(100 if not ctx.gui_wake_ok else 1000, gui_poll)
 
 def start_flask():
+    # Web 依赖 (flask/werkzeug/OpenCV/numpy...) 在续播开始后才于本线程导入
+    from flask import Flask
+    from routes import main_bp, api_bp
+    from server import serve
     app = Flask(__name__)
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
     app.register_blueprint(main_bp); app.register_blueprint(api_bp, url_prefix='/api')
-    app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+    instrument(app) # 按路由统计请求数与耗时，/metrics 导出
+    boot.mark("web")
+    if SERVER_MODE == "dev": app.run(host='0.0.0.0', port=PORT, debug=False, use_reloader=False)
+    else: serve(app, '0.0.0.0', PORT)
 
-def main():
-    # 启动监控线程
+def _start_services():
+    """续播开始之后再启动的后台服务：硬件监控、显示器检测、目录清理/监视、Web 服务"""
     sys_monitor.start()
+    # 显示器拓扑缓存：后台检测变化，只有几何变化时才重新布局
+    display.listen(_on_display_change); display.start()
+    # 后台清理元数据目录中已不存在的文件
+    threading.Thread(target=catalog.prune, daemon=True).start()
+    # 监视素材/待机图目录，保持目录缓存与缩略图同步
+    if WATCH_ENABLED: watcher.start()
+    t = threading.Thread(target=start_flask); t.daemon = True; t.start()
+    boot.mark("services")
+
+def main_headless():
+    """无界面运行：HTTP + 播放逻辑完整运行，播放由 config.PLAYER_BACKEND 决定 (默认 sim)，画面指令由 NullSurface 吸收"""
+    global _surface_exec
+    boot.mark("imports")
+    player_logic.init(); boot.mark("player")
+    surface = NullSurface(); _surface_exec = surface.exec
+    if _resume(): boot.mark("resume")
+    _start_services()
+    print(f"Headless mode: player backend = {player_logic.backend.name}, port {PORT}")
+    surface.run()
+
+def main():
+    if HEADLESS: return main_headless()
+    boot.mark("imports")
+    # libvlc 初始化 (扫描插件) 与建窗口并行
+    pt = threading.Thread(target=player_logic.init, daemon=True); pt.start()
 
     root = tk.Tk(); root.title("LED Pro"); root.configure(bg="black"); root.config(cursor="none")
     ctx.root = root
-    ctx.video_frame = tk.Frame(root, bg="black"); ctx.video_frame.pack(fill=tk.BOTH, expand=True)
+    # 两层重叠的视频区域：一层播放，另一层隐藏预加载下一条
+    for _ in range(2):
+        f = tk.Frame(root, bg="black"); f.place(relx=0, rely=0, relwidth=1, relheight=1); ctx.video_frames.append(f)
+    ctx.video_frame = ctx.video_frames[0]; ctx.video_frame.lift()
     ctx.idle_label = tk.Label(root, bg="black")
+    root.bind('<<GuiWake>>', gui_dispatch)
+    ctx.gui_wake_ok = bool(root.tk.call('info', 'exists', 'tcl_platform(threaded)'))
+    gui_poll(); boot.mark("window")
+    pt.join(); player_logic.init(); boot.mark("player") # 后台初始化失败时在这里重试并抛出
 
-    t = threading.Thread(target=start_flask); t.daemon = True; t.start()
+    # 先把窗口放到目标屏幕并续播，Web 服务、监控线程随后启动
+    ms = display.monitors()
+    if state.target_monitor != -1 and state.target_monitor < len(ms): _gui_exec('move_window', (state.target_monitor,))
+    else: root.withdraw()
+    if _resume(): boot.mark("resume")
+    _start_services()
+    threading.Thread(target=_system_bg, daemon=True).start()
 
     def init():
         try:
-            gui_loop(); ms = get_monitors()
-            sys_bg = create_system_background()
-            if not state.idle_image or state.idle_image == "_system_default_bg.jpg":
-                if sys_bg: state.idle_image = sys_bg; state.save_state()
-            if state.target_monitor != -1 and state.target_monitor < len(ms): ctx.gui_invoke('move_window', state.target_monitor)
-            else: root.withdraw()
+            if state.idle_image and os.path.exists(os.path.join(IDLE_DIR, state.idle_image)):
+                # 预热：为所有显示器分辨率准备当前待机图，切换屏幕时直接命中缓存
+                bg_cache.prepare_async(os.path.join(IDLE_DIR, state.idle_image), [(m.width, m.height) for m in display.monitors()])
             update_bg_display()
             if not state.playlist and not get_player_state_safe(): show_bg_layer()
         except: pass
     
-    root.after(1000, init); root.mainloop()
+    root.after_idle(init); root.mainloop()
 
 if __name__ == '__main__': main()
\ No newline at end of file
@@ -0,0 +1,120 @@
+import time
+import bisect
+
+# 默认直方图桶 (毫秒)
+DEFAULT_BUCKETS = (1, 2, 5, 10, 20, 40, 80, 160, 320, 640, 1280, 5000)
+
+PREFIX = "ledpro_"
+
+class LatencyStat:
+    """轻量耗时统计：计数/总和/最大/最近值 + 固定桶直方图，热路径只做几次整数运算。
+    不加锁：依赖 GIL，极少数并发更新可能丢一次计数，换取热路径零开销"""
+    __slots__ = ("name", "help", "labels", "buckets", "counts", "count", "total", "max", "last")
+    def __init__(self, name, help="", buckets=DEFAULT_BUCKETS, labels=()):
+        self.name = name; self.help = help; self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # 最后一格为 +Inf
+        self.count = 0; self.total = 0.0; self.max = 0.0; self.last = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(self.buckets, ms)] += 1
+        self.count += 1; self.total += ms; self.last = ms
+        if ms > self.max: self.max = ms
+
+    def time(self):
+        """with stat.time(): ... 自动计时"""
+        return _Timer(self)
+
+    def snapshot(self):
+        return {"count": self.count, "avg_ms": round(self.total / self.count, 3) if self.count else 0,
+                "max_ms": round(self.max, 3), "last_ms": round(self.last, 3)}
+
+class _Timer:
+    __slots__ = ("stat", "t0")
+    def __init__(self, stat): self.stat = stat
+    def __enter__(self): self.t0 = time.perf_counter(); return self
+    def __exit__(self, *exc): self.stat.observe((time.perf_counter() - self.t0) * 1000)
+
+_registry = {}   # 名称 -> LatencyStat
+_families = {}   # 名称 -> {标签元组: LatencyStat}，按标签区分的同名统计 (如按路由)
+_counters = {}   # 名称 -> (说明, 标签名, {标签值元组: 计数})
+_gauges = {}     # 名称 -> (说明, 取值回调)，抓取时才求值，热路径无开销
+
+def latency(name, help="", **labels):
+    """按名称 (和标签) 获取 (不存在则创建) 耗时统计，模块级调用一次后直接持有引用"""
+    if labels:
+        fam = _families.setdefault(name, {}); key = tuple(sorted(labels.items()))
+        st = fam.get(key)
+        if st is None: st = fam[key] = LatencyStat(name, help, labels=key)
+        return st
+    st = _registry.get(name)
+    if st is None: st = _registry[name] = LatencyStat(name, help)
+    return st
+
+def counter(name, help, labelnames):
+    """带标签的计数器，返回 {标签值元组: 计数} 字典，调用方直接 d[k] = d.get(k, 0) + 1"""
+    c = _counters.get(name)
+    if c is None: c = _counters[name] = (help, tuple(labelnames), {})
+    return c[2]
+
+def gauge(name, help, fn):
+    """注册瞬时值 (队列深度、CPU 占用等)，fn 在 /metrics 抓取时调用"""
+    _gauges[name] = (help, fn)
+
+def snapshot_all():
+    d = {n: s.snapshot() for n, s in _registry.items()}
+    for n, fam in _families.items():
+        for key, s in fam.items(): d[n + "{" + ",".join(f"{k}={v}" for k, v in key) + "}"] = s.snapshot()
+    return d
+
+def _lbl(pairs):
+    if not pairs: return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')) for k, v in pairs) + "}"
+
+def _hist(out, s):
+    base = PREFIX + s.name + "_seconds"; cum = 0
+    for b, c in zip(s.buckets, s.counts):
+        cum += c; out.append(f"{base}_bucket{_lbl(s.labels + (('le', repr(b / 1000)),))} {cum}")
+    out.append(f"{base}_bucket{_lbl(s.labels + (('le', '+Inf'),))} {s.count}")
+    out.append(f"{base}_sum{_lbl(s.labels)} {s.total / 1000:.6f}")
+    out.append(f"{base}_count{_lbl(s.labels)} {s.count}")
+
+def render_prometheus():
+    """Prometheus 文本格式 (0.0.4)：耗时统计导出为秒为单位的直方图"""
+    out = []
+    stats = [[s] for s in _registry.values()] + [list(f.values()) for f in _families.values()]
+    for group in stats:
+        if not group: continue
+        s0 = group[0]; base = PREFIX + s0.name + "_seconds"
+        out.append(f"# HELP {base} {s0.help or s0.name}"); out.append(f"# TYPE {base} histogram")
+        for s in group: _hist(out, s)
+    for name, (help, labelnames, vals) in list(_counters.items()):
+        base = PREFIX + name + "_total"
+        out.append(f"# HELP {base} {help}"); out.append(f"# TYPE {base} counter")
+        for key, v in list(vals.items()): out.append(f"{base}{_lbl(tuple(zip(labelnames, key)))} {v}")
+    for name, (help, fn) in list(_gauges.items()):
+        try: v = fn()
+        except Exception: continue
+        if v is None: continue
+        out.append(f"# HELP {PREFIX}{name} {help}"); out.append(f"# TYPE {PREFIX}{name} gauge"); out.append(f"{PREFIX}{name} {float(v):g}")
+    return "\n".join(out) + "\n"
+
+def instrument(app):
+    """按路由 (endpoint) 统计请求数与耗时；每个路由的统计对象只在首次出现时创建。
+    流式响应 (SSE/视频流) 记录的是生成响应头的耗时"""
+    from flask import request
+    stats = {}; codes = counter("http_requests", "HTTP requests by route and status", ("route", "code"))
+
+    @app.before_request
+    def _t0(): request.environ["ledpro.t0"] = time.perf_counter()
+
+    @app.after_request
+    def _t1(resp):
+        t0 = request.environ.get("ledpro.t0")
+        if t0 is not None:
+            ep = request.endpoint or "<unmatched>"
+            st = stats.get(ep)
+            if st is None: st = stats[ep] = latency("http_request", "HTTP request latency by route", route=ep)
+            st.observe((time.perf_counter() - t0) * 1000)
+            k = (ep, resp.status_code); codes[k] = codes.get(k, 0) + 1
+        return resp
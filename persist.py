@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import threading
+
+def atomic_write_json(path, data, indent=None):
+    """写临时文件 + fsync + os.replace，断电时要么是旧文件要么是新文件"""
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def read_json_with_journal(path):
+    """读取快照并重放同一代 (gen) 的日志记录，返回 (数据, 已重放条数)；日志末尾被截断的半行直接忽略"""
+    with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    gen = data.get("_gen", 0); jp = path + ".journal"; n = 0
+    if os.path.exists(jp):
+        with open(jp, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: break
+                if rec.get("gen") == gen: data.update(rec.get("set", {})); n += 1
+    return data, n
+
+class DebouncedWriter:
+    """后台合并写入：一个防抖窗口内的多次变更只落盘一次。
+    小字段变更追加到日志 (.journal)，大字段变更或日志过长时压缩为完整快照。"""
+    def __init__(self, path, snapshot, debounce=0.5, journal=True, compact_keys=(), max_journal=200, stat=None):
+        self.path = path
+        self.snapshot = snapshot          # 返回当前完整数据 dict 的回调
+        self.debounce = debounce
+        self.journal = journal
+        self.compact_keys = set(compact_keys)
+        self.max_journal = max_journal
+        self.last_write_ms = 0.0
+        self.writes = 0
+        self.stat = stat                  # 可选 LatencyStat，记录每次落盘耗时
+        self._cond = threading.Condition()
+        self._io = threading.Lock()
+        self._dirty = False
+        self._writing = False             # 后台线程已取走变更、正在落盘
+        self._persisted = None
+        self._gen = 0
+        self._jcount = 0
+        self._thread = None
+
+    def loaded(self, data, journal_len=0):
+        """load 之后登记磁盘上的内容，用于计算后续增量"""
+        self._persisted = {k: v for k, v in data.items() if k != "_gen"}
+        self._gen = data.get("_gen", 0); self._jcount = journal_len
+        if self._torn(): self._jcount = self.max_journal # 末尾半行：下次直接压缩，别把新记录接在半行后面
+
+    def _torn(self):
+        try:
+            with open(self.path + ".journal", 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if not f.tell(): return False
+                f.seek(-1, os.SEEK_END); return f.read(1) != b"\n"
+        except OSError: return False
+
+    def schedule(self):
+        with self._cond:
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True); self._thread.start()
+            self._cond.notify()
+
+    def flush(self):
+        """同步落盘 (退出/关机前调用)；后台正在写的那一次也要等它写完再返回"""
+        with self._cond:
+            while self._writing: self._cond.wait()
+            if not self._dirty: return
+            self._dirty = False
+        self._write()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._dirty: self._cond.wait()
+            time.sleep(self.debounce) # 合并窗口：期间的连续变更一起写
+            with self._cond:
+                if not self._dirty: continue # 窗口内已被 flush 写掉
+                self._dirty = False; self._writing = True
+            try: self._write()
+            except Exception as e: print(f"State Save Error: {e}")
+            finally:
+                with self._cond: self._writing = False; self._cond.notify_all()
+
+    def _write(self):
+        with self._io:
+            t0 = time.perf_counter()
+            data = self.snapshot()
+            old = self._persisted
+            changed = {k: v for k, v in data.items() if old is None or old.get(k) != v}
+            if not changed: return
+            use_journal = (self.journal and old is not None and os.path.exists(self.path)
+                           and not (self.compact_keys & changed.keys()) and self._jcount < self.max_journal)
+            if use_journal:
+                with open(self.path + ".journal", 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({"gen": self._gen, "t": round(time.time(), 3), "set": changed}, ensure_ascii=False) + "\n")
+                    f.flush(); os.fsync(f.fileno())
+                self._jcount += 1
+            else:
+                # 压缩：写入新一代完整快照后截断日志 (旧代日志即使残留也不会被重放)
+                self._gen += 1
+                atomic_write_json(self.path, dict(data, _gen=self._gen), indent=2)
+                if os.path.exists(self.path + ".journal"): open(self.path + ".journal", 'w').close()
+                self._jcount = 0
+            self._persisted = data; self.writes += 1
+            self.last_write_ms = (time.perf_counter() - t0) * 1000
+            if self.stat: self.stat.observe(self.last_write_ms)
@@ -1,77 +1,183 @@
-import os
 import sys
-import vlc
-import threading
 import time
-import random
-from config import IDLE_DIR
+import threading
+from collections import deque
+from config import IDLE_DIR, GAPLESS, PLAY_HISTORY
 from state import state
 from context import ctx
+from metrics import latency
+from playlist import ShuffleBag
+import backends
+
+# 播放后端 (config.PLAYER_BACKEND)：vlc 真实播放，sim 虚拟时钟模拟 (无界面压测/CI)；由 init() 创建
+backend = None
+
+# 双播放器：players[_active] 正在播放，另一个在隐藏画面上预加载下一条
+players = []
+_init_lock = threading.Lock()
+_once = []                                # 下一次进入 Playing 时调用一次的回调 (开机首帧计时)
+_active = 0
+_preroll = {"idx": -1, "path": None}
+_swapping = None                          # 已切到的播放器下标，GUI 尚未换完图层：期间旧播放器仍在最上面，不能停止或预加载
+_bag = ShuffleBag()                       # random 模式：下一首在真正开播前不消耗，保证预加载与实际切换一致
+_history = deque(maxlen=PLAY_HISTORY)     # 实际播放过的条目 id，"上一首" 沿它回溯
+_gap = {"t0": 0.0, "player": None, "layer": None} # 切换计时：EndReached -> 新条目 Playing；无缝切换量到图层换完
+gap_stat = latency("transition_gap", "clip transition gap (EndReached -> next Playing, or -> layer swap when gapless)")
+
+def init():
+    """创建播放后端与两个播放器；libvlc 初始化要扫描插件，较慢，不放在导入时 (main 在建窗口的同时于后台调用)。可重复调用"""
+    global backend
+    with _init_lock:
+        if backend: return backend
+        b = backends.create(); ps = [b.new_player(), b.new_player()]
+        for p in ps: b.watch(p, _on_end, _on_playing)
+        players[:] = ps; ctx.player = ps[0]; backend = b
+    return b
+
+def when_playing(fn):
+    """当前播放器下一次进入 Playing 时调用 fn() (只调用一次)"""
+    _once.append(fn)
+
+def _bind(p, frame): backend.bind(p, frame)
 
-# VLC 启动参数优化
-# --file-caching=300: 将本地缓存降为 300ms，极大减少操作延迟
-# --network-caching=1000: 网络流保持 1s 缓存
-vlc_args = (
-    "--no-xlib --no-osd --quiet "
-    "--avcodec-hw=any "
-    "--file-caching=300 "     
-    "--network-caching=1000 " 
-    "--clock-jitter=0 --clock-synchro=0 "
-    "--mmdevice-passthrough=disabled "
-)
-
-try:
-    vlc_instance = vlc.Instance(vlc_args)
-    if vlc_instance is None: raise Exception("VLC Init Failed")
-    player = vlc_instance.media_player_new()
-    ctx.player = player 
-except Exception as e:
-    print(f"VLC Init Error: {e}, using fallback mode.")
-    vlc_instance = vlc.Instance("--no-xlib --quiet")
-    player = vlc_instance.media_player_new()
-    ctx.player = player
-
-def play_by_index(idx):
+def _frame(i):
+    return ctx.video_frames[i] if len(ctx.video_frames) > i else ctx.video_frame
+
+def next_index():
+    """按循环模式决定下一首"""
+    n = len(state.playlist)
+    if n == 0: return -1
+    if state.loop_mode == "random":
+        if n == 1: return 0
+        return state.playlist.index_of(_bag.peek(state.playlist, state.current_id))
+    elif state.loop_mode == "single": return state.current_idx if state.current_idx >= 0 else 0
+    return (state.current_idx + 1) % n
+
+def _apply_audio(p):
+    # 重新应用音量设置
+    p.audio_set_mute(state.is_muted)
+    p.audio_set_volume(state.volume)
+
+def _started(record=True):
+    """新条目开播：消耗洗牌袋并记入历史 (回溯 "上一首" 时不再记录)；当前条目写入存档，断电重启后从这里续播"""
+    iid = state.current_id; state.paused = False
+    _bag.played(iid); state.save_state()
+    if record and (not _history or _history[-1] != iid): _history.append(iid)
+
+def play_previous(steps=1):
+    """沿播放历史回退 steps 条 (跳过已从列表删除的)；没有历史时按列表顺序后退"""
+    if _history and _history[-1] == state.current_id: _history.pop()
+    target = -1
+    while _history and steps > 0:
+        target = state.playlist.index_of(_history[-1])
+        if target < 0: _history.pop(); continue
+        steps -= 1
+        if steps: _history.pop()
+    if target < 0: target = max(0, state.current_idx - steps) if state.current_idx >= 0 else 0
+    play_by_index(target, record=False)
+
+def play_by_index(idx, record=True):
     if 0 <= idx < len(state.playlist):
-        state.current_idx = idx
         p = state.playlist[idx]['path']
-        
+        if GAPLESS and _preroll["idx"] == idx and _preroll["path"] == p:
+            _swap_to_preroll(record); return
+        state.current_idx = idx; _started(record)
+        cur = players[_active]
+
         # 停止操作可能需要一点时间，但不应阻塞
-        if player.is_playing(): 
-            player.stop()
-        
-        media = vlc_instance.media_new(os.path.abspath(p))
-        player.set_media(media)
-        
+        if cur.is_playing():
+            cur.stop()
+
+        backend.load(cur, p)
+
         if ctx.video_frame:
             # update_idletasks 比 update 更轻量
             ctx.root.update_idletasks()
-            if sys.platform.startswith('win'): player.set_hwnd(ctx.video_frame.winfo_id())
-            elif sys.platform.startswith('linux'): player.set_xwindow(ctx.video_frame.winfo_id())
-        
+            _bind(cur, _frame(_active))
+
         ctx.gui_invoke('lift_video')
-        player.play()
-        
-        # 重新应用音量设置
-        player.audio_set_mute(state.is_muted)
-        player.audio_set_volume(state.volume)
-        
-        if sys.platform == 'darwin': player.set_fullscreen(True)
+        if _gap["t0"]: _gap["player"] = cur
+        cur.play()
+        _apply_audio(cur)
+
+        if sys.platform == 'darwin': cur.set_fullscreen(True)
+        state.touch()
+        prepare_next()
+
+def _swap_to_preroll(record=True):
+    """切换到预加载好的播放器：画面已解码首帧并暂停，只需取消暂停 + 提升图层。
+    旧播放器等 GUI 线程真正换完图层 (swapped) 后才停止并预加载下一条，否则换层前会露出黑屏或下一条的首帧"""
+    global _active, _swapping
+    _active ^= 1; new = players[_active]; _swapping = _active
+    state.current_idx = _preroll["idx"]; _preroll["idx"] = -1; _preroll["path"] = None; _started(record)
+    ctx.player = new; ctx.video_frame = _frame(_active)
+    if _gap["t0"]: _gap["player"] = None; _gap["layer"] = _active
+    _apply_audio(new)
+    new.set_pause(0)
+    ctx.gui_invoke('swap_video', _active)
+    if sys.platform == 'darwin': new.set_fullscreen(True)
+    state.touch()
+
+def swapped(i):
+    """GUI 线程：第 i 层已提升到最上面。记录切换间隙，旧播放器的停止与预加载交给控制线程"""
+    if _gap["t0"] and _gap["layer"] == i:
+        gap_stat.observe((time.perf_counter() - _gap["t0"]) * 1000)
+        _gap["t0"] = 0.0; _gap["layer"] = None
+    from controller import controller
+    controller.submit("swapped", i)
+
+def retire(i):
+    """控制线程：图层已换到 i (且之后没有再切换)，停止换下来的播放器并在它上面预加载下一条"""
+    global _swapping
+    if _swapping != i or _active != i: return
+    _swapping = None
+    players[i ^ 1].stop()
+    prepare_next()
+
+def prepare_next():
+    """在隐藏的第二个播放器上预加载下一条 (打开、解码首帧后暂停)"""
+    if not GAPLESS or state.current_idx < 0 or _swapping is not None: return # 换层完成后由 retire 再预加载
+    ni = next_index()
+    if ni < 0: return
+    path = state.playlist[ni]['path']
+    if _preroll["idx"] == ni and _preroll["path"] == path: return
+    sb = players[_active ^ 1]
+    if sb.get_state() in [1, 2, 3, 4]: sb.stop()
+    backend.load(sb, path, paused=True)
+    _bind(sb, _frame(_active ^ 1))
+    sb.audio_set_mute(True)
+    sb.play()
+    _preroll["idx"] = ni; _preroll["path"] = path
+
+def stop_all():
+    """停止播放并丢弃预加载"""
+    global _swapping
+    for p in players: p.stop()
+    state.paused = False; _swapping = None
+    _preroll["idx"] = -1; _preroll["path"] = None; _gap["t0"] = 0.0; _gap["player"] = None; _gap["layer"] = None
 
 def auto_next():
-    time.sleep(0.5)
-    if not state.playlist: 
-        state.current_idx = -1; ctx.gui_invoke('show_bg_layer'); return
-    
-    if state.loop_mode == "random":
-        if len(state.playlist) > 1:
-            ni = random.randint(0, len(state.playlist) - 1)
-            while ni == state.current_idx: ni = random.randint(0, len(state.playlist) - 1)
-            play_by_index(ni)
-        else: play_by_index(0)
-    elif state.loop_mode == "single": 
-        play_by_index(state.current_idx)
-    else: 
-        play_by_index((state.current_idx + 1) % len(state.playlist))
-
-player.event_manager().event_attach(vlc.EventType.MediaPlayerEndReached, lambda e: threading.Thread(target=auto_next).start())
\ No newline at end of file
+    if not state.playlist:
+        state.current_idx = -1; state.touch(); ctx.gui_invoke('show_bg_layer'); return
+    ni = next_index()
+    if GAPLESS and _preroll["idx"] == ni and 0 <= ni < len(state.playlist) and _preroll["path"] == state.playlist[ni]['path']:
+        _swap_to_preroll(); return
+    backend.sleep(0.5)
+    play_by_index(ni)
+
+def _on_playing(p):
+    if _once and p is players[_active]:
+        for fn in _once[:]: _once.remove(fn); fn()
+    # 新条目真正开始播放：记录切换间隙
+    if _gap["t0"] and _gap["player"] is p:
+        gap_stat.observe((time.perf_counter() - _gap["t0"]) * 1000)
+        _gap["t0"] = 0.0; _gap["player"] = None
+
+def _on_end(p):
+    # 预加载中的播放器不应触发切换
+    if p is not players[_active]: return
+    _gap["t0"] = time.perf_counter(); _gap["player"] = None; _gap["layer"] = None
+    # VLC 事件回调里不能直接调用播放器，交给控制线程处理
+    from controller import controller
+    controller.submit("end")
+
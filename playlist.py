@@ -0,0 +1,195 @@
+import random
+import itertools
+import functools
+import threading
+from collections import deque
+
+LOG_SIZE = 512 # 保留最近多少次修改的区间记录 (增量同步能回溯的范围)
+
+def _row(x): return (x["id"], x["name"], x["path"], x.get("duration", 0))
+
+def _locked(fn):
+    @functools.wraps(fn)
+    def wrap(self, *a, **kw):
+        with self._lock: return fn(self, *a, **kw)
+    return wrap
+
+class Playlist:
+    """播放列表：条目为带稳定 id 的 dict，按 id O(1) 查找/定位；
+    位置索引在修改后从最小变动位置起惰性重建，支持万级条目的插入/删除/移动"""
+    def __init__(self, items=()):
+        self._items = []
+        self._idl = []  # 与 _items 平行的 id 列表，重建位置索引时走 C 层循环
+        self._by_id = {}
+        self._pos = {}
+        self._dirty = 0 # 位置索引从此下标开始失效
+        self._ids = itertools.count(1)
+        self.version = 0
+        self._snap = (None, ())
+        self._log = deque(maxlen=LOG_SIZE) # (版本, 起点, 删除数, 插入数)：每次修改都是一段替换
+        self._lock = threading.RLock() # 修改在控制线程，读快照/分页在请求线程，各自持锁即可不经控制队列
+        self.load(items)
+
+    # --- 序列接口 (兼容原 list 用法) ---
+    def __len__(self): return len(self._items)
+    def __bool__(self): return bool(self._items)
+    def __iter__(self): return iter(self._items)
+    @_locked
+    def __getitem__(self, i): return self._items[i]
+
+    @_locked
+    def load(self, items):
+        """整体替换 (加载存档)：保留已有 id，缺失或重复的重新分配"""
+        seen = set(); out = []
+        for x in items:
+            x = dict(x)
+            if not isinstance(x.get("id"), int) or x["id"] in seen: x["id"] = None
+            else: seen.add(x["id"])
+            out.append(x)
+        self._ids = itertools.count(max(seen, default=0) + 1)
+        for x in out:
+            if x["id"] is None: x["id"] = next(self._ids)
+        n = len(self._items)
+        self._items = out; self._idl = [x["id"] for x in out]; self._by_id = {x["id"]: x for x in out}; self._pos = {}; self._changed(0, n, len(out))
+
+    def _changed(self, start, delete, insert):
+        if start < self._dirty: self._dirty = start
+        self.version += 1; self._log.append((self.version, start, delete, insert))
+
+    @_locked
+    def changes(self, since, until):
+        """版本 since -> until 的全部修改合并成一段替换 (起点, 删除的旧条目数, 新区间长度)；
+        日志已回溯不到 since 时返回 None。只做区间运算，不复制条目"""
+        if since == until: return (0, 0, 0)
+        log = [e for e in self._log if since < e[0] <= until]
+        if not log or log[0][0] != since + 1 or log[-1][0] != until: return None
+        S, D, L = log[0][1:]
+        for _, s, n, k in log[1:]:
+            # 当前区间 [S, S+L) 与新替换 [s, s+n) 取并集；并集之外的条目两边都没变
+            lo = min(S, s); hi = max(S + L, s + n)
+            S, D, L = lo, hi - L + D - lo, hi - lo - n + k
+        return S, D, L
+
+    def _new(self, item):
+        item = dict(item); item["id"] = next(self._ids); return item
+
+    def get(self, iid): return self._by_id.get(iid)
+
+    @_locked
+    def index_of(self, iid):
+        """id -> 当前位置，不存在返回 -1"""
+        if iid not in self._by_id: return -1
+        n = len(self._idl)
+        if self._dirty < n:
+            self._pos.update(zip(itertools.islice(self._idl, self._dirty, None), range(self._dirty, n)))
+            self._dirty = n
+        return self._pos[iid]
+
+    def append(self, item): return self.insert(len(self._items), item)
+
+    @_locked
+    def extend(self, items):
+        start = len(self._items); new = [self._new(x) for x in items]
+        self._items.extend(new); self._idl.extend(x["id"] for x in new)
+        for x in new: self._by_id[x["id"]] = x
+        self._changed(start, 0, len(new)); return new
+
+    @_locked
+    def insert(self, pos, item):
+        pos = max(0, min(pos, len(self._items))); x = self._new(item)
+        self._items.insert(pos, x); self._idl.insert(pos, x["id"]); self._by_id[x["id"]] = x; self._changed(pos, 0, 1); return x
+
+    @_locked
+    def remove(self, iid):
+        """按 id 删除，返回原位置 (不存在返回 -1)"""
+        i = self.index_of(iid)
+        if i < 0: return -1
+        del self._items[i]; del self._idl[i]; del self._by_id[iid]; self._pos.pop(iid, None); self._changed(i, 1, 0); return i
+
+    def pop(self, i):
+        x = self._items[i]; self.remove(x["id"]); return x
+
+    @_locked
+    def move(self, iid, to):
+        i = self.index_of(iid)
+        if i < 0: return False
+        to = max(0, min(to, len(self._items) - 1))
+        if to == i: return True
+        self._items.insert(to, self._items.pop(i)); self._idl.insert(to, self._idl.pop(i)); self._changed(min(i, to), abs(i - to) + 1, abs(i - to) + 1); return True
+
+    @_locked
+    def reorder(self, ids):
+        """按给定 id 顺序重排；必须是当前条目的一个排列"""
+        if len(ids) != len(self._items) or set(ids) != self._by_id.keys(): return False
+        self._items = [self._by_id[i] for i in ids]; self._idl = list(ids); self._changed(0, len(ids), len(ids)); return True
+
+    @_locked
+    def clear(self):
+        n = len(self._items)
+        self._items = []; self._idl = []; self._by_id = {}; self._pos = {}; self._changed(0, n, 0)
+
+    @_locked
+    def range(self, offset, limit):
+        return self._items[offset:offset + limit] if limit > 0 else self._items[offset:]
+
+    @_locked
+    def snapshot(self):
+        """(id, name, path, duration) 元组，按版本缓存 (全量状态/分页用)"""
+        if self._snap[0] != self.version:
+            self._snap = (self.version, tuple(_row(x) for x in self._items))
+        return self._snap[1]
+
+    @_locked
+    def view(self):
+        """(版本, 快照)：同一把锁下取出，分页的条目、总数和版本互相一致"""
+        return self.version, self.snapshot()
+
+    @_locked
+    def rows(self, start, n):
+        """[start, start+n) 的 (id, name, path, duration) 元组"""
+        return [_row(x) for x in self._items[start:start + n]]
+
+    @_locked
+    def to_list(self):
+        """深一层复制 (存档用，在写入线程调用)"""
+        return [dict(x) for x in self._items]
+
+class ShuffleBag:
+    """随机模式的洗牌袋：每轮每条只播一次，跨轮边界不连播同一条；
+    列表变化时增量同步 (新条目随机插入本轮，已删除的惰性跳过)"""
+    def __init__(self, rng=None):
+        self.rng = rng or random.Random()
+        self._bag = []       # 本轮待播 id，末尾为下一首
+        self._left = set()   # 仍在袋中的 id
+        self._known = set()  # 已同步过的全部 id
+        self._ver = None
+        self._first = True
+
+    def _sync(self, pl):
+        if self._ver == pl.version: return
+        self._ver = pl.version
+        ids = set(pl._by_id)
+        for iid in ids - self._known:
+            # 新条目放到袋中随机位置 (与随机位置交换，O(1))
+            self._bag.append(iid); j = self.rng.randrange(len(self._bag))
+            self._bag[-1], self._bag[j] = self._bag[j], self._bag[-1]
+            self._left.add(iid)
+        self._left &= ids; self._known = ids
+
+    def peek(self, pl, current=None):
+        """下一首的 id (不消耗)；袋空时开始新一轮"""
+        self._sync(pl)
+        if self._first:
+            # 第一轮：正在播放的那条算作本轮已播
+            self._first = False; self._left.discard(current)
+        while self._bag and self._bag[-1] not in self._left: self._bag.pop()
+        if not self._bag:
+            self._bag = list(self._known); self.rng.shuffle(self._bag); self._left = set(self._bag)
+            if len(self._bag) > 1 and self._bag[-1] == current:
+                # 新一轮的第一首不能是刚播完的那条
+                j = self.rng.randrange(len(self._bag) - 1); self._bag[-1], self._bag[j] = self._bag[j], self._bag[-1]
+        return self._bag[-1] if self._bag else None
+
+    def played(self, iid):
+        """条目开始播放 (无论自动还是手动选择)：本轮不再抽到它"""
+        self._left.discard(iid)
@@ -1,16 +1,32 @@
 import os
 import shutil
 import cv2
+import json
+import time
 import traceback
-from flask import Blueprint, request, jsonify, send_from_directory, render_template
-from screeninfo import get_monitors
+from flask import Blueprint, request, jsonify, send_from_directory, render_template, Response, stream_with_context
 from PIL import Image, ImageOps
 
-from config import VIDEO_DIR, THUMB_DIR, IDLE_DIR
+from config import VIDEO_DIR, THUMB_DIR, IDLE_DIR, SPRITE_DIR, SYS_HISTORY_DAYS
 from state import state
-from utils import resolve_path, is_video, is_image, generate_thumbnail, safe_filename, get_thumb_url_by_path, get_video_duration, sys_monitor, exec_sys_command
+from utils import resolve_path, is_video, is_image, record_thumbnail, forget_thumb_version, make_placeholder, safe_filename, get_thumb_url_by_path, thumb_version, get_video_duration, sys_monitor, exec_sys_command
+from catalog import catalog
+from thumb_pool import thumb_pool
+from events import bus, sse_stream, sse_format
+from library import library, SORT_KEYS
 from context import ctx
 import player_logic
+from controller import controller
+from metrics import snapshot_all, render_prometheus
+from bg_cache import bg_cache
+from uploads import uploads, UploadError
+from streaming import send_video
+from decoders import decoders, sprites
+from history import SERIES
+from jobs import jobs
+from display import display
+from watcher import watcher
+from dedup import store, save_hashed
 
 api_bp = Blueprint('api', __name__)
 main_bp = Blueprint('main', __name__)
@@ -18,43 +34,144 @@ main_bp = Blueprint('main', __name__)
 @main_bp.route('/')
 def index(): return render_template('index.html')
 @main_bp.route('/thumbs/<path:f>')
-def serve_thumb(f): return send_from_directory(THUMB_DIR, f)
+def serve_thumb(f):
+    tp = os.path.join(THUMB_DIR, f)
+    if not os.path.exists(tp) and thumb_pool.is_pending(os.path.abspath(tp)):
+        # 后台尚未生成完：返回占位图且禁止缓存，生成完成后通过 thumb 事件通知刷新
+        ph = os.path.join(THUMB_DIR, ".placeholder.jpg")
+        if not os.path.exists(ph): make_placeholder(ph)
+        r = send_from_directory(THUMB_DIR, ".placeholder.jpg"); r.headers['Cache-Control'] = 'no-store'; return r
+    v = request.args.get('v')
+    if not f.endswith('.jpg') or not os.path.isfile(tp) or not os.path.abspath(tp).startswith(os.path.abspath(THUMB_DIR) + os.sep):
+        return send_from_directory(THUMB_DIR, f)
+    cur = thumb_version(os.path.join(VIDEO_DIR, f[:-4]))
+    if not cur: return send_from_directory(THUMB_DIR, f)
+    if cur in request.if_none_match:
+        r = Response(status=304); r.set_etag(cur)
+    else:
+        r = send_from_directory(THUMB_DIR, f, etag=False, conditional=False, max_age=None); r.set_etag(cur)
+    # 地址里的版本与当前内容一致：内容寻址，永久缓存；否则 (旧链接/无版本) 每次协商
+    r.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if v and v == cur else 'no-cache'
+    return r
+@main_bp.route('/sprites/<f>')
+def serve_sprite(f):
+    # 文件名由视频路径+大小+mtime 哈希而来，内容不变，可永久缓存
+    r = send_from_directory(SPRITE_DIR, f); r.headers['Cache-Control'] = 'public, max-age=31536000, immutable'; return r
 @main_bp.route('/idle_imgs/<path:f>')
 def serve_idle(f): return send_from_directory(IDLE_DIR, f)
 @main_bp.route('/video_stream/<path:f>')
 def video_stream(f):
-    av = os.path.join(VIDEO_DIR, f)
-    if not os.path.exists(av): return "404", 404
-    return send_from_directory(os.path.dirname(av), os.path.basename(av))
+    av, _ = resolve_path(f)
+    if not av or not os.path.isfile(av): return "404", 404
+    return send_video(request, av)
+
+@api_bp.route('/sys/history')
+def sys_history():
+    """?window=秒&step=秒&series=cpu,mem,...：服务端按桶降采样，返回 min/avg/max"""
+    window = min(max(request.args.get('window', 3600, type=float), 1), SYS_HISTORY_DAYS * 86400)
+    names = [n for n in request.args.get('series', '').split(',') if n] or SERIES
+    d = sys_monitor.history.query(time.time(), window, request.args.get('step', 0, type=float), names)
+    d["interval"] = sys_monitor.interval; return jsonify(d)
 
 @api_bp.route('/sys/<action>')
 def sys_ctrl(action):
+    state.flush_state() # os._exit 不会执行 atexit，先把状态落盘
     exec_sys_command(action)
     return jsonify({"ok": True})
 
-@api_bp.route('/status')
-def get_status():
-    ms = [{"id": i, "width": m.width, "height": m.height} for i, m in enumerate(get_monitors())]
+def _pl_item(iid, name, path, duration):
+    return {"id": iid, "name": name, "path": path, "thumb": get_thumb_url_by_path(path), "duration": duration}
+
+_pl_cache = [None, []] # (列表版本, 序列化后的播放列表)，列表未变时直接复用
+def _playlist_json():
+    if _pl_cache[0] != state.playlist.version:
+        ver, rows = state.playlist.view() # 版本与快照同锁取出，缓存不会把旧条目记成新版本
+        _pl_cache[1] = [_pl_item(*x) for x in rows]; _pl_cache[0] = ver
+    return _pl_cache[1]
+
+def _tick():
+    """播放进度等高频字段 (不计入状态版本)"""
     cv = {}; ct = 0; tl = 0
-    # 直接读取缓存，毫秒级响应
-    sys_info = sys_monitor.get_current_stats()
-    
-    if 0 <= state.current_idx < len(state.playlist):
-        item = state.playlist[state.current_idx]
+    # 按 id 取当前条目：请求线程上先比下标再取条目，期间控制线程删改列表会越界
+    item = state.playlist.get(state.current_id) if state.current_id is not None else None
+    if item:
         cv = { "name": item['name'], "thumb": get_thumb_url_by_path(item['path']), "path": os.path.relpath(item['path'], VIDEO_DIR).replace('\\', '/') }
         if ctx.player.is_playing() or ctx.player.get_state() in [1, 2, 3, 4]:
             ct = ctx.player.get_time() / 1000.0; tl = ctx.player.get_length() / 1000.0
             if tl <= 0: tl = item.get('duration', 0)
-    
-    rp = [{ "name": i['name'], "path": i['path'], "thumb": get_thumb_url_by_path(i['path']), "duration": i.get('duration', 0) } for i in state.playlist]
-    bfs = [f for f in sorted(os.listdir(IDLE_DIR)) if is_image(f)] if os.path.exists(IDLE_DIR) else []
-    
-    return jsonify({
-        "playlist": rp, "current_idx": state.current_idx, "current_video": cv, "current_time": ct, "total_time": tl, 
-        "monitors": ms, "target_monitor": state.target_monitor, "loop_mode": state.loop_mode, "volume": state.volume, 
-        "is_muted": state.is_muted, "idle_image": state.idle_image, "bg_files": bfs, "is_playing": ctx.player.is_playing(),
-        "sys": sys_info
-    })
+    # 暂停以状态标志为准：libvlc 的 pause 是异步的，刚暂停时 is_playing() 可能仍为真
+    return {"current_video": cv, "current_time": ct, "total_time": tl, "is_playing": ctx.player.is_playing() and not state.paused}
+
+def _full_status(with_playlist=True):
+    rev = state.rev
+    d = {"rev": rev, "sys_seq": sys_monitor.seq, "playlist_len": len(state.playlist),
+         "current_idx": state.current_idx, "current_id": state.current_id, "paused": state.paused,
+         "monitors": display.to_json(), "display_ver": display.version, # 拓扑缓存，不再每次枚举显示设备
+         "target_monitor": state.target_monitor, "loop_mode": state.loop_mode, "volume": state.volume,
+         "is_muted": state.is_muted, "idle_image": state.idle_image, "bg_files": list(state.bg_files()),
+         # 直接读取缓存，毫秒级响应
+         "sys": sys_monitor.get_current_stats()}
+    if with_playlist: d["playlist"] = _playlist_json() # 大列表客户端可用 playlist=0 跳过，改用 /playlist/items 分页
+    d.update(_tick())
+    return d
+
+def _diff_status(since, sys_since=None):
+    """自 since 版本以来的增量；None 表示需要全量"""
+    d = state.diff_since(since)
+    if d is None: return None
+    if "playlist" in d: d["playlist"]["insert"] = [_pl_item(*x) for x in d["playlist"]["insert"]]
+    d["rev"] = state.rev
+    if sys_since is None or sys_since != sys_monitor.seq: d["sys"] = sys_monitor.get_current_stats(); d["sys_seq"] = sys_monitor.seq
+    return d
+
+@main_bp.route('/metrics')
+def get_metrics():
+    """Prometheus 文本格式指标 (按路由请求数/耗时、缩略图/探测耗时、GUI 队列、切换间隙、状态写入、硬件采样)"""
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@api_bp.route('/perf')
+def get_perf():
+    """性能统计 (切换间隙等)"""
+    return jsonify(snapshot_all())
+
+@api_bp.route('/status')
+def get_status():
+    # ?since=<rev>[&sys=<sys_seq>]：无变化且未在播放时返回 304，否则只返回变化部分 + 进度
+    since = request.args.get('since', type=int)
+    if since is not None:
+        d = _diff_status(since, request.args.get('sys', type=int))
+        if d is not None:
+            t = _tick()
+            if len(d) == 1 and not t["is_playing"]: return Response(status=304, headers={"X-State-Rev": str(state.rev)})
+            d["diff"] = True; d.update(t)
+            return jsonify(d)
+    return jsonify(_full_status(request.args.get('playlist', '1') != '0'))
+
+@api_bp.route('/status/stream')
+def status_stream():
+    """SSE 状态推送：首帧全量，之后只推送 state 增量 / 进度 tick / sys 采样"""
+    since = request.headers.get('Last-Event-ID', type=int)
+    def gen():
+        rev = since; sys_seq = None; last_tick = None; last_out = time.time()
+        yield "retry: 2000\n\n"
+        while True:
+            out = []
+            d = _diff_status(rev, sys_seq) if rev is not None else None
+            if d is None:
+                full = _full_status(); rev = full["rev"]; sys_seq = full["sys_seq"]; last_tick = None
+                out.append(sse_format(rev, "full", full))
+            else:
+                if "sys" in d: sys_seq = d.pop("sys_seq"); out.append(sse_format(rev, "sys", d.pop("sys")))
+                if len(d) > 1: rev = d["rev"]; out.append(sse_format(rev, "state", d))
+            t = _tick()
+            if t != last_tick:
+                last_tick = t; out.append(f"event: tick\ndata: {json.dumps(t, ensure_ascii=False)}\n\n")
+            if not out and time.time() - last_out > 15: out.append(": ping\n\n") # 心跳，及时发现断开的连接
+            if out: last_out = time.time(); yield "".join(out)
+            # 播放中每秒推一次进度，空闲时放慢节奏，状态变化立即唤醒
+            state.wait_change(rev, 1.0 if t["is_playing"] else 3.0)
+    r = Response(stream_with_context(gen()), mimetype='text/event-stream')
+    r.headers['Cache-Control'] = 'no-cache'; r.headers['X-Accel-Buffering'] = 'no'; return r
 
 # ... (保留原有的 upload, library, control, mkdir, delete 等所有路由，此处省略以节省篇幅，请直接使用上个版本 routes.py 的其余部分) ...
 # ⚠️ 重要：请务必保留 upload, library 等接口，或者直接复制之前 routes.py 的内容，只需修改 get_status 一处即可。
@@ -66,21 +183,78 @@ def upload_video():
         rp = request.form.get('path', ''); av, at = resolve_path(rp)
         if not av: return jsonify({"msg": "Path Error"}), 400
         if 'files' not in request.files: return jsonify({"msg": "No Files"}), 400
-        c = 0
+        c = 0; dups = []
         for f in request.files.getlist('files'):
             if f and is_video(f.filename):
                 fn = safe_filename(f.filename); sp = os.path.join(av, fn)
-                f.save(sp); generate_thumbnail(sp, at, fn); c += 1
-        return jsonify({"msg": "ok", "count": c})
+                _, digest = save_hashed(f.stream, sp); c += 1
+                d = _upload_done(sp, at, digest)
+                if d["dup_of"]: dups.append(_dup_json(fn, d))
+        library.invalidate(av)
+        return jsonify({"msg": "ok", "count": c, "duplicates": dups})
     except Exception as e: return jsonify({"msg": str(e)}), 500
 
+def _upload_done(sp, at, digest=None):
+    # 最后一块落盘后才排队元数据/缩略图；内容重复的直接链接到已有文件并复用其缩略图
+    d = store.absorb(sp, digest)
+    if not d["thumb"]: thumb_pool.submit(sp, os.path.abspath(os.path.join(at, os.path.basename(sp)+".jpg")))
+    # 拖动预览雪碧图不在上传时生成：第一次打开封面工坊 (/library/sprite) 才排队
+    library.invalidate(os.path.dirname(sp))
+    return d
+uploads.on_complete = _upload_done
+
+def _dup_json(name, d):
+    root = VIDEO_DIR if os.path.abspath(d["dup_of"]).startswith(os.path.abspath(VIDEO_DIR) + os.sep) else IDLE_DIR
+    return {"name": name, "dup_of": os.path.relpath(d["dup_of"], root).replace('\\', '/'),
+            "mode": d["mode"], "saved": d["saved"]}
+
+def _upload_json(s):
+    r = {"id": s["id"], "offset": s["received"], "size": s["size"], "done": bool(s.get("done"))}
+    d = s.get("dedup")
+    if d and d["dup_of"]: r["duplicate"] = _dup_json(os.path.basename(s["path"]), d)
+    return r
+
+@api_bp.route('/upload/init', methods=['POST'])
+def upload_init():
+    """分块上传：{path, name, size[, id][, fingerprint]} -> 上传 ID 与已接收偏移。
+    带回之前的 id，或给出相同的内容指纹 (客户端自定，如文件头尾哈希 + 修改时间) 时续接中断的上传，否则新建"""
+    d = request.json or {}
+    av, at = resolve_path(d.get('path', ''))
+    fn = safe_filename(d.get('name', ''))
+    if not av or not os.path.isdir(av): return jsonify({"msg": "Path Error"}), 400
+    if not is_video(fn): return jsonify({"msg": "Type Error"}), 400
+    try: size = int(d.get('size', -1))
+    except (TypeError, ValueError): size = -1
+    if size <= 0: return jsonify({"msg": "Size Error"}), 400
+    fp = d.get('fingerprint'); fp = str(fp)[:128] if fp else None
+    return jsonify(_upload_json(uploads.create(av, at, fn, size, str(d.get('id') or '') or None, fp)))
+
+@api_bp.route('/upload/<uid>', methods=['GET', 'PUT', 'DELETE'])
+def upload_chunk(uid):
+    """GET 查询偏移；PUT ?offset=N 请求体为原始字节 (可带 X-Chunk-SHA256)；DELETE 放弃"""
+    try:
+        if request.method == 'GET': return jsonify(_upload_json(uploads.status(uid)))
+        if request.method == 'DELETE': uploads.abort(uid); return jsonify({"ok": True})
+        offset = request.args.get('offset', -1, type=int)
+        if offset < 0: return jsonify({"msg": "offset"}), 400
+        s = uploads.write_chunk(uid, offset, request.stream, request.content_length, request.headers.get('X-Chunk-SHA256'))
+        return jsonify(_upload_json(s))
+    except UploadError as e:
+        return jsonify({"msg": str(e), "offset": e.offset}), e.code
+
 @api_bp.route('/bg/upload', methods=['POST'])
 def upload_bg():
     try:
-        c = 0
+        c = 0; dups = []; sizes = [(m.width, m.height) for m in display.monitors()] or [(1920, 1080)]
         for f in request.files.getlist('files'): 
-            if f and is_image(f.filename): fn = safe_filename(f.filename); f.save(os.path.join(IDLE_DIR, fn)); c += 1
-        return jsonify({"msg":"ok", "count": c})
+            if f and is_image(f.filename):
+                fn = safe_filename(f.filename); sp = os.path.join(IDLE_DIR, fn)
+                _, digest = save_hashed(f.stream, sp); c += 1
+                d = store.absorb(sp, digest)
+                if d["dup_of"]: dups.append(_dup_json(fn, d))
+                bg_cache.remember(sp, digest)
+                bg_cache.prepare_async(sp, sizes) # 上传时就按各显示器分辨率预缩放 (同内容的变体已存在则直接复用)
+        state.touch(); return jsonify({"msg":"ok", "count": c, "duplicates": dups})
     except Exception as e: return jsonify({"msg": str(e)}), 500
 
 @api_bp.route('/bg/set', methods=['POST'])
@@ -93,54 +267,131 @@ def set_bg():
 def del_bg(): 
     try:
         n = request.json.get('name'); p = os.path.join(IDLE_DIR, n)
-        if os.path.exists(p): os.remove(p)
+        if os.path.exists(p): bg_cache.forget(p); os.remove(p); catalog.forget(p) # 去重记录一并删除，不再计入节省报告
         if state.idle_image == n: state.idle_image = ""; state.save_state(); ctx.gui_invoke('update_bg')
-        return jsonify({"ok":True})
+        state.touch(); return jsonify({"ok":True})
     except: return jsonify({"ok":False})
 
 @api_bp.route('/library')
 def get_library():
     rp = request.args.get('path', ''); av, at = resolve_path(rp)
-    if not av: return jsonify({"error": "path"}), 400
-    dirs, files = [], []
-    for i in sorted(os.listdir(av)):
-        fp = os.path.join(av, i)
-        if os.path.isdir(fp):
-            cp = os.path.join(fp, "_folder_cover.jpg"); t = None
-            if os.path.exists(cp): ts = int(os.path.getmtime(cp)); t = f"/video_stream/{os.path.join(rp, i, '_folder_cover.jpg').replace('\\', '/')}?t={ts}"
-            dirs.append({"name": i, "thumb": t})
-        elif is_video(i):
-            if not os.path.exists(os.path.join(at, i+".jpg")): generate_thumbnail(fp, at, i)
-            tf = os.path.join(at, i+".jpg"); ts = int(os.path.getmtime(tf)) if os.path.exists(tf) else 0
-            files.append({"name": i, "thumb": os.path.join(rp, i+".jpg").replace('\\', '/'), "ts": ts})
-    return jsonify({"current_path": rp, "folders": dirs, "files": files})
+    if not av or not os.path.isdir(av): return jsonify({"error": "path"}), 400
+    sort = request.args.get('sort', 'name'); desc = request.args.get('order', 'asc') == 'desc'
+    if sort not in SORT_KEYS: return jsonify({"error": "sort"}), 400
+    offset = max(0, request.args.get('offset', 0, type=int)); limit = max(0, request.args.get('limit', 0, type=int))
+    snap = library.snapshot(av)
+    etag = library.etag(snap, sort, desc, offset, limit)
+    if etag in request.if_none_match:
+        r = Response(status=304); r.set_etag(etag); return r
+    seq = bus.seq; page, total = library.page(snap, sort, desc, offset, limit)
+    dirs = []
+    if offset == 0:
+        for d in snap.dirs:
+            t = None
+            if d["cover_ts"] is not None: t = "/video_stream/" + os.path.join(rp, d["name"], '_folder_cover.jpg').replace('\\', '/') + f"?t={d['cover_ts']}"
+            dirs.append({"name": d["name"], "thumb": t})
+    files = [{"name": f["name"], "thumb": os.path.join(rp, f["name"]+".jpg").replace('\\', '/'), "ts": f["ts"], "v": f["v"], "pending": f["pending"],
+              "duration": f["duration"], "size": f["size"], "mtime": f["mtime"]} for f in page]
+    r = jsonify({"current_path": rp, "folders": dirs, "files": files, "total": total, "offset": offset, "limit": limit, "event_seq": seq})
+    r.set_etag(etag); r.headers['Cache-Control'] = 'no-cache'; return r
+
+@api_bp.route('/events')
+def poll_events():
+    """长轮询：?since=<序号>&kinds=thumb,... 有新事件立即返回，否则最多挂起 timeout 秒"""
+    since = request.args.get('since', bus.seq, type=int); to = min(request.args.get('timeout', 25, type=float), 60)
+    kinds = set(filter(None, request.args.get('kinds', '').split(','))) or None
+    ev, seq = bus.wait(since, to, kinds)
+    return jsonify({"seq": seq, "events": [{"seq": s, "kind": k, "data": d} for s, k, d in ev]})
+
+@api_bp.route('/events/stream')
+def stream_events():
+    """SSE 推送，断线重连时浏览器自动带上 Last-Event-ID"""
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', bus.seq, type=int)
+    kinds = set(filter(None, request.args.get('kinds', '').split(','))) or None
+    r = Response(stream_with_context(sse_stream(bus, since, kinds)), mimetype='text/event-stream')
+    r.headers['Cache-Control'] = 'no-cache'; r.headers['X-Accel-Buffering'] = 'no'; return r
+
+@api_bp.route('/jobs')
+def list_jobs(): return jsonify({"jobs": jobs.list()})
+
+@api_bp.route('/jobs/<jid>')
+def get_job(jid):
+    """任务详情 (进度/部分结果/错误)；实时进度可订阅 /api/events/stream?kinds=job"""
+    j = jobs.get(jid)
+    return jsonify(j.to_json()) if j else (jsonify({"error": "job"}), 404)
+
+@api_bp.route('/jobs/<jid>/cancel', methods=['POST'])
+def cancel_job(jid): return jsonify({"ok": jobs.cancel(jid)})
 
 @api_bp.route('/library/mkdir', methods=['POST'])
 def mkdir():
     rel = request.json.get('path',''); n = request.json.get('name',''); av, _ = resolve_path(os.path.join(rel, n))
-    if av: os.makedirs(av, exist_ok=True); return jsonify({"ok":True})
+    if av: os.makedirs(av, exist_ok=True); library.invalidate(os.path.dirname(av)); return jsonify({"ok":True})
     return jsonify({"ok": False})
 
+SYNC_WAIT = 25 # 未带 async 标记的旧客户端最多同步等待任务这么久
+
+def _job_reply(job, legacy):
+    """带 async 标记的请求立即返回任务 id；旧客户端等待完成后按原格式返回"""
+    body = request.get_json(silent=True) or {}
+    if request.args.get('async') or body.get('async'): return jsonify({"ok": True, "job": job.id}), 202
+    if not job.wait(SYNC_WAIT): return jsonify({"ok": True, "job": job.id, "pending": True}), 202
+    return jsonify(legacy(job))
+
+def _rm_tree(path, job, per_file=False):
+    """自底向上逐个删除，便于汇报进度和中途取消"""
+    for root, dirs, files in os.walk(path, topdown=False):
+        for f in files:
+            job.check(); os.remove(os.path.join(root, f))
+            if per_file: job.step()
+        for d in dirs:
+            dp = os.path.join(root, d)
+            if os.path.islink(dp): os.remove(dp)
+            else: os.rmdir(dp)
+    os.rmdir(path)
+
+def _delete_entry(bv, bt, n, is_f, job, per_file=False):
+    tv=os.path.join(bv, n); tt=os.path.join(bt, n)
+    decoders.release(tv, tree=bool(is_f))
+    try:
+        if is_f:
+            if os.path.exists(tv): _rm_tree(tv, job, per_file)
+            if os.path.exists(tt): shutil.rmtree(tt)
+        else:
+            if os.path.exists(tv): os.remove(tv)
+            if os.path.exists(tt+".jpg"): os.remove(tt+".jpg")
+    finally: catalog.forget(tv, tree=bool(is_f)); sprites.forget(tv, tree=bool(is_f)); forget_thumb_version(tv, tree=True); library.invalidate(bv)
+
 @api_bp.route('/library/delete', methods=['POST'])
 def del_item():
     try:
         p=request.json.get('path',''); n=request.json.get('name'); is_f=request.json.get('is_folder')
-        bv, bt = resolve_path(p); tv=os.path.join(bv, n); tt=os.path.join(bt, n)
-        if is_f: (shutil.rmtree(tv) if os.path.exists(tv) else None, shutil.rmtree(tt) if os.path.exists(tt) else None)
-        else: (os.remove(tv) if os.path.exists(tv) else None, os.remove(tt+".jpg") if os.path.exists(tt+".jpg") else None)
-        return jsonify({"ok":True})
+        bv, bt = resolve_path(p)
+        if not bv or not n: return jsonify({"ok":False})
+        def work(job):
+            if is_f: job.total = sum(len(fs) for _, _, fs in os.walk(os.path.join(bv, n)))
+            _delete_entry(bv, bt, n, is_f, job, per_file=bool(is_f))
+            if not is_f: job.step(n)
+        job = jobs.submit("delete", work, 0 if is_f else 1, {"path": p, "name": n})
+        return _job_reply(job, lambda j: {"ok": j.state == "done"})
     except: return jsonify({"ok":False})
 
 @api_bp.route('/library/rename', methods=['POST'])
 def ren_item():
     try:
         p=request.json.get('path',''); o=request.json.get('old_name'); n=request.json.get('new_name')
-        bv, bt = resolve_path(p); ov=os.path.join(bv, o); nv=os.path.join(bv, n)
-        os.rename(ov, nv); ot = os.path.join(bt, o+".jpg"); nt = os.path.join(bt, n+".jpg")
-        if os.path.exists(ot): os.rename(ot, nt)
-        otd = os.path.join(bt, o); ntd = os.path.join(bt, n)
-        if os.path.exists(otd): os.rename(otd, ntd)
-        return jsonify({"ok":True})
+        bv, bt = resolve_path(p)
+        if not bv or not o or not n: return jsonify({"ok":False})
+        def work(job):
+            ov=os.path.join(bv, o); nv=os.path.join(bv, n)
+            decoders.release(ov, tree=True); watcher.expect(ov, nv) # 文件监视不把这次改名当成删除
+            os.rename(ov, nv); catalog.rename(ov, nv); forget_thumb_version(ov, tree=True); forget_thumb_version(nv, tree=True); ot = os.path.join(bt, o+".jpg"); nt = os.path.join(bt, n+".jpg")
+            if os.path.exists(ot): os.rename(ot, nt)
+            otd = os.path.join(bt, o); ntd = os.path.join(bt, n)
+            if os.path.exists(otd): os.rename(otd, ntd)
+            library.invalidate(bv); job.step(n)
+        job = jobs.submit("rename", work, 1, {"path": p, "old_name": o, "new_name": n})
+        return _job_reply(job, lambda j: {"ok": j.state == "done"})
     except: return jsonify({"ok":False})
 
 @api_bp.route('/library/set_frame_cover', methods=['POST'])
@@ -148,13 +399,30 @@ def set_frame_cover():
     try:
         rp=request.json.get('path', ''); fn=request.json.get('file', ''); ts=float(request.json.get('time', 0))
         av, at = resolve_path(rp); vp=os.path.join(av, fn); tp=os.path.join(at, fn+".jpg")
-        cap = cv2.VideoCapture(vp); cap.set(cv2.CAP_PROP_POS_MSEC, ts * 1000); ret, f = cap.read()
-        if ret:
+        f = decoders.frame_at(vp, ts * 1000) # 复用已打开的解码器，只在提交时精确解码这一帧
+        if f is not None:
             f = cv2.resize(f, (320, 180)); s, b = cv2.imencode(".jpg", f)
-            if s: b.tofile(tp); cap.release(); return jsonify({"ok": True})
-        cap.release(); return jsonify({"ok": False})
+            if s:
+                b.tofile(tp); v = record_thumbnail(vp, tp)
+                bus.publish("thumb", {"path": os.path.relpath(vp, VIDEO_DIR).replace('\\', '/'), "thumb": os.path.relpath(tp, THUMB_DIR).replace('\\', '/'), "ts": int(os.path.getmtime(tp)), "v": v or ""})
+                return jsonify({"ok": True})
+        return jsonify({"ok": False})
     except: return jsonify({"ok": False})
 
+@api_bp.route('/library/sprite')
+def get_sprite():
+    """封面工坊：返回拖动预览雪碧图/VTT 地址；尚未生成时排队并返回 pending，完成后推送 sprite 事件"""
+    av, _ = resolve_path(request.args.get('path', '')); fn = safe_filename(request.args.get('file', ''))
+    if not av or not os.path.isfile(os.path.join(av, fn)): return jsonify({"error": "path"}), 400
+    vp = os.path.join(av, fn); info = sprites.info(vp)
+    if info: return jsonify(info)
+    sprites.request(vp); return jsonify({"pending": True, "event_seq": bus.seq}), 202
+
+@api_bp.route('/library/dedup')
+def dedup_report():
+    """上传去重报告：链接共享的副本数与节省的字节数，以及无法链接只记为别名的副本"""
+    return jsonify(store.report())
+
 @api_bp.route('/library/set_folder_cover', methods=['POST'])
 def set_folder_cover():
     try:
@@ -163,87 +431,144 @@ def set_folder_cover():
             av, _ = resolve_path(rp); td=os.path.join(av, fd)
             if not os.path.exists(td): return jsonify({"ok": False})
             img = Image.open(f); img = ImageOps.fit(img, (320, 180), Image.Resampling.LANCZOS); img.save(os.path.join(td, "_folder_cover.jpg"))
-            return jsonify({"ok": True})
+            library.invalidate(av); return jsonify({"ok": True})
         return jsonify({"ok": False})
     except: return jsonify({"ok": False})
 
 @api_bp.route('/library/batch_delete', methods=['POST'])
 def batch_delete():
-    items = request.json.get('items', []); c = 0
-    for i in items:
-        rel=i.get('path',''); n=i.get('name',''); is_f=i.get('is_folder',False)
-        bv, bt = resolve_path(rel); 
-        if not bv: continue
-        tv=os.path.join(bv, n); tt=os.path.join(bt, n)
-        try:
-            if is_f: (shutil.rmtree(tv) if os.path.exists(tv) else None, shutil.rmtree(tt) if os.path.exists(tt) else None)
-            else: (os.remove(tv) if os.path.exists(tv) else None, os.remove(tt+".jpg") if os.path.exists(tt+".jpg") else None)
-            c+=1
-        except: pass
-    return jsonify({"ok":True, "count":c})
+    items = request.json.get('items', [])
+    def work(job):
+        c = 0
+        for i in items:
+            job.check()
+            rel=i.get('path',''); n=i.get('name',''); is_f=i.get('is_folder',False)
+            bv, bt = resolve_path(rel)
+            if not bv or not n: job.step(error=f"{rel}/{n}: path"); continue
+            try: _delete_entry(bv, bt, n, is_f, job); c += 1; job.step({"path": rel, "name": n})
+            except Exception as e:
+                if job.cancelled: raise
+                job.step(error=f"{rel}/{n}: {e}")
+        return c
+    job = jobs.submit("batch_delete", work, len(items))
+    return _job_reply(job, lambda j: {"ok": True, "count": j.value or 0})
+
+CMD_WAIT = 0.5 # 控制命令最多等这么久，拿到它执行后的状态版本
+
+def _queued(cid):
+    """控制命令已排队：通常很快执行完，返回执行后的 rev；控制线程忙时不再等待，返回 pending，
+    客户端凭 rev 走 /api/status?since= 或状态推送观察结果。被抵消的命令 (cid 为 0) 不改变状态"""
+    rev = controller.wait_done(cid, CMD_WAIT) if cid else state.rev
+    if rev is None: return jsonify({"ok": True, "cmd": cid, "rev": state.rev, "pending": True})
+    return jsonify({"ok": True, "cmd": cid, "rev": rev})
+
+@api_bp.errorhandler(TimeoutError)
+def _controller_busy(e):
+    # controller.call 等待超时：控制线程忙，按服务繁忙返回，不当作 500
+    return jsonify({"ok": False, "error": "busy"}), 503, {"Retry-After": "1"}
 
 @api_bp.route('/playlist/add')
 def add_pl():
     rel=request.args.get('path',''); fname=request.args.get('file',''); av, _ = resolve_path(rel); full=os.path.join(av, fname)
     if os.path.exists(full):
-        state.playlist.append({"name": fname, "path": full, "duration": get_video_duration(full)}); state.save_state()
-        if len(state.playlist) == 1: player_logic.play_by_index(0)
-    return jsonify({"ok": True})
+        item = {"name": fname, "path": full, "duration": get_video_duration(full)}
+        def apply():
+            x = state.playlist.append(item); state.save_state()
+            if len(state.playlist) == 1: player_logic.play_by_index(0)
+            else: player_logic.prepare_next()
+            return x["id"]
+        return jsonify({"ok": True, "id": controller.call(apply), "rev": state.rev})
+    return jsonify({"ok": True, "rev": state.rev})
 
 @api_bp.route('/playlist/add_folder')
 def add_folder_pl():
-    rel=request.args.get('path',''); n=request.args.get('name',''); av, _ = resolve_path(os.path.join(rel,n)); a = 0
-    if os.path.exists(av):
-        for f in sorted(os.listdir(av)):
-            full=os.path.join(av, f)
-            if os.path.isfile(full) and is_video(f):
-                state.playlist.append({"name": f, "path": full, "duration": get_video_duration(full)}); a+=1
-    if a>0: state.save_state(); (player_logic.play_by_index(0) if len(state.playlist)==a else None)
-    return jsonify({"ok":True, "count":a})
+    rel=request.args.get('path',''); n=request.args.get('name',''); av, _ = resolve_path(os.path.join(rel,n))
+    if not av or not os.path.isdir(av): return jsonify({"ok":True, "count":0, "rev": state.rev})
+    def work(job):
+        fs = [os.path.join(av, f) for f in sorted(os.listdir(av)) if is_video(f) and os.path.isfile(os.path.join(av, f))]
+        job.total = len(fs); metas = {}
+        # 索引命中的直接返回，仅新文件/已变化文件才探测；分批以便汇报进度和取消
+        for k in range(0, len(fs), 16):
+            job.check(); part = fs[k:k + 16]; metas.update(catalog.lookup_many(part)); job.step(n=len(part))
+        items = [{"name": os.path.basename(full), "path": full, "duration": metas[full]["duration"] if metas.get(full) else 0} for full in fs]
+        def apply():
+            state.playlist.extend(items); state.save_state()
+            player_logic.play_by_index(0) if len(state.playlist)==len(items) else player_logic.prepare_next()
+        if items: controller.call(apply)
+        return len(items)
+    job = jobs.submit("add_folder", work, 0, {"path": rel, "name": n})
+    return _job_reply(job, lambda j: {"ok": True, "count": j.value or 0, "rev": state.rev})
+
+def _remove_item(iid):
+    # 当前条目按 id 跟踪，删除其它条目无需修正下标
+    if state.playlist.remove(iid) < 0: return False
+    if iid == state.current_id: player_logic.stop_all(); state.current_id = None; ctx.gui_invoke('show_bg_layer')
+    state.save_state(); player_logic.prepare_next(); return True
 
 @api_bp.route('/playlist/remove/<int:i>')
 def rem_pl(i):
-    if 0<=i<len(state.playlist):
-        state.playlist.pop(i); state.save_state()
-        if i==state.current_idx: ctx.player.stop(); state.current_idx=-1; ctx.gui_invoke('show_bg_layer')
-        elif i<state.current_idx: state.current_idx-=1
-    return jsonify({"ok":True})
+    def apply():
+        if 0<=i<len(state.playlist): _remove_item(state.playlist[i]["id"])
+    controller.call(apply)
+    return jsonify({"ok":True, "rev": state.rev})
+
+@api_bp.route('/playlist/remove_id/<int:iid>')
+def rem_pl_id(iid):
+    return jsonify({"ok": controller.call(lambda: _remove_item(iid)), "rev": state.rev})
+
+@api_bp.route('/playlist/move', methods=['POST'])
+def move_pl():
+    """{id, to}：单条移动，不需要提交整个顺序"""
+    try:
+        iid = int(request.json.get('id')); to = int(request.json.get('to'))
+        def apply():
+            ok = state.playlist.move(iid, to)
+            if ok: state.save_state(); player_logic.prepare_next()
+            return ok
+        return jsonify({"ok": controller.call(apply), "rev": state.rev})
+    except: return jsonify({"ok":False})
+
+@api_bp.route('/playlist/items')
+def pl_items():
+    """分页读取：?offset=&limit=，大列表前端按需加载"""
+    offset = max(0, request.args.get('offset', 0, type=int)); limit = max(0, request.args.get('limit', 100, type=int))
+    version, rows = state.playlist.view()
+    items = rows[offset:offset + limit] if limit > 0 else rows[offset:]
+    return jsonify({"items": [_pl_item(*x) for x in items], "offset": offset, "total": len(rows),
+                    "version": version, "current_id": state.current_id, "rev": state.rev})
 
 @api_bp.route('/playlist/clear')
-def clr_pl(): ctx.player.stop(); state.playlist=[]; state.current_idx=-1; state.save_state(); ctx.gui_invoke('show_bg_layer'); return jsonify({"ok":True})
+def clr_pl():
+    def apply(): player_logic.stop_all(); state.playlist.clear(); state.current_id=None; state.save_state(); ctx.gui_invoke('show_bg_layer')
+    controller.call(apply); return jsonify({"ok":True, "rev": state.rev})
 
 @api_bp.route('/playlist/reorder', methods=['POST'])
 def reorder_playlist():
     try:
-        nis = request.json.get('indices', [])
-        if len(nis) != len(state.playlist): return jsonify({"ok": False})
-        np = [state.playlist[i] for i in nis]
-        if state.current_idx != -1:
-            curr = state.playlist[state.current_idx]
-            state.current_idx = np.index(curr) if curr in np else -1
-        state.playlist = np; state.save_state(); return jsonify({"ok":True})
+        ids = request.json.get('ids'); nis = request.json.get('indices', [])
+        def apply():
+            # 兼容旧客户端的下标数组；当前条目按 id 跟踪，重排后无需查找
+            order = ids if ids is not None else [state.playlist[i]["id"] for i in nis if 0 <= i < len(state.playlist)]
+            if not state.playlist.reorder(order): return False
+            state.save_state(); player_logic.prepare_next(); return True
+        return jsonify({"ok": controller.call(apply), "rev": state.rev})
     except: return jsonify({"ok":False})
 
 @api_bp.route('/control/<action>')
 def ctrl(action):
-    if action == 'pause':
-        if ctx.player.is_playing(): ctx.player.pause()
-        else:
-            if state.current_idx == -1 and len(state.playlist) > 0: player_logic.play_by_index(0)
-            else: ctx.player.play(); ctx.gui_invoke('hide_bg_layer')
-    elif action == 'next': player_logic.auto_next()
-    elif action == 'prev': player_logic.play_by_index((state.current_idx-1) if state.current_idx>0 else 0)
-    elif action == 'stop': ctx.player.stop(); state.current_idx = -1; ctx.gui_invoke('show_bg_layer')
-    return jsonify({"ok": True})
+    cmd = {"pause": ("toggle_pause",), "next": ("step", 1), "prev": ("step", -1), "stop": ("stop",)}.get(action)
+    if not cmd: return jsonify({"ok": False}), 400
+    return _queued(controller.submit(*cmd))
 
 @api_bp.route('/control/seek/<float:t>')
-def api_seek(t): ctx.player.set_time(int(t*1000)); return jsonify({"ok":True})
+def api_seek(t): return _queued(controller.submit("seek", t))
 @api_bp.route('/control/toggle_loop')
 def toggle_loop():
     m = ["list", "single", "random"]
-    state.loop_mode = m[(m.index(state.loop_mode) + 1) % len(m)]; state.save_state(); return jsonify({"ok":True, "mode":state.loop_mode})
+    def apply(): state.loop_mode = m[(m.index(state.loop_mode) + 1) % len(m)]; state.save_state(); player_logic.prepare_next()
+    controller.call(apply); return jsonify({"ok":True, "mode":state.loop_mode})
 @api_bp.route('/play/<int:i>')
-def play_idx(i): player_logic.play_by_index(i); return jsonify({"ok":True})
+def play_idx(i): return _queued(controller.submit("play", i))
 @api_bp.route('/set_screen/<int:i>')
 def set_scr(i):
     if state.target_monitor == i: state.target_monitor = -1; ctx.gui_invoke('hide_window')
@@ -252,6 +577,6 @@ def set_scr(i):
 @api_bp.route('/screen/test')
 def screen_test(): ctx.gui_invoke('screen_test'); return jsonify({"ok":True})
 @api_bp.route('/set_volume/<int:vol>')
-def set_vol(vol): state.volume=vol; state.is_muted=False; ctx.player.audio_set_mute(False); ctx.player.audio_set_volume(vol); state.save_state(); return jsonify({"ok":True})
+def set_vol(vol): return _queued(controller.submit("volume", vol))
 @api_bp.route('/toggle_mute')
-def mute(): state.is_muted=not state.is_muted; ctx.player.audio_set_mute(state.is_muted); state.save_state(); return jsonify({"ok":True})
\ No newline at end of file
+def mute(): return _queued(controller.submit("mute"))
\ No newline at end of file
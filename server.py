@@ -0,0 +1,122 @@
+import time
+import socket
+import threading
+from collections import deque
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from config import (HTTP_CONTROL_THREADS, HTTP_STREAM_THREADS, HTTP_EVENT_THREADS, HTTP_MAX_CONNECTIONS, HTTP_QUEUE,
+                    HTTP_QUEUE_WAIT, HTTP_REQUEST_TIMEOUT, HTTP_STREAM_TIMEOUT)
+
+# 长连接类请求 (上传/视频流) 走独立线程池，不占用控制接口的线程
+LONG_PATHS = ("/api/upload", "/api/bg/upload", "/api/library/set_folder_cover", "/video_stream/")
+# 事件推送连接永不结束，再单独一个池，不能挤占上传/视频流
+EVENT_PATHS = ("/api/events", "/api/status/stream")
+
+_BUSY = b"HTTP/1.1 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+class _FileWrapper:
+    """wsgi.file_wrapper：文件带 length 属性时直接 socket.sendfile (Linux 零拷贝)，否则按块读取"""
+    def __init__(self, sock, f, blksize=256 * 1024):
+        self.sock = sock; self.f = f; self.blksize = blksize
+    def __iter__(self):
+        n = getattr(self.f, "length", None)
+        if n is None:
+            for b in iter(lambda: self.f.read(self.blksize), b''): yield b
+            return
+        yield b"" # 先让处理器发出响应头
+        self.sock.sendfile(self.f, self.f.tell(), n)
+    def close(self): self.f.close()
+
+class _Handler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.1" # 允许分块传输 (SSE)；werkzeug 仍逐请求关闭连接
+    def make_environ(self):
+        env = super().make_environ()
+        env["wsgi.file_wrapper"] = lambda f, blksize=256 * 1024: _FileWrapper(self.connection, f, blksize)
+        return env
+
+class _Pool:
+    """固定线程数 + 有界等待队列：队列满时拒绝；排队超过 wait 秒仍没有空闲线程的任务交给 expire(*args) (回 503)，
+    不会无限等待。backlog=0 表示不排队，只在有空闲线程时接收"""
+    def __init__(self, name, workers, backlog, wait, expire):
+        self.q = deque(); self.backlog = backlog; self.wait = wait; self.expire = expire
+        self.idle = 0; self._cond = threading.Condition()
+        for i in range(workers): threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True).start()
+        threading.Thread(target=self._reap, name=f"{name}-reaper", daemon=True).start()
+
+    def submit(self, fn, *args):
+        with self._cond:
+            if len(self.q) >= self.idle + self.backlog: return False
+            self.q.append((time.monotonic() + self.wait, fn, args)); self._cond.notify_all()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self.idle += 1
+                while not self.q: self._cond.wait()
+                self.idle -= 1; _, fn, args = self.q.popleft()
+            try: fn(*args)
+            except Exception as e: print(f"HTTP Worker Error: {e}")
+
+    def _reap(self):
+        while True:
+            with self._cond:
+                while not self.q: self._cond.wait()
+                left = self.q[0][0] - time.monotonic(); late = []
+                while self.q and self.q[0][0] <= time.monotonic(): late.append(self.q.popleft())
+                if not late: self._cond.wait(left); continue
+            for _, _, args in late:
+                try: self.expire(*args)
+                except Exception as e: print(f"HTTP Worker Error: {e}")
+
+class PooledWSGIServer(BaseWSGIServer):
+    """生产模式 HTTP 服务：控制/状态请求与长连接请求分池处理，总连接数有上限，超载时快速 503"""
+    multithread = True
+
+    def __init__(self, host, port, app):
+        self._slots = threading.BoundedSemaphore(HTTP_MAX_CONNECTIONS)
+        self._short = _Pool("http", HTTP_CONTROL_THREADS, HTTP_QUEUE, HTTP_QUEUE_WAIT, self._expired)
+        self._long = _Pool("http-long", HTTP_STREAM_THREADS, HTTP_QUEUE, HTTP_QUEUE_WAIT, self._expired)
+        self._events = _Pool("http-events", HTTP_EVENT_THREADS, 0, HTTP_QUEUE_WAIT, self._expired)
+        super().__init__(host, port, app, handler=_Handler)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False): self._reject(request); return
+        if not self._short.submit(self._dispatch, request, client_address):
+            self._slots.release(); self._reject(request)
+
+    def _dispatch(self, request, client_address):
+        # 每个连接只处理一个请求 (Connection: close)，看请求行即可确定归属
+        try:
+            request.settimeout(HTTP_REQUEST_TIMEOUT)
+            head = request.recv(1024, socket.MSG_PEEK).split(b"\r\n", 1)[0].split(b" ")
+            path = head[1].decode('latin-1') if len(head) > 1 else ""
+        except OSError: self._done(request); return
+        pool = self._events if path.startswith(EVENT_PATHS) else self._long if path.startswith(LONG_PATHS) else None
+        if pool:
+            if pool.submit(self._serve, request, client_address, HTTP_STREAM_TIMEOUT): return
+            self._done(request, reject=True); return
+        self._serve(request, client_address, HTTP_REQUEST_TIMEOUT)
+
+    def _expired(self, request, *args):
+        """在线程池队列中等待过久：回 503，客户端稍后重试"""
+        self._done(request, reject=True)
+
+    def _serve(self, request, client_address, timeout):
+        try:
+            request.settimeout(timeout); self.finish_request(request, client_address)
+        except Exception: self.handle_error(request, client_address)
+        finally: self._done(request)
+
+    def _done(self, request, reject=False):
+        if reject: self._reject(request)
+        else: self.shutdown_request(request)
+        self._slots.release()
+
+    def _reject(self, request):
+        try: request.settimeout(1); request.sendall(_BUSY)
+        except OSError: pass
+        self.shutdown_request(request)
+
+def serve(app, host, port):
+    """阻塞运行生产模式服务"""
+    PooledWSGIServer(host, port, app).serve_forever()
@@ -1,50 +1,157 @@
 import os
-import json
-from config import CONFIG_FILE
+import atexit
+import threading
+from collections import deque
+from config import CONFIG_FILE, IDLE_DIR, STATE_DEBOUNCE, STATE_JOURNAL
+from catalog import catalog
+from persist import DebouncedWriter, read_json_with_journal
+from playlist import Playlist
+from metrics import latency
+from display import display
+
+# 需要同步给客户端的设置项
+SETTING_KEYS = ("target_monitor", "loop_mode", "volume", "is_muted", "idle_image")
 
 class PlayerState:
     """播放器状态管理与持久化"""
     def __init__(self):
-        self.playlist = [] 
-        self.current_idx = -1
+        self.playlist = Playlist()
+        self.current_id = None # 当前条目按 id 跟踪，列表增删/重排后仍指向同一条
         self.loop_mode = "list" # list, single, random
         self.target_monitor = -1 
         self.volume = 100
         self.is_muted = False
+        self.paused = False # 用户暂停 (不持久化)；计入状态版本，暂停/继续时客户端不会被 304 挡住
         self.idle_image = ""
+        self.resume_id = None # 存档中上次播放的条目，开机时续播
+        self.sys_bg_key = "" # 生成系统待机图时的 "IP:端口"，不变则不重新生成
+        # 状态版本号：任何客户端可见的变化都会递增，用于增量同步
+        self.rev = 0
+        self._hist = deque(maxlen=128) # (rev, 视图快照)；播放列表只记版本号，差异由列表自己的修改日志合并得出
+        self._cond = threading.Condition()
+        self._bg_cache = (None, ())
+        self.bg_watched = False # 文件监视运行时由其主动失效待机图缓存
+        # 后台防抖写入，请求线程不再直接做磁盘 I/O
+        self._writer = DebouncedWriter(CONFIG_FILE, self._persist_data, STATE_DEBOUNCE, STATE_JOURNAL, compact_keys=("playlist",),
+                                       stat=latency("state_write", "save_state disk write duration (journal append or snapshot)"))
         self.load_state()
+        self.touch()
+        atexit.register(self.flush_state)
 
-    def save_state(self):
-        data = {
-            "playlist": self.playlist,
+    @property
+    def current_idx(self):
+        return -1 if self.current_id is None else self.playlist.index_of(self.current_id)
+
+    @current_idx.setter
+    def current_idx(self, i):
+        self.current_id = self.playlist[i]["id"] if 0 <= i < len(self.playlist) else None
+
+    def bg_files(self):
+        """待机图列表，按目录 mtime 缓存"""
+        if self.bg_watched and self._bg_cache[0] is not None: return self._bg_cache[1]
+        try: mt = os.stat(IDLE_DIR).st_mtime_ns
+        except OSError: return ()
+        if self._bg_cache[0] != mt:
+            from utils import is_image
+            self._bg_cache = (mt, tuple(f for f in sorted(os.listdir(IDLE_DIR)) if is_image(f)))
+        return self._bg_cache[1]
+
+    def invalidate_bg(self): self._bg_cache = (None, ())
+
+    def _view(self):
+        return {
+            "settings": tuple(getattr(self, k) for k in SETTING_KEYS),
+            "current": (self.current_id, self.current_idx),
+            "paused": self.paused,
+            "playlist": self.playlist.version,
+            "bg_files": self.bg_files(),
+            "display": display.version,
+        }
+
+    def touch(self):
+        """状态可能已变化：与上一版本比较，有差异才递增 rev 并唤醒等待者"""
+        with self._cond:
+            v = self._view()
+            if self._hist and self._hist[-1][1] == v: return self.rev
+            self.rev += 1; self._hist.append((self.rev, v)); self._cond.notify_all()
+            return self.rev
+
+    def wait_change(self, rev, timeout):
+        """阻塞直到 rev 变化或超时，返回当前 rev"""
+        with self._cond:
+            if self.rev == rev: self._cond.wait(timeout)
+            return self.rev
+
+    def diff_since(self, rev):
+        """返回自 rev 以来变化的部分：{} 表示无变化，None 表示版本太旧需全量刷新"""
+        for _ in range(3):
+            self.touch() # 让最新版本包含尚未 touch 的列表修改，插入的条目才与版本对应
+            with self._cond:
+                if rev == self.rev: return {}
+                old = next((v for r, v in self._hist if r == rev), None)
+                if old is None: return None
+                cur = self._hist[-1][1]
+            d = self._diff(old, cur)
+            # 读取条目期间列表又被修改：重来 (几乎不会发生)
+            if d is None or self.playlist.version == cur["playlist"]: return d
+        return None
+
+    def _diff(self, old, cur):
+        d = {}
+        if old["settings"] != cur["settings"]:
+            d["settings"] = {k: v for k, a, v in zip(SETTING_KEYS, old["settings"], cur["settings"]) if a != v}
+        if old["paused"] != cur["paused"]: d["paused"] = cur["paused"]
+        if old["current"] != cur["current"]: d["current_id"], d["current_idx"] = cur["current"]
+        if old["playlist"] != cur["playlist"]:
+            ch = self.playlist.changes(old["playlist"], cur["playlist"])
+            if ch is None: return None
+            s, n, k = ch
+            d["playlist"] = {"start": s, "delete": n, "insert": self.playlist.rows(s, k), "length": len(self.playlist)}
+        if old["bg_files"] != cur["bg_files"]: d["bg_files"] = list(cur["bg_files"])
+        if old["display"] != cur["display"]: d["monitors"] = display.to_json(); d["display_ver"] = cur["display"]
+        return d
+
+    def _persist_data(self):
+        return {
+            "playlist": self.playlist.to_list(),
             "target_monitor": self.target_monitor,
             "loop_mode": self.loop_mode,
             "volume": self.volume,
             "is_muted": self.is_muted,
-            "idle_image": self.idle_image
+            "idle_image": self.idle_image,
+            "current_id": self.current_id,
+            "sys_bg_key": self.sys_bg_key
         }
-        try:
-            with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except: pass
+
+    def save_state(self):
+        self._writer.schedule()
+        self.touch()
+
+    def flush_state(self):
+        """立即落盘 (退出/关机前)"""
+        try: self._writer.flush()
+        except Exception as e: print(f"State Save Error: {e}")
 
     def load_state(self):
         if not os.path.exists(CONFIG_FILE): return
         try:
-            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data, jn = read_json_with_journal(CONFIG_FILE)
+            self._writer.loaded(data, jn)
             if "playlist" in data:
-                self.playlist = []
-                for x in data["playlist"]:
-                    # 校验文件是否存在
-                    if os.path.exists(x.get('path', '')):
-                        if 'duration' not in x: x['duration'] = 0
-                        self.playlist.append(x)
+                items = [x for x in data["playlist"] if os.path.exists(x.get('path', ''))] # 校验文件是否存在
+                # 时长以元数据目录为准 (文件被替换时目录会失效，此时保留原值)
+                metas = catalog.lookup_many([x['path'] for x in items], probe=False)
+                for x in items:
+                    m = metas.get(x['path'])
+                    if m: x['duration'] = m['duration']
+                    elif 'duration' not in x: x['duration'] = 0
+                self.playlist.load(items)
             if "target_monitor" in data: self.target_monitor = int(data["target_monitor"])
             if "loop_mode" in data: self.loop_mode = data["loop_mode"]
             if "volume" in data: self.volume = int(data["volume"])
             if "is_muted" in data: self.is_muted = bool(data.get("is_muted", False))
             if "idle_image" in data: self.idle_image = data["idle_image"]
+            self.resume_id = data.get("current_id"); self.sys_bg_key = data.get("sys_bg_key", "")
         except: pass
 
 state = PlayerState()
\ No newline at end of file
@@ -0,0 +1,125 @@
+import io
+import os
+import time
+import mimetypes
+import threading
+from flask import Response
+from werkzeug.http import http_date, parse_date, quote_etag, unquote_etag
+from config import STREAM_MAX
+
+BLOCK = 256 * 1024
+MAX_RANGES = 16 # 区间过多 (或被拆得很碎) 时直接整文件返回，避免放大攻击
+_slots = threading.BoundedSemaphore(STREAM_MAX)
+
+class _SlotFile(io.FileIO):
+    """关闭时归还并发名额；交给服务器的 file_wrapper 后也能正确释放"""
+    def close(self):
+        if not self.closed:
+            try: super().close()
+            finally: _slots.release()
+
+class _RangeIter:
+    """只读 [start, end] 区间的分块迭代器 (无 file_wrapper 时的回退路径，以及多区间)"""
+    def __init__(self, f, parts):
+        self.f = f; self.parts = parts # [(前缀字节, start, end)]
+    def __iter__(self):
+        for head, start, end in self.parts:
+            if head: yield head
+            if start is None: continue
+            self.f.seek(start); left = end - start + 1
+            while left > 0:
+                b = self.f.read(min(BLOCK, left))
+                if not b: return
+                left -= len(b); yield b
+    def close(self): self.f.close()
+
+def validators(st):
+    """强校验器：大小 + 纳秒级修改时间"""
+    return f"{st.st_size:x}-{st.st_mtime_ns:x}", int(st.st_mtime)
+
+def _ranges(header, size):
+    """解析 Range 头为合并后的 [(start, end)]；None 表示忽略 (整文件)，[] 表示不可满足"""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec: return None
+    out = []
+    for item in spec.split(","):
+        a, sep, b = item.strip().partition("-")
+        if not sep or not (a or b) or not (a or "0").isdigit() or not (b or "0").isdigit(): return None
+        if not a: start, end = max(0, size - int(b)), size - 1 # 后缀区间 -N
+        else: start = int(a); end = min(int(b), size - 1) if b else size - 1
+        if b and a and int(b) < start: return None
+        if start <= end: out.append((start, end))
+    if not out: return []
+    out.sort(); merged = [list(out[0])]
+    for s, e in out[1:]:
+        if s <= merged[-1][1] + 1: merged[-1][1] = max(merged[-1][1], e)
+        else: merged.append([s, e])
+    if len(merged) > MAX_RANGES: return None
+    return [tuple(m) for m in merged]
+
+def _if_range_ok(req, etag, mtime):
+    v = req.headers.get("If-Range")
+    if not v: return True
+    if v.startswith(('"', 'W/')):
+        tag, weak = unquote_etag(v)
+        return not weak and tag == etag # If-Range 只接受强比较
+    d = parse_date(v)
+    return d is not None and int(d.timestamp()) == mtime
+
+def _not_modified(req, etag, mtime):
+    inm = req.if_none_match
+    if inm: return inm.contains_weak(etag) or inm.star_tag
+    ims = req.if_modified_since
+    return ims is not None and int(ims.timestamp()) >= mtime
+
+def _open(path, environ, start, length):
+    """占用一个并发名额打开文件；服务器提供 file_wrapper 时交给它 (可走 sendfile)"""
+    if not _slots.acquire(blocking=False): return None
+    try: f = _SlotFile(path, 'r')
+    except OSError: _slots.release(); raise
+    fw = environ.get("wsgi.file_wrapper")
+    if fw and getattr(fw, "__module__", "").split(".")[0] != "werkzeug":
+        # 服务器按 Content-Length 截断，从当前位置 sendfile
+        f.seek(start); f.length = length; return fw(f, BLOCK)
+    return _RangeIter(f, [(b"", start, start + length - 1)])
+
+def send_video(req, path, cache="no-cache"):
+    """带 Range / If-Range / 条件请求处理的文件响应；并发流超过 STREAM_MAX 时 503"""
+    st = os.stat(path); size = st.st_size
+    etag, mtime = validators(st)
+    ctype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    h = {"ETag": quote_etag(etag), "Last-Modified": http_date(mtime), "Accept-Ranges": "bytes", "Cache-Control": cache}
+    if _not_modified(req, etag, mtime): return Response(status=304, headers=h)
+    rs = _ranges(req.headers.get("Range"), size) if req.headers.get("Range") and _if_range_ok(req, etag, mtime) else None
+    if rs == []:
+        h["Content-Range"] = f"bytes */{size}"; return Response(status=416, headers=h)
+    head = req.method == "HEAD"
+
+    if rs is None or len(rs) == 1:
+        start, end = rs[0] if rs else (0, size - 1)
+        length = end - start + 1 if size else 0
+        h["Content-Length"] = str(length)
+        if rs: h["Content-Range"] = f"bytes {start}-{end}/{size}"
+        status = 206 if rs else 200
+        if head or length == 0: return Response(status=status, headers=h, content_type=ctype)
+        body = _open(path, req.environ, start, length)
+        if body is None: return _busy()
+        return Response(body, status=status, headers=h, content_type=ctype, direct_passthrough=True)
+
+    # 多区间：multipart/byteranges
+    boundary = f"RANGE{os.getpid():x}{time.time_ns():x}"
+    parts = []; total = 0
+    for s, e in rs:
+        pre = (f"\r\n--{boundary}\r\nContent-Type: {ctype}\r\nContent-Range: bytes {s}-{e}/{size}\r\n\r\n").encode()
+        parts.append((pre, s, e)); total += len(pre) + e - s + 1
+    tail = f"\r\n--{boundary}--\r\n".encode(); parts.append((tail, None, None)); total += len(tail)
+    h["Content-Length"] = str(total)
+    ct = f"multipart/byteranges; boundary={boundary}"
+    if head: return Response(status=206, headers=h, content_type=ct)
+    if not _slots.acquire(blocking=False): return _busy()
+    try: f = _SlotFile(path, 'r')
+    except OSError: _slots.release(); raise
+    return Response(_RangeIter(f, parts), status=206, headers=h, content_type=ct, direct_passthrough=True)
+
+def _busy():
+    return Response("busy", status=503, headers={"Retry-After": "2", "Cache-Control": "no-store"})
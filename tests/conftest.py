@@ -0,0 +1,33 @@
+"""回归测试环境：与 bench 相同，vlc / tkinter / screeninfo 用替身，config 中的数据路径全部指向临时目录。
+仓库模块大多在导入时创建全局单例，所以必须在任何测试模块导入它们之前完成。"""
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+from run import setup_env
+
+WORK = tempfile.mkdtemp(prefix="ledpro-test-")
+config = setup_env(WORK)
+
+def pytest_sessionfinish(session, exitstatus):
+    if "state" in sys.modules: sys.modules["state"].state.flush_state() # 后台写入线程写完再删目录
+    shutil.rmtree(WORK, ignore_errors=True)
+
+@pytest.fixture(scope="session")
+def app():
+    from flask import Flask
+    import routes
+    import player_logic
+    from thumb_pool import thumb_pool
+    thumb_pool.submit = lambda *a, **k: None # 缩略图进程池不在测试范围内
+    player_logic.init()
+    app = Flask("tests"); app.config['TESTING'] = True
+    app.register_blueprint(routes.main_bp); app.register_blueprint(routes.api_bp, url_prefix='/api')
+    return app
+
+@pytest.fixture
+def client(app): return app.test_client()
@@ -0,0 +1,41 @@
+import os
+import pytest
+from PIL import Image
+import bg_cache as B
+from catalog import catalog
+from dedup import store
+
+@pytest.fixture
+def cache(tmp_path): return B.IdleImageCache(str(tmp_path / "cache"))
+
+def _img(p, color="red"): Image.new("RGB", (400, 300), color).save(p); return str(p)
+
+def test_photo_never_hashes_on_gui_thread(cache, tmp_path, monkeypatch):
+    src = _img(tmp_path / "a.png")
+    def boom(): raise AssertionError("hashed on the Tk thread")
+    monkeypatch.setattr(B.hashlib, "sha1", boom)
+    assert cache.photo(src, 200, 150) is None # 哈希未知：交给 prepare_async 在后台补齐
+
+def test_registered_digest_is_used_without_reading(cache, tmp_path, monkeypatch):
+    src = _img(tmp_path / "a.png"); catalog.record_hash(src, "ab" * 32)
+    monkeypatch.setattr(B.hashlib, "sha1", None)
+    assert cache.source_hash(src, compute=False) == "ab" * 8
+
+def test_forget_keeps_variants_shared_with_duplicates(cache, tmp_path):
+    a = _img(tmp_path / "a.png"); store.absorb(a)
+    b = str(tmp_path / "b.png"); open(b, 'wb').write(open(a, 'rb').read()); store.absorb(b)
+    vp = cache.ensure_variant(a, 200, 150)
+    assert cache.ensure_variant(b, 200, 150) == vp
+    cache.forget(a); os.remove(a); catalog.forget(a)
+    assert os.path.exists(vp)
+    cache.forget(b)
+    assert not os.path.exists(vp)
+
+def test_disk_variants_are_bounded(cache, tmp_path):
+    srcs = [_img(tmp_path / f"{i}.png", (i * 40, 0, 0)) for i in range(4)]
+    one = os.path.getsize(cache.ensure_variant(srcs[0], 400, 300))
+    cache.max_bytes = one * 2 + one // 2
+    vps = [cache.ensure_variant(s, 400, 300) for s in srcs[1:]]
+    left = os.listdir(cache.cache_dir)
+    assert sum(os.path.getsize(os.path.join(cache.cache_dir, f)) for f in left) <= cache.max_bytes
+    assert os.path.basename(vps[-1]) in left
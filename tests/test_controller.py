@@ -0,0 +1,63 @@
+import pytest
+from context import ctx
+from controller import PlaybackController, Command, _ABSORBED
+
+@pytest.fixture
+def ctl(app):
+    # 不启动控制线程，只看入队合并后的队列
+    c = PlaybackController()
+    def queue(*cmds):
+        for name, *args in cmds:
+            cmd = c._coalesce(name, args)
+            if cmd is None: c._q.append(Command(next(c._ids), name, args))
+        return [(x.name, *x.args) for x in c._q]
+    c.queue = queue
+    yield c
+    ctx.player.stop()
+
+def test_steps_accumulate(ctl):
+    assert ctl.queue(("step", 1), ("step", 1), ("step", 1)) == [("step", 3)]
+
+def test_opposite_steps_cancel(ctl):
+    assert ctl.queue(("step", 1), ("step", -1)) == []
+    ctl.queue(("step", 2))
+    assert ctl._coalesce("step", [-2]) is _ABSORBED and not ctl._q
+
+def test_play_supersedes_queued_navigation(ctl):
+    assert ctl.queue(("volume", 50), ("step", 1), ("end",), ("play", 5)) == [("volume", 50), ("play", 5)]
+
+def test_stop_supersedes_pending_toggle(ctl):
+    assert ctl.queue(("play", 1), ("toggle_pause",), ("stop",)) == [("stop",)]
+
+def test_latest_wins_only_at_tail(ctl):
+    assert ctl.queue(("seek", 10), ("seek", 20)) == [("seek", 20)]
+    # 跳到别的条目之后的 seek 不能并入之前那次，否则会作用在旧条目上
+    assert ctl.queue(("play", 2), ("seek", 30), ("volume", 40), ("volume", 60)) == \
+        [("seek", 20), ("play", 2), ("seek", 30), ("volume", 60)]
+
+def test_toggle_pair_cancels_only_while_playing(ctl):
+    ctx.player.play()
+    assert ctl.queue(("toggle_pause",), ("toggle_pause",)) == []
+    ctx.player.stop()
+    # 从停止状态开始的切换会开播，两次不能互相抵消
+    assert ctl.queue(("toggle_pause",), ("toggle_pause",)) == [("toggle_pause",), ("toggle_pause",)]
+
+def test_toggle_pair_behind_other_commands_is_kept(ctl):
+    ctx.player.play()
+    assert ctl.queue(("step", 1), ("toggle_pause",), ("toggle_pause",)) == [("step", 1), ("toggle_pause",), ("toggle_pause",)]
+
+def test_queued_command_returns_resulting_revision(client):
+    from state import state
+    before = state.rev; ctx.player.play()
+    try:
+        d = client.get("/api/set_volume/23").get_json()
+        assert d["ok"] and "pending" not in d and d["rev"] > before and state.volume == 23
+    finally: ctx.player.stop()
+
+def test_busy_controller_is_503(client, monkeypatch):
+    from controller import controller
+    def busy(fn, timeout=10): raise TimeoutError("controller busy")
+    monkeypatch.setattr(controller, "call", busy)
+    for url in ("/api/playlist/clear", "/api/playlist/remove/0", "/api/control/toggle_loop"):
+        r = client.get(url)
+        assert r.status_code == 503 and r.get_json() == {"ok": False, "error": "busy"}
@@ -0,0 +1,50 @@
+import time
+import threading
+import pytest
+import decoders as D
+
+class _Cap:
+    """假解码器：打开耗时可控，记录是否已释放"""
+    slow = {}
+    def __init__(self, path):
+        self.path = path; self.released = False; self.pos = 0.0
+        time.sleep(self.slow.get(path, 0))
+    def isOpened(self): return True
+    def set(self, prop, v): self.pos = v
+    def get(self, prop): return self.pos
+    def read(self):
+        assert not self.released, "read after release"
+        self.pos += 40; return True, self.path
+    def release(self): self.released = True
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(D.cv2, "VideoCapture", _Cap)
+    paths = []
+    for i in range(3): p = tmp_path / f"{i}.mp4"; p.write_bytes(b"v" * (i + 1)); paths.append(str(p))
+    return D.DecoderPool(max_open=1), paths
+
+def test_slow_open_does_not_block_other_files(pool):
+    dp, (a, b, _) = pool
+    _Cap.slow[a] = 0.5
+    try:
+        t = threading.Thread(target=dp.frame_at, args=(a, 0)); t.start(); time.sleep(0.05)
+        t0 = time.monotonic(); assert dp.frame_at(b, 0) == b
+        assert time.monotonic() - t0 < 0.3 # 不等 a 打开完
+        t.join()
+    finally: _Cap.slow.clear()
+
+def test_evicted_decoder_in_use_closes_after_use(pool):
+    dp, (a, b, _) = pool
+    d = dp._get(a); dp._put(d); d = dp._get(a) # 占用 a
+    with d.lock: d.cap = _Cap(a)
+    dp.frame_at(b, 0) # 超出 max_open，a 被淘汰，但正在使用
+    assert d.dead and not d.cap.released
+    cap = d.cap; dp._put(d)
+    assert cap.released
+
+def test_release_closes_idle_decoder(pool):
+    dp, (a, _, _) = pool
+    dp.frame_at(a, 0); d = dp._decs[a]; cap = d.cap
+    dp.release(a)
+    assert cap.released and a not in dp._decs
@@ -0,0 +1,61 @@
+import os
+import pytest
+import config
+from catalog import catalog
+from dedup import store
+
+DATA = os.urandom(4096)
+
+@pytest.fixture
+def vdir(tmp_path):
+    d = os.path.join(config.VIDEO_DIR, f"dedup-{tmp_path.name}"); os.makedirs(d)
+    yield d
+    for f in os.listdir(d): os.remove(os.path.join(d, f)); catalog.forget(os.path.join(d, f))
+    os.rmdir(d)
+
+def _put(d, name):
+    p = os.path.join(d, name)
+    with open(p, 'wb') as f: f.write(DATA)
+    return p, store.absorb(p)
+
+def test_report_counts_copies_not_links(vdir):
+    a, r = _put(vdir, "a.mp4"); assert r["dup_of"] is None
+    _, rb = _put(vdir, "b.mp4"); _, rc = _put(vdir, "c.mp4")
+    mode = rb["mode"]; assert rb["dup_of"] == a and rc["mode"] == mode
+    if mode == "alias": pytest.skip("filesystem has no reflink/hardlink")
+    assert catalog.dedup_stats()[mode] == (2, 2 * len(DATA))
+    # 原件删除后只剩两份共享数据：只有一份是节省下来的
+    os.remove(a)
+    assert catalog.dedup_stats()[mode] == (1, len(DATA))
+    catalog.forget(a)
+    assert store.report()["reclaimed_bytes"] == len(DATA)
+
+def test_falls_back_to_hardlink(vdir, monkeypatch):
+    import dedup
+    monkeypatch.setattr(dedup, "_reflink", lambda s, t: False)
+    a, _ = _put(vdir, "a.mp4"); b, r = _put(vdir, "b.mp4")
+    if r["mode"] == "alias": pytest.skip("filesystem has no hardlinks")
+    assert r == dict(r, dup_of=a, mode="hardlink", saved=len(DATA))
+    assert os.path.samefile(a, b) and not os.path.exists(b + ".dedup")
+
+def test_alias_when_no_link_is_possible(vdir, monkeypatch):
+    import dedup
+    monkeypatch.setattr(dedup, "_reflink", lambda s, t: False)
+    monkeypatch.setattr(dedup, "_hardlink", lambda s, t: False)
+    a, _ = _put(vdir, "a.mp4"); b, r = _put(vdir, "b.mp4")
+    assert r["dup_of"] == a and r["mode"] == "alias" and r["saved"] == 0
+    assert not os.path.samefile(a, b) and open(b, 'rb').read() == DATA # 文件保留原样
+    rep = store.report()
+    assert rep["alias_files"] == 1 and rep["duplicate_bytes"] == len(DATA) and rep["reclaimed_bytes"] == 0
+
+def test_link_that_cannot_replace_is_alias(vdir, monkeypatch):
+    import dedup
+    monkeypatch.setattr(dedup, "_reflink", lambda s, t: open(t, 'wb').close() or True)
+    real = os.replace
+    def replace(s, d):
+        if s.endswith(".dedup"): raise OSError("busy")
+        return real(s, d)
+    monkeypatch.setattr(dedup.os, "replace", replace)
+    monkeypatch.setattr(dedup, "_hardlink", lambda s, t: False)
+    _put(vdir, "a.mp4"); b, r = _put(vdir, "b.mp4")
+    assert r["mode"] == "alias" and not os.path.exists(b + ".dedup") and open(b, 'rb').read() == DATA
@@ -0,0 +1,24 @@
+import os
+import config
+import player_logic
+from state import state
+from context import ctx
+from controller import controller
+
+def _item(n): return {"name": f"{n}.mp4", "path": os.path.join(config.VIDEO_DIR, f"{n}.mp4"), "duration": 3}
+
+def test_old_player_kept_until_layer_swapped(app):
+    state.loop_mode = "list"; state.playlist.load([_item(i) for i in range(3)])
+    try:
+        controller.call(lambda: player_logic.play_by_index(0))
+        first = player_logic.players[player_logic._active]
+        assert player_logic._preroll["idx"] == 1
+        ctx.gui_take(); controller.call(player_logic.auto_next)
+        # 已切到预加载的播放器，但 GUI 还没换图层：旧播放器仍在最上面，不能停止，也不能被拿去预加载
+        swap = [a for c, a, _ in ctx.gui_take() if c == 'swap_video']
+        assert swap == [(player_logic._active,)] and player_logic._preroll["idx"] == -1
+        assert first.is_playing() and first.media.get_mrl().endswith("0.mp4")
+        player_logic.swapped(swap[0][0]); controller.call(lambda: None)
+        assert player_logic._preroll["idx"] == 2 and first.media.get_mrl().endswith("2.mp4")
+    finally:
+        controller.call(player_logic.stop_all); state.playlist.clear(); state.current_id = None; state.touch(); ctx.gui_take()
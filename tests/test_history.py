@@ -0,0 +1,14 @@
+from history import History
+
+def test_aggregate_window_includes_current_minute():
+    h = History(interval=1, raw_seconds=30, days=1)
+    t0 = 6000.0
+    for i in range(150): h.add(t0 + i, {"cpu": 10 if i < 120 else 50})
+    now = t0 + 150
+    r = h.query(now, 600, names=["cpu"]) # 原始采样只有 30 秒，走分钟聚合
+    assert r["step"] >= 60
+    cpu = r["series"]["cpu"]; k = int((t0 + 120 - r["start"]) // r["step"])
+    assert cpu["max"][k] == 50 and cpu["avg"][k] == 50 # 进行中的那一分钟
+    assert cpu["max"][k - 1] == 10
+    assert h.query(now, 600, names=["cpu"])["series"]["cpu"]["max"][k] == 50 # 查询不改动累加器
+    assert len(h.agg_t.values()) == 2
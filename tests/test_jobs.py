@@ -0,0 +1,53 @@
+import threading
+from jobs import JobManager, Cancelled
+
+def _looping(started, release=None):
+    def work(job):
+        started.set()
+        for _ in range(1000):
+            job.check(); job.step(result=1)
+            if release: release.wait(0.01)
+        return "all"
+    return work
+
+def test_cancel_running_job():
+    m = JobManager(1); started = threading.Event(); gate = threading.Event()
+    j = m.submit("t", _looping(started, gate), 1000)
+    assert started.wait(2) and m.cancel(j.id)
+    assert j.wait(2) and j.state == "cancelled"
+    assert 0 < j.done < 1000 and j.value is None and j.finished
+    assert not m.cancel(j.id) # 已结束的任务不能再取消
+
+def test_cancel_queued_job_never_runs():
+    m = JobManager(1); gate = threading.Event(); ran = []
+    first = m.submit("block", lambda job: gate.wait(2))
+    queued = m.submit("q", lambda job: ran.append(1))
+    assert m.cancel(queued.id); gate.set()
+    assert queued.wait(2) and first.wait(2)
+    assert queued.state == "cancelled" and queued.started is None and not ran
+    assert first.state == "done"
+
+def test_cancel_after_work_returns_is_cancelled():
+    m = JobManager(1); gate = threading.Event(); inside = threading.Event()
+    def work(job): inside.set(); gate.wait(2); return "late" # 不检查取消也不能报告 done
+    j = m.submit("t", work); inside.wait(2); m.cancel(j.id); gate.set()
+    assert j.wait(2) and j.state == "cancelled"
+
+def test_failure_and_unknown_id():
+    m = JobManager(1)
+    def boom(job): raise ValueError("x")
+    j = m.submit("t", boom); j.wait(2)
+    assert j.state == "failed" and j.errors == ["x"]
+    assert not m.cancel("nope")
+    j = m.submit("t", lambda job: (_ for _ in ()).throw(Cancelled())); j.wait(2)
+    assert j.state == "cancelled"
+
+def test_cancel_route(client):
+    from jobs import jobs
+    started = threading.Event(); gate = threading.Event()
+    j = jobs.submit("t", _looping(started, gate), 1000); started.wait(2)
+    assert client.post(f"/api/jobs/{j.id}/cancel").get_json() == {"ok": True}
+    j.wait(2)
+    assert client.get(f"/api/jobs/{j.id}").get_json()["state"] == "cancelled"
+    assert client.post(f"/api/jobs/{j.id}/cancel").get_json() == {"ok": False}
+    assert client.get("/api/jobs/nope").status_code == 404
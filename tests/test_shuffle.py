@@ -0,0 +1,41 @@
+import random
+import pytest
+from playlist import Playlist, ShuffleBag
+
+def _pl(n): return Playlist([{"name": f"{i}.mp4", "path": f"/v/{i}.mp4"} for i in range(n)])
+
+def _take(bag, pl, cur, k):
+    out = []
+    for _ in range(k):
+        cur = bag.peek(pl, cur); bag.played(cur); out.append(cur)
+    return out
+
+@pytest.mark.parametrize("seed", range(20))
+def test_each_round_plays_everything_once(seed):
+    pl = _pl(5); ids = {x["id"] for x in pl}; bag = ShuffleBag(random.Random(seed))
+    r1 = _take(bag, pl, None, 5); r2 = _take(bag, pl, r1[-1], 5)
+    assert set(r1) == ids and set(r2) == ids
+    assert r2[0] != r1[-1] # 跨轮边界不连播同一条
+
+def test_current_counts_as_played_in_first_round():
+    pl = _pl(4); cur = pl[0]["id"]; bag = ShuffleBag(random.Random(1))
+    assert cur not in _take(bag, pl, cur, 3)
+    assert bag.peek(pl, cur) is not None # 袋空后开新一轮
+
+@pytest.mark.parametrize("seed", range(10))
+def test_mid_bag_edits(seed):
+    pl = _pl(6); bag = ShuffleBag(random.Random(seed))
+    done = _take(bag, pl, None, 2)
+    left = [x["id"] for x in pl if x["id"] not in done]
+    gone = left[0]; pl.remove(gone); new = pl.append({"name": "new.mp4", "path": "/v/new.mp4"})["id"]
+    pl.remove(done[0]) # 已播过的删掉不影响本轮
+    rest = _take(bag, pl, done[-1], len(left))
+    assert gone not in rest and new in rest
+    assert set(rest) == set(left) - {gone} | {new}
+    assert done[0] not in _take(bag, pl, rest[-1], len(pl)) # 下一轮也不会再出现
+
+def test_empty_and_single():
+    pl = Playlist(); bag = ShuffleBag(random.Random(0))
+    assert bag.peek(pl) is None
+    x = pl.append({"name": "a", "path": "/v/a"})["id"]
+    assert _take(bag, pl, None, 3) == [x, x, x] # 只有一条时允许重复
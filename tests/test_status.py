@@ -0,0 +1,58 @@
+import os
+import pytest
+import config
+from state import state
+from context import ctx
+from controller import controller
+from utils import sys_monitor
+from display import display
+
+def _item(n): return {"name": f"{n}.mp4", "path": os.path.join(config.VIDEO_DIR, f"{n}.mp4"), "duration": 3}
+
+@pytest.fixture(autouse=True)
+def idle(app):
+    display.to_json() # 首次枚举显示器会递增拓扑版本，先枚举好，免得计入被测的状态差异
+    ctx.player.stop(); state.paused = False; state.playlist.clear(); state.current_id = None; state.touch()
+    yield
+    ctx.player.stop(); state.paused = False; state.playlist.clear(); state.current_id = None; state.touch()
+
+def _since(client, rev):
+    # 带上已有的硬件采样序号，否则每次都会附带 sys 字段而不是 304
+    return client.get(f"/api/status?since={rev}&sys={sys_monitor.seq}&playlist=0")
+
+def test_unchanged_idle_state_is_304(client):
+    rev = client.get("/api/status").get_json()["rev"]
+    r = _since(client, rev)
+    assert r.status_code == 304 and r.headers["X-State-Rev"] == str(rev)
+
+def test_changes_are_returned_as_diff(client):
+    rev = state.rev
+    state.volume = 37; state.touch()
+    d = _since(client, rev).get_json()
+    assert d["diff"] and d["rev"] > rev and d["settings"] == {"volume": 37}
+    assert _since(client, d["rev"]).status_code == 304
+
+def test_playlist_diff_is_a_splice(client):
+    state.playlist.load([_item(i) for i in range(5)]); state.touch(); rev = state.rev
+    state.playlist.insert(2, _item("new")); state.playlist.remove(state.playlist[0]["id"])
+    pl = _since(client, rev).get_json()["playlist"]
+    assert pl["start"] == 0 and pl["length"] == 5
+    assert [x["name"] for x in pl["insert"]] == ["1.mp4", "new.mp4"] and pl["delete"] == 2
+
+def test_unknown_revision_gets_full_status(client):
+    d = _since(client, state.rev + 1000).get_json()
+    assert "diff" not in d and d["rev"] == state.rev and "playlist" not in d
+
+def test_pause_is_not_hidden_behind_304(client):
+    state.playlist.load([_item(0)]); state.current_idx = 0; ctx.player.play(); state.touch()
+    rev = state.rev
+    # 播放中：即使状态没变也要返回进度
+    d = _since(client, rev).get_json()
+    assert d["is_playing"] and d["rev"] == rev
+    controller.submit("toggle_pause"); controller.call(lambda: None)
+    d = _since(client, rev).get_json()
+    assert d["paused"] is True and d["is_playing"] is False and d["rev"] > rev
+    assert _since(client, d["rev"]).status_code == 304
+    controller.submit("toggle_pause"); controller.call(lambda: None)
+    d = _since(client, d["rev"]).get_json()
+    assert d["paused"] is False and d["is_playing"] is True
@@ -0,0 +1,52 @@
+import os
+import pytest
+import config
+import streaming
+from config import STREAM_MAX
+
+DATA = os.urandom(100_000)
+
+@pytest.fixture(scope="module")
+def url():
+    with open(os.path.join(config.VIDEO_DIR, "range.mp4"), 'wb') as f: f.write(DATA)
+    return "/video_stream/range.mp4"
+
+def _get(client, url, **headers):
+    r = client.get(url, headers=headers); body = r.get_data(); r.close(); return r, body
+
+def test_full_response(client, url):
+    r, body = _get(client, url)
+    assert r.status_code == 200 and body == DATA
+    assert r.headers["Accept-Ranges"] == "bytes" and int(r.headers["Content-Length"]) == len(DATA)
+
+@pytest.mark.parametrize("spec, start, end", [("bytes=10-19", 10, 19), ("bytes=99990-", 99990, 99999),
+                                              ("bytes=-5", 99995, 99999), ("bytes=0-999999", 0, 99999)])
+def test_single_range(client, url, spec, start, end):
+    r, body = _get(client, url, Range=spec)
+    assert r.status_code == 206 and body == DATA[start:end + 1]
+    assert r.headers["Content-Range"] == f"bytes {start}-{end}/{len(DATA)}"
+
+def test_unsatisfiable_range(client, url):
+    r, _ = _get(client, url, Range="bytes=200000-")
+    assert r.status_code == 416 and r.headers["Content-Range"] == f"bytes */{len(DATA)}"
+
+def test_multiple_ranges(client, url):
+    r, body = _get(client, url, Range="bytes=0-9,50-59,55-64")
+    assert r.status_code == 206 and r.mimetype == "multipart/byteranges"
+    assert int(r.headers["Content-Length"]) == len(body)
+    # 重叠区间合并为一段
+    assert body.count(b"Content-Range:") == 2 and DATA[50:65] in body and DATA[0:10] in body
+
+def test_validators(client, url):
+    r, _ = _get(client, url); etag = r.headers["ETag"]
+    r, body = _get(client, url, **{"If-None-Match": etag})
+    assert r.status_code == 304 and body == b""
+    # If-Range 与当前版本一致才按区间返回，否则整文件
+    r, body = _get(client, url, Range="bytes=0-9", **{"If-Range": etag})
+    assert r.status_code == 206 and body == DATA[:10]
+    r, body = _get(client, url, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert r.status_code == 200 and body == DATA
+
+def test_stream_slots_released(client, url):
+    for _ in range(STREAM_MAX * 3): _get(client, url, Range="bytes=0-99")
+    assert streaming._slots._value == STREAM_MAX
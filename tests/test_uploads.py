@@ -0,0 +1,79 @@
+import os
+import io
+import hashlib
+import pytest
+from uploads import UploadManager, UploadError
+
+DATA = bytes(range(256)) * 64 # 16 KiB
+HALF = len(DATA) // 2
+
+def _sha(b): return hashlib.sha256(b).hexdigest()
+
+@pytest.fixture
+def mgr(tmp_path):
+    m = UploadManager(str(tmp_path / "state")); done = []
+    m.on_complete = lambda path, thumb_dir, digest: done.append((path, digest))
+    m.done = done; (tmp_path / "videos").mkdir()
+    return m
+
+def _create(m, tmp_path, **kw): return m.create(str(tmp_path / "videos"), str(tmp_path / "thumbs"), "clip.mp4", len(DATA), **kw)
+
+def _put(m, uid, offset, data, sha=None): return m.write_chunk(uid, offset, io.BytesIO(data), len(data), sha)
+
+def test_resume_after_restart(mgr, tmp_path):
+    s = _create(mgr, tmp_path)
+    assert _put(mgr, s["id"], 0, DATA[:HALF])["received"] == HALF
+    # 进程重启：新的管理器从磁盘上的会话记录续传
+    m2 = UploadManager(mgr.state_dir); m2.on_complete = mgr.on_complete
+    r = _create(m2, tmp_path, resume=s["id"])
+    assert r["id"] == s["id"] and r["received"] == HALF
+    r = _put(m2, s["id"], HALF, DATA[HALF:], _sha(DATA[HALF:]))
+    assert r["done"]
+    with open(r["path"], 'rb') as f: assert f.read() == DATA
+    assert not os.path.exists(s["part"]) and not m2._locks
+    # 续传跨越了进程，没有增量哈希，完成时不报告摘要
+    assert mgr.done == [(r["path"], None)]
+
+def test_same_name_and_size_without_id_is_a_new_session(mgr, tmp_path):
+    a = _create(mgr, tmp_path); _put(mgr, a["id"], 0, DATA[:HALF])
+    # 另一个客户端上传同名同大小的不同内容：不能并到同一个 .part
+    b = _create(mgr, tmp_path)
+    assert b["id"] != a["id"] and b["received"] == 0 and b["part"] != a["part"]
+    assert _create(mgr, tmp_path, resume="0" * 32)["id"] not in (a["id"], b["id"]) # 未知 id 也新建
+
+def test_resume_by_fingerprint(mgr, tmp_path):
+    a = _create(mgr, tmp_path, fingerprint="f1"); _put(mgr, a["id"], 0, DATA[:HALF])
+    assert _create(mgr, tmp_path, fingerprint="f2")["id"] != a["id"]
+    r = _create(mgr, tmp_path, fingerprint="f1")
+    assert r["id"] == a["id"] and r["received"] == HALF
+
+def test_sequential_upload_reports_digest(mgr, tmp_path):
+    s = _create(mgr, tmp_path)
+    _put(mgr, s["id"], 0, DATA[:HALF]); _put(mgr, s["id"], HALF, DATA[HALF:])
+    assert mgr.done == [(s["path"], _sha(DATA))]
+
+def test_offset_gap_is_rejected(mgr, tmp_path):
+    s = _create(mgr, tmp_path)
+    with pytest.raises(UploadError) as e: _put(mgr, s["id"], HALF, DATA[HALF:])
+    assert e.value.code == 409 and e.value.offset == 0
+
+def test_corrupt_retransmit_rolls_back(mgr, tmp_path):
+    s = _create(mgr, tmp_path)
+    _put(mgr, s["id"], 0, DATA[:HALF])
+    # 重传第一块但校验失败：已确认的位置必须回退，坏数据不能留在 .part 里
+    with pytest.raises(UploadError) as e: _put(mgr, s["id"], 0, b"\0" * HALF, _sha(DATA[:HALF]))
+    assert e.value.offset == 0
+    assert mgr.status(s["id"])["received"] == 0 and os.path.getsize(s["part"]) == 0
+    _put(mgr, s["id"], 0, DATA[:HALF]); r = _put(mgr, s["id"], HALF, DATA[HALF:])
+    with open(r["path"], 'rb') as f: assert f.read() == DATA
+
+def test_short_chunk_is_not_confirmed(mgr, tmp_path):
+    s = _create(mgr, tmp_path)
+    with pytest.raises(UploadError): mgr.write_chunk(s["id"], 0, io.BytesIO(DATA[:100]), HALF)
+    assert mgr.status(s["id"])["received"] == 0 and os.path.getsize(s["part"]) == 0
+
+def test_abort_removes_session(mgr, tmp_path):
+    s = _create(mgr, tmp_path); _put(mgr, s["id"], 0, DATA[:HALF])
+    mgr.abort(s["id"])
+    assert not os.path.exists(s["part"]) and not mgr._locks
+    with pytest.raises(UploadError): mgr.status(s["id"])
@@ -0,0 +1,78 @@
+import os
+import pytest
+import watcher as W
+
+@pytest.fixture
+def tree(tmp_path):
+    for d in ("a/x", "a/y", "b"): (tmp_path / d).mkdir(parents=True)
+    for f in ("a/x/1.mp4", "a/y/2.mp4", "b/3.mp4"): (tmp_path / f).write_bytes(b"v")
+    return tmp_path
+
+@pytest.fixture
+def poller(tree, monkeypatch):
+    w = W.FsWatcher([str(tree)]); w.listed = []; w.gone = []
+    real = os.scandir
+    monkeypatch.setattr(W.os, "scandir", lambda d: (w.listed.append(os.path.relpath(d, tree)), real(d))[1])
+    monkeypatch.setattr(w, "_removed", lambda p: w.gone.append(os.path.relpath(p, tree)))
+    w._snapshot(initial=True); w.listed.clear()
+    return w
+
+def _bump(d): st = os.stat(d); os.utime(d, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+def test_poll_lists_only_changed_directories(tree, poller):
+    poller._snapshot()
+    assert poller.listed == [] # 没有变化：只 stat 目录，不列举
+    (tree / "a/y/4.mp4").write_bytes(b"v"); _bump(tree / "a/y")
+    poller._snapshot()
+    assert poller.listed == ["a/y"] and str(tree / "a/y/4.mp4") in poller._pending
+
+def test_poll_picks_up_new_and_removed_subtrees(tree, poller):
+    (tree / "a/z").mkdir(); (tree / "a/z/5.mp4").write_bytes(b"v"); _bump(tree / "a")
+    poller._snapshot()
+    assert sorted(poller.listed) == ["a", "a/z"] and str(tree / "a/z/5.mp4") in poller._pending
+    (tree / "b/3.mp4").unlink(); (tree / "b").rmdir(); _bump(tree)
+    poller._snapshot()
+    assert poller.gone == ["b/3.mp4"] and str(tree / "b") not in poller._dirs
+
+class _Ino:
+    def __init__(self): self.trees = []
+    def add_tree(self, p): self.trees.append(p)
+
+@pytest.fixture
+def spy(tmp_path, monkeypatch):
+    w = W.FsWatcher([str(tmp_path)]); w.calls = []; w.ino = _Ino()
+    for name in ("_moved", "_moved_tree", "_removed", "_removed_tree", "_changed"):
+        monkeypatch.setattr(w, name, lambda *a, name=name: w.calls.append((name,) + a))
+    monkeypatch.setattr(w, "_dir_changed", lambda d: None)
+    return w
+
+def test_rename_pairs_moved_from_with_moved_to(spy):
+    spy._on_inotify(spy.ino, "/v/a.mp4", W.IN_MOVED_FROM, 7)
+    spy._on_inotify(spy.ino, "/v/b.mp4", W.IN_MOVED_FROM, 8) # 两个改名交错
+    assert spy.calls == [] and set(spy._moves) == {7, 8}
+    spy._on_inotify(spy.ino, "/v/d/b.mp4", W.IN_MOVED_TO, 8)
+    spy._on_inotify(spy.ino, "/v/c.mp4", W.IN_MOVED_TO, 7)
+    assert spy.calls == [("_moved", "/v/b.mp4", "/v/d/b.mp4"), ("_changed", "/v/d/b.mp4"),
+                         ("_moved", "/v/a.mp4", "/v/c.mp4"), ("_changed", "/v/c.mp4")]
+    spy._expire_moves()
+    assert not spy._moves and len(spy.calls) == 4 # 配上的不会再按删除处理
+
+def test_unpaired_moves(spy, monkeypatch):
+    spy._on_inotify(spy.ino, "/v/in.mp4", W.IN_MOVED_TO, 9) # 从监视范围外移入：当新文件
+    assert spy.calls == [("_changed", "/v/in.mp4")]
+    spy._on_inotify(spy.ino, "/v/out.mp4", W.IN_MOVED_FROM, 10)
+    spy._expire_moves()
+    assert spy.calls[1:] == [] # 宽限期内继续等
+    monkeypatch.setattr(W, "MOVE_GRACE", 0)
+    spy._expire_moves()
+    assert spy.calls[1:] == [("_removed", "/v/out.mp4")] and not spy._moves
+    spy._on_inotify(spy.ino, "/v/late.mp4", W.IN_MOVED_TO, 10) # 超时后才到的 MOVED_TO 不再配对
+    assert spy.calls[-1] == ("_changed", "/v/late.mp4")
+
+def test_directory_rename(spy, monkeypatch):
+    spy._on_inotify(spy.ino, "/v/old", W.IN_MOVED_FROM | W.IN_ISDIR, 11)
+    spy._on_inotify(spy.ino, "/v/new", W.IN_MOVED_TO | W.IN_ISDIR, 11)
+    assert spy.calls == [("_moved_tree", "/v/old", "/v/new")] and spy.ino.trees == ["/v/new"]
+    monkeypatch.setattr(W, "MOVE_GRACE", 0)
+    spy._on_inotify(spy.ino, "/v/gone", W.IN_MOVED_FROM | W.IN_ISDIR, 12); spy._expire_moves()
+    assert spy.calls[-1] == ("_removed_tree", "/v/gone")
@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import heapq
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config import VIDEO_DIR, THUMB_DIR, THUMB_WORKERS
+from events import bus
+from metrics import gauge
+from catalog import probe_stat
+from utils import render_stat
+
+PRIO_BACKGROUND = 0 # 上传/扫描等后台任务，排在所有浏览请求之后
+
+def _worker_init():
+    # 降低子进程优先级，避免与 VLC 争抢 CPU
+    try:
+        if sys.platform.startswith('win'):
+            import psutil; psutil.Process().nice(psutil.BELOW_NORMAL_PRIORITY_CLASS)
+        else: os.nice(10)
+    except: pass
+
+def _render(vp, tp, force):
+    """子进程内执行：解码生成缩略图并顺带探测元数据，主进程只负责入库；
+    返回 (元数据, 缩略图耗时 ms 或 None, 探测耗时 ms)，耗时由主进程计入统计"""
+    from utils import render_thumbnail
+    from catalog import probe_video
+    os.makedirs(os.path.dirname(tp), exist_ok=True)
+    rms = None; t0 = time.perf_counter()
+    if force or not os.path.exists(tp): render_thumbnail(vp, tp); rms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter(); info = probe_video(vp)
+    return info, rms, (time.perf_counter() - t0) * 1000
+
+class ThumbnailPool:
+    """后台缩略图生成：有界进程池 + 优先队列，最近浏览的文件夹最先处理"""
+    def __init__(self, workers):
+        self.workers = max(1, workers)
+        self._cond = threading.Condition()
+        self._heap = []           # (-优先级, 序号, 缩略图路径)
+        self._pending = {}        # 缩略图路径 -> [优先级, 视频路径, 是否强制重新生成]
+        self._inflight = 0
+        self._seq = itertools.count()
+        self._gen = itertools.count(1)
+        self._executor = None
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None:
+            # spawn：Flask/Tk 多线程进程中 fork 不安全
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=_worker_init)
+            self._thread = threading.Thread(target=self._dispatch, daemon=True); self._thread.start()
+
+    def new_priority(self):
+        """每次浏览分配一个更高的优先级，让当前查看的文件夹插队"""
+        return next(self._gen)
+
+    def is_pending(self, tp):
+        return tp in self._pending
+
+    def submit(self, vp, tp, prio=PRIO_BACKGROUND, force=False):
+        """排队生成 (重复提交只会提升优先级)；已存在的缩略图除非 force 否则只补登记"""
+        with self._cond:
+            self._ensure_started()
+            cur = self._pending.get(tp)
+            if cur is not None:
+                cur[2] = cur[2] or force
+                if cur[0] >= prio: return
+                cur[0] = prio
+            else: self._pending[tp] = [prio, vp, force]
+            heapq.heappush(self._heap, (-prio, next(self._seq), tp))
+            self._cond.notify()
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._inflight >= self.workers: self._cond.wait()
+                negp, _, tp = heapq.heappop(self._heap)
+                cur = self._pending.get(tp)
+                if cur is None or cur[0] != -negp: continue # 已被更高优先级的条目取代
+                self._inflight += 1; vp, force = cur[1], cur[2]
+            try: fut = self._executor.submit(_render, vp, tp, force)
+            except Exception as e:
+                print(f"Thumbnail Pool Error: {e}"); self._finish(vp, tp, None); continue
+            fut.add_done_callback(lambda f, vp=vp, tp=tp: self._finish(vp, tp, f))
+
+    def _finish(self, vp, tp, fut):
+        from utils import record_thumbnail, make_placeholder
+        info = None
+        try:
+            if fut:
+                info, rms, pms = fut.result(); probe_stat.observe(pms)
+                if rms is not None: render_stat.observe(rms)
+        except Exception as e: print(f"Thumbnail Error: {e}")
+        if not os.path.exists(tp): make_placeholder(tp)
+        v = record_thumbnail(vp, tp, info, probe=False) # 子进程失败 (info 为空) 时不在回调线程里用 cv2 现场探测
+        with self._cond:
+            self._pending.pop(tp, None); self._inflight -= 1; self._cond.notify()
+        try: ts = int(os.path.getmtime(tp))
+        except OSError: ts = 0
+        ev = {"path": os.path.relpath(vp, VIDEO_DIR).replace('\\', '/'), "thumb": os.path.relpath(tp, THUMB_DIR).replace('\\', '/'), "ts": ts, "v": v or ""}
+        if info: ev["duration"] = info["duration"]
+        bus.publish("thumb", ev)
+
+# 全局单例
+thumb_pool = ThumbnailPool(THUMB_WORKERS)
+gauge("thumb_queue_depth", "thumbnails queued or rendering", lambda: len(thumb_pool._pending))
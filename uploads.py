@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from config import UPLOAD_STATE_DIR
+
+CHUNK_READ = 1 << 20
+SESSION_TTL = 7 * 86400 # 超过一周未续传的会话自动清理
+
+class UploadError(Exception):
+    def __init__(self, msg, code=400, offset=None):
+        super().__init__(msg); self.code = code; self.offset = offset
+
+class UploadManager:
+    """可续传分块上传：每个上传 ID 对应目标目录下的一个 .part 文件，
+    分块按偏移直接写入 (无临时文件二次拷贝)，最后一块到达后原子改名为最终文件"""
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._digests = {} # 上传 ID -> [sha256 对象, 已计入的字节数]，分块写入时顺带计算整文件哈希
+        self.on_complete = None # 回调 (最终路径, 缩略图目录, sha256)，由路由层注册
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _meta_path(self, uid): return os.path.join(self.state_dir, uid + ".json")
+
+    def _load(self, uid):
+        if not uid or not all(c in "0123456789abcdef" for c in uid): raise UploadError("bad id", 404)
+        try:
+            with open(self._meta_path(uid), 'r', encoding='utf-8') as f: return json.load(f)
+        except (OSError, ValueError): raise UploadError("unknown upload", 404)
+
+    def _save(self, s):
+        tmp = self._meta_path(s["id"]) + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(s, f, ensure_ascii=False)
+        os.replace(tmp, self._meta_path(s["id"]))
+
+    def _session_lock(self, uid):
+        with self._lock: return self._locks.setdefault(uid, threading.Lock())
+
+    def _drop_lock(self, uid):
+        """会话结束 (完成/放弃) 后移除其锁，锁表不随上传次数增长"""
+        with self._lock: self._locks.pop(uid, None)
+
+    def create(self, av, at, name, size, resume=None, fingerprint=None):
+        """新建或续接。只有客户端带回自己的上传 ID (resume)，或给出与中断会话相同的内容指纹 (fingerprint) 时才续接，
+        返回已收到的偏移；仅同名同大小不续接 (可能是另一个客户端的不同内容)"""
+        self.purge()
+        final = os.path.join(av, name)
+        if resume:
+            try: s = self._load(resume)
+            except UploadError: s = None
+            if s and self._resumable(s, final, size): return s
+        if fingerprint:
+            for f in os.listdir(self.state_dir):
+                if not f.endswith(".json"): continue
+                try: s = self._load(f[:-5])
+                except UploadError: continue
+                if s.get("fp") == fingerprint and self._resumable(s, final, size): return s
+        uid = uuid.uuid4().hex
+        s = {"id": uid, "path": final, "thumb_dir": at, "part": f"{final}.{uid}.part", "size": int(size), "received": 0,
+             "fp": fingerprint or None, "updated": time.time()}
+        open(s["part"], 'wb').close()
+        self._save(s)
+        return s
+
+    @staticmethod
+    def _resumable(s, final, size):
+        if s["path"] != final or s["size"] != size or not os.path.exists(s["part"]): return False
+        s["received"] = min(s["received"], os.path.getsize(s["part"])); return True
+
+    def status(self, uid):
+        return self._load(uid)
+
+    def write_chunk(self, uid, offset, stream, length, sha256=None):
+        """把请求体直接写到 .part 的 offset 处；offset 只能是已确认的位置 (重传最后一块时可以更小)"""
+        with self._session_lock(uid):
+            try: s = self._load(uid)
+            except UploadError: self._drop_lock(uid); raise
+            if offset > s["received"]: raise UploadError("offset gap", 409, s["received"])
+            if length is None or offset + length > s["size"]: raise UploadError("bad length", 400, s["received"])
+            h = hashlib.sha256(); n = 0; bad = None
+            d = self._digests.get(uid)
+            if d is None and offset == 0: d = self._digests[uid] = [hashlib.sha256(), 0]
+            # 只有顺序续写时才能增量计算整文件哈希；重传已计入的区域则放弃，完成时补算一遍
+            fh = d[0].copy() if d and d[1] == offset else None
+            if d and offset < d[1]: self._digests.pop(uid, None)
+            with open(s["part"], 'r+b') as f:
+                f.seek(offset)
+                while n < length:
+                    b = stream.read(min(CHUNK_READ, length - n))
+                    if not b: break
+                    f.write(b); h.update(b); n += len(b)
+                    if fh: fh.update(b)
+                if n != length or (sha256 and h.hexdigest() != sha256.lower()):
+                    # 分块不完整或校验失败：坏数据可能已覆盖了已确认的区域 (重传)，截断到 offset 并回退确认位置
+                    f.truncate(offset); bad = "checksum mismatch" if n == length else "short chunk"
+                else: f.flush(); os.fsync(f.fileno())
+            if bad:
+                if offset < s["received"]:
+                    s["received"] = offset; s["updated"] = time.time(); self._save(s)
+                raise UploadError(bad, 400, s["received"])
+            if fh: d[0] = fh; d[1] = offset + n
+            s["received"] = max(s["received"], offset + n); s["updated"] = time.time()
+            if s["received"] >= s["size"]: return self._finish(s)
+            self._save(s)
+            return s
+
+    def _finish(self, s):
+        d = self._digests.pop(s["id"], None)
+        digest = d[0].hexdigest() if d and d[1] == s["size"] else None # 进程重启后续传的没有增量哈希
+        os.replace(s["part"], s["path"])
+        try: os.remove(self._meta_path(s["id"]))
+        except OSError: pass
+        self._drop_lock(s["id"])
+        s["done"] = True
+        if self.on_complete: s["dedup"] = self.on_complete(s["path"], s["thumb_dir"], digest)
+        return s
+
+    def abort(self, uid):
+        try:
+            with self._session_lock(uid):
+                s = self._load(uid); self._digests.pop(uid, None)
+                for p in (s["part"], self._meta_path(uid)):
+                    try: os.remove(p)
+                    except OSError: pass
+        finally: self._drop_lock(uid)
+
+    def purge(self):
+        now = time.time()
+        for f in os.listdir(self.state_dir):
+            if not f.endswith(".json"): continue
+            try: s = self._load(f[:-5])
+            except UploadError: continue
+            if now - s.get("updated", 0) > SESSION_TTL: self.abort(s["id"])
+
+# 全局单例
+uploads = UploadManager(UPLOAD_STATE_DIR)
@@ -1,26 +1,32 @@
 import os
-import cv2
 import socket
-import qrcode
-import psutil
 import time
 import sys
 import re
 import platform
 import threading
+import hashlib
+from collections import OrderedDict
 from PIL import Image, ImageDraw, ImageOps, ImageFont
-from config import VIDEO_DIR, THUMB_DIR, IDLE_DIR, PORT, ALLOWED_VIDEO_EXT, ALLOWED_IMG_EXT
+from config import VIDEO_DIR, THUMB_DIR, IDLE_DIR, PORT, ALLOWED_VIDEO_EXT, ALLOWED_IMG_EXT, SYS_SAMPLE_INTERVAL, SYS_HISTORY_RAW, SYS_HISTORY_DAYS
+from catalog import catalog
+from history import History
+from metrics import latency, gauge
 
-# 硬件依赖
-try: import GPUtil
-except ImportError: GPUtil = None
+# 硬件依赖：cv2 / qrcode / psutil / GPUtil / wmi 导入都较慢，推迟到首次使用 (监控线程、缩略图、生成待机图)，不拖慢开机首帧
+GPUtil = wmi = pythoncom = None
+def _load_hw():
+    global GPUtil, wmi, pythoncom
+    try: import GPUtil
+    except ImportError: GPUtil = None
+    try:
+        import wmi
+        import pythoncom
+    except ImportError:
+        wmi = None
+        pythoncom = None
 
-try: 
-    import wmi
-    import pythoncom
-except ImportError: 
-    wmi = None
-    pythoncom = None
+SYS_BG = "_system_default_bg.jpg" # 系统生成的二维码待机图
 
 # --- 独立的硬件监控线程类 ---
 class HardwareMonitor:
@@ -31,6 +37,10 @@ class HardwareMonitor:
             "gpu_v": 0, "gpu_n": "Detecting...",
             "net_up": "0 B/s", "net_down": "0 B/s"
         }
+        self.seq = 0 # 每次采样递增，供增量推送判断是否变化
+        self.raw = {} # 最近一次采样的原始数值 (百分比 / 字节每秒)，供 /metrics 导出
+        self.interval = SYS_SAMPLE_INTERVAL
+        self.history = History(SYS_SAMPLE_INTERVAL, SYS_HISTORY_RAW, SYS_HISTORY_DAYS)
         self._stop_event = False
         self._last_net_io = None
         self._last_net_time = 0
@@ -96,6 +106,8 @@ class HardwareMonitor:
         return usage, self._simplify_name(name)
 
     def _loop(self):
+        import psutil
+        _load_hw()
         # 1. 初始化静态信息 (仅一次)
         cpu_name = self._get_cpu_name()
         gpu_name_cache = "Integrated"
@@ -124,7 +136,7 @@ class HardwareMonitor:
                     if w_n: gpu_name_cache = w_n
 
                 # NET
-                net_u = "0 B/s"; net_d = "0 B/s"
+                net_u = "0 B/s"; net_d = "0 B/s"; sent = recv = 0.0
                 curr_io = psutil.net_io_counters()
                 curr_time = time.time()
                 if self._last_net_io and self._last_net_time:
@@ -149,13 +161,26 @@ class HardwareMonitor:
                     "gpu_v": round(gpu_v, 1), "gpu_n": gpu_name_cache,
                     "net_up": net_u, "net_down": net_d
                 }
+                self.seq += 1
+                self.raw = {"cpu": cpu_v, "mem": mem_v, "gpu": gpu_v, "net_up": sent, "net_down": recv, "playing": self._playing()}
+                self.history.add(curr_time, self.raw)
             except Exception as e:
                 print(f"Monitor Error: {e}")
             
-            time.sleep(1.5) # 1.5秒刷新一次，足够快且不卡
+            time.sleep(self.interval) # 默认 1.5 秒刷新一次，足够快且不卡
+
+    def _playing(self):
+        from context import ctx
+        try: return 1 if ctx.player and ctx.player.is_playing() else 0
+        except: return 0
 
 # 全局单例
 sys_monitor = HardwareMonitor()
+for _k, _n, _h in (("cpu", "sys_cpu_percent", "CPU usage"), ("mem", "sys_memory_percent", "memory usage"), ("gpu", "sys_gpu_percent", "GPU usage"),
+                   ("net_up", "sys_net_up_bytes_per_second", "network upload rate"), ("net_down", "sys_net_down_bytes_per_second", "network download rate"),
+                   ("playing", "player_playing", "1 while a clip is playing")):
+    gauge(_n, _h + " (hardware monitor sample)", lambda k=_k: sys_monitor.raw.get(k))
+gauge("sys_monitor_samples", "hardware monitor samples taken", lambda: sys_monitor.seq)
 
 def exec_sys_command(cmd):
     if cmd == 'shutdown':
@@ -176,17 +201,20 @@ def resolve_path(subpath):
     if not abs_v.startswith(os.path.abspath(VIDEO_DIR)): return None, None
     return abs_v, abs_t
 def get_video_duration(p):
-    try:
-        c = cv2.VideoCapture(p)
-        if c.isOpened():
-            f = c.get(cv2.CAP_PROP_FRAME_COUNT); fps = c.get(cv2.CAP_PROP_FPS); c.release()
-            if fps > 0: return int(f/fps)
-    except: pass
-    return 0
+    # 走元数据目录：命中索引直接返回，文件新增/变化时才打开解码器
+    try: return catalog.get_duration(p)
+    except: return 0
+render_stat = latency("thumb_render", "thumbnail decode + encode time")
 def generate_thumbnail(vp, td, fn, force=False):
     if not os.path.exists(td): os.makedirs(td, exist_ok=True)
     tn = fn + ".jpg"; tp = os.path.join(td, tn)
     if os.path.exists(tp) and not force: return tn
+    with render_stat.time(): render_thumbnail(vp, tp)
+    record_thumbnail(vp, tp)
+    return tn
+def render_thumbnail(vp, tp):
+    """纯解码 + 写 JPG，不访问元数据目录 (可在子进程中执行)"""
+    import cv2
     try:
         c = cv2.VideoCapture(vp)
         if c.isOpened():
@@ -196,19 +224,63 @@ def generate_thumbnail(vp, td, fn, force=False):
                 r = cv2.resize(f, (320, 180)); cv2.imencode(".jpg", r)[1].tofile(tp)
         c.release()
     except: pass
-    if not os.path.exists(tp):
-        try: i = Image.new('RGB', (320, 180), (44,44,46)); ImageDraw.Draw(i).ellipse((130,60,190,120), outline=(0,122,255), width=3); i.save(tp)
-        except: pass
-    return tn
+    if not os.path.exists(tp): make_placeholder(tp)
+def make_placeholder(tp):
+    try: i = Image.new('RGB', (320, 180), (44,44,46)); ImageDraw.Draw(i).ellipse((130,60,190,120), outline=(0,122,255), width=3); i.save(tp)
+    except: pass
+THUMB_VER_MAX = 20000 # 缩略图版本缓存条数上限 (最近使用的保留)
+_thumb_ver = OrderedDict() # 视频绝对路径 -> 缩略图内容哈希 (URL 版本号)；请求线程并发读写，持锁访问
+_thumb_ver_lock = threading.Lock()
+def _set_thumb_ver(ap, v):
+    with _thumb_ver_lock:
+        _thumb_ver[ap] = v; _thumb_ver.move_to_end(ap)
+        while len(_thumb_ver) > THUMB_VER_MAX: _thumb_ver.popitem(last=False)
+def forget_thumb_version(p, tree=False):
+    """文件删除/改名后丢弃缓存的版本 (tree=True 时连同目录下的全部文件)"""
+    ap = os.path.abspath(p)
+    with _thumb_ver_lock:
+        _thumb_ver.pop(ap, None)
+        if tree:
+            for k in [k for k in _thumb_ver if k.startswith(ap + os.sep)]: del _thumb_ver[k]
+def thumb_digest(tp):
+    with open(tp, 'rb') as f: return hashlib.sha1(f.read()).hexdigest()[:16]
+def record_thumbnail(vp, tp, info=None, probe=True):
+    """把缩略图 mtime 与内容哈希写入元数据目录，列表页不再逐个 stat；返回哈希。probe=False 时目录没有记录也不现场探测"""
+    try:
+        v = thumb_digest(tp); catalog.record_thumb(vp, os.path.basename(tp), os.path.getmtime(tp), info, v, probe)
+        _set_thumb_ver(os.path.abspath(vp), v); return v
+    except: return None
+def thumb_version(vp):
+    ap = os.path.abspath(vp)
+    with _thumb_ver_lock:
+        v = _thumb_ver.get(ap)
+        if v is not None: _thumb_ver.move_to_end(ap); return v
+    m = catalog.lookup(ap, probe=False); v = (m or {}).get("thumb_hash")
+    if not v:
+        # 旧记录没有哈希：缩略图已存在时补算一次 (只算哈希，目录没有记录也不在请求线程里探测视频)
+        tp = os.path.join(THUMB_DIR, os.path.relpath(ap, VIDEO_DIR) + ".jpg")
+        v = record_thumbnail(ap, tp, probe=False) if os.path.exists(tp) else None
+    v = v or ""; _set_thumb_ver(ap, v)
+    return v
 def get_thumb_url_by_path(fp):
-    try: return f"/thumbs/{os.path.relpath(fp, VIDEO_DIR).replace('\\', '/')}.jpg"
+    # 带内容哈希的地址可被浏览器永久缓存，缩略图变化时地址随之变化
+    try:
+        v = thumb_version(fp); rel = os.path.relpath(fp, VIDEO_DIR).replace('\\', '/') # f-string 表达式里不能有反斜杠 (3.12 之前)
+        return f"/thumbs/{rel}.jpg" + (f"?v={v}" if v else "")
     except: return ""
 def get_local_ip():
     try: s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM); s.connect(("8.8.8.8", 80)); ip = s.getsockname()[0]; s.close(); return ip
     except: return "127.0.0.1"
-def create_system_background():
+def system_bg_key(): return f"{get_local_ip()}:{PORT}"
+def ensure_system_background(last_key):
+    """二维码内容只取决于 IP 和端口：与上次相同且图片仍在时直接沿用，返回 (文件名, 键, 是否重新生成)"""
+    key = system_bg_key()
+    if key == last_key and os.path.exists(os.path.join(IDLE_DIR, SYS_BG)): return SYS_BG, key, False
+    return create_system_background(key.rsplit(':', 1)[0]), key, True
+def create_system_background(ip=None):
+    import qrcode
     try:
-        ip = get_local_ip(); url = f"http://{ip}:{PORT}"; w, h = 1920, 1080
+        ip = ip or get_local_ip(); url = f"http://{ip}:{PORT}"; w, h = 1920, 1080
         img = Image.new('RGB', (w, h), (20, 20, 22)); draw = ImageDraw.Draw(img)
         qr = qrcode.QRCode(box_size=10, border=2); qr.add_data(url); qr.make(fit=True)
         qri = qr.make_image(fill_color="black", back_color="white").resize((300, 300), Image.Resampling.LANCZOS)
@@ -222,5 +294,5 @@ def create_system_background():
         dt("LED Pro Media Player", qy-100, (255,255,255), font)
         dt(f"Control: {url}", qy+330, (0,160,255), sfont)
         dt("Scan QR to connect", qy+390, (180,180,180), sfont)
-        fn = "_system_default_bg.jpg"; img.save(os.path.join(IDLE_DIR, fn), quality=95); return fn
+        img.save(os.path.join(IDLE_DIR, SYS_BG), quality=95); return SYS_BG
     except: return None
\ No newline at end of file
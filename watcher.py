@@ -0,0 +1,314 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+from config import VIDEO_DIR, THUMB_DIR, IDLE_DIR, WATCH_POLL, WATCH_SETTLE
+from events import bus
+
+# inotify 常量 (linux/inotify.h)
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM, IN_MOVED_TO = 0x2, 0x8, 0x40, 0x80
+IN_CREATE, IN_DELETE, IN_DELETE_SELF, IN_MOVE_SELF = 0x100, 0x200, 0x400, 0x800
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR, IN_NONBLOCK = 0x4000, 0x8000, 0x40000000, 0x800
+_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EV = struct.Struct("iIII")
+MOVE_GRACE = 0.5 # MOVED_FROM 等待配对 MOVED_TO 的时间；超时视为移出监视范围 (删除)
+OWN_TTL = 10.0   # 本进程自己改名的路径在这段时间内不按外部变化处理
+
+class _Inotify:
+    """ctypes 封装的 inotify，递归监视目录树"""
+    def __init__(self):
+        import ctypes, ctypes.util
+        self.ctypes = ctypes
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK)
+        if self.fd < 0: raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.wds = {} # wd -> 目录
+
+    def add_tree(self, root):
+        for d, dirs, _ in os.walk(root): self.add(d)
+
+    def add(self, d):
+        """添加失败 (如超出 max_user_watches) 时抛 OSError：有目录没被监视就不能信任缓存"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(d), _MASK)
+        if wd >= 0: self.wds[wd] = d; return
+        e = self.ctypes.get_errno()
+        if e not in (errno.ENOENT, errno.ENOTDIR): raise OSError(e, f"inotify_add_watch {d}: {os.strerror(e)}") # 目录刚被删除的不算
+
+    def close(self):
+        try: os.close(self.fd)
+        except OSError: pass
+
+    def read(self, timeout):
+        """返回 [(路径, mask, cookie)]；队列溢出时返回 None (需要全量重扫)"""
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r: return []
+        try: buf = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN: return []
+            raise
+        out = []; off = 0
+        while off + _EV.size <= len(buf):
+            wd, mask, cookie, ln = _EV.unpack_from(buf, off); off += _EV.size
+            name = os.fsdecode(buf[off:off + ln].rstrip(b"\0")); off += ln
+            if mask & IN_Q_OVERFLOW: return None
+            d = self.wds.get(wd)
+            if mask & IN_IGNORED: self.wds.pop(wd, None); continue
+            if d is None: continue
+            out.append((os.path.join(d, name) if name else d, mask, cookie))
+        return out
+
+class FsWatcher:
+    """监视 VIDEO_DIR / IDLE_DIR：Linux 用 inotify，其它平台轮询目录 mtime 快照；
+    新文件等大小和 mtime 稳定 WATCH_SETTLE 秒后 (拷贝结束) 才生成缩略图并发出 fs 事件"""
+    def __init__(self, roots, settle=WATCH_SETTLE, poll=WATCH_POLL):
+        self.roots = [os.path.abspath(r) for r in roots]
+        self.settle = settle; self.poll = poll
+        self.backend = None
+        self._pending = {}   # 文件 -> (size, mtime_ns, 最后变化时间)
+        self._dirs = {}      # 轮询模式：目录 -> mtime_ns
+        self._files = {}     # 轮询模式：目录 -> {文件: (size, mtime_ns)}
+        self._subdirs = {}   # 轮询模式：目录 -> [子目录]，上一轮的目录树，未变化的目录不再列举
+        self._moves = {}     # inotify cookie -> (原路径, 是否目录, 时间)：等待配对的 MOVED_FROM
+        self._own = {}       # 本进程正在改名的路径 -> 过期时间 (请求/任务线程写入，监视线程消费，持锁访问)
+        self._own_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread: return
+        self._thread = threading.Thread(target=self._run, daemon=True); self._thread.start()
+
+    def expect(self, *paths):
+        """本进程自己改名/移动这些路径 (元数据与缩略图由调用方迁移)：对应的文件事件只刷新列表"""
+        t = time.monotonic() + OWN_TTL
+        with self._own_lock:
+            for p in paths: self._own[os.path.abspath(p)] = t
+
+    def _is_own(self, p):
+        """命中即消费：同一路径之后的变化 (如再被移走) 仍按外部变化处理"""
+        now = time.monotonic()
+        with self._own_lock:
+            for k in [k for k, t in self._own.items() if t < now]: self._own.pop(k, None)
+            return self._own.pop(os.path.abspath(p), None) is not None
+
+    # --- 后端 ---
+    def _run(self):
+        ino = None
+        if sys.platform.startswith('linux'):
+            try:
+                ino = _Inotify()
+                for r in self.roots: ino.add_tree(r)
+            except Exception as e: print(f"Watcher: inotify unavailable ({e}), polling"); ino = None
+        self.backend = "inotify" if ino else "poll"
+        if not ino: self._snapshot(initial=True)
+        # 只有 inotify 能及时失效缓存；轮询可能落后一整个间隔，列表/待机图缓存仍自行检查 mtime
+        self._trust(bool(ino))
+        tick = min(self.poll, self.settle / 2); walked = time.monotonic()
+        while True:
+            try:
+                busy = self._pending or self._moves
+                if ino:
+                    try:
+                        evs = ino.read(tick if busy else self.poll)
+                        if evs is None: self._snapshot(initial=True); self._dirty_all()
+                        else:
+                            for p, mask, cookie in evs: self._on_inotify(ino, p, mask, cookie)
+                    except OSError as e:
+                        # 监视添加失败/读取出错：退回轮询，缓存全部作废重新列举
+                        print(f"Watcher: inotify failed ({e}), polling"); ino.close(); ino = None; self.backend = "poll"; self._trust(False)
+                        self._snapshot(initial=True); self._dirty_all(); walked = time.monotonic()
+                    self._expire_moves()
+                else:
+                    # 目录树按 WATCH_POLL 间隔遍历；较短的 settle 节拍只复查待定文件
+                    time.sleep(tick if busy else self.poll)
+                    if time.monotonic() - walked >= self.poll: self._snapshot(); walked = time.monotonic()
+                self._check_pending()
+            except Exception as e: print(f"Watcher Error: {e}"); time.sleep(1)
+
+    def _on_inotify(self, ino, p, mask, cookie=0):
+        d = os.path.dirname(p)
+        if mask & IN_MOVED_FROM and cookie:
+            # 先记下，等同一 cookie 的 MOVED_TO：配上了是改名，超时才算删除
+            self._moves[cookie] = (p, bool(mask & IN_ISDIR), time.monotonic()); self._dir_changed(d); return
+        src = self._moves.pop(cookie, None) if mask & IN_MOVED_TO and cookie else None
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                ino.add_tree(p)
+                if src: self._moved_tree(src[0], p)
+                self._dir_changed(d); self._dir_changed(p)
+            elif mask & (IN_DELETE | IN_MOVED_FROM): self._removed_tree(p); self._dir_changed(d)
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF): return
+        if mask & (IN_DELETE | IN_MOVED_FROM): self._removed(p); self._dir_changed(d)
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+            if src: self._moved(src[0], p)
+            self._changed(p); self._dir_changed(d)
+        elif mask & (IN_MODIFY | IN_CLOSE_WRITE): self._changed(p)
+
+    def _expire_moves(self):
+        now = time.monotonic()
+        for c, (p, isdir, t) in list(self._moves.items()):
+            if now - t < MOVE_GRACE: continue
+            self._moves.pop(c, None)
+            if isdir: self._removed_tree(p)
+            else: self._removed(p)
+
+    def _snapshot(self, initial=False):
+        """轮询：沿上一轮的目录树逐个 stat 目录 mtime，只对变化的目录重新列举
+        (网络共享上的大素材库不再每轮 os.walk 全部目录)"""
+        seen = set(); stack = list(self.roots)
+        while stack:
+            d = stack.pop(); seen.add(d)
+            try: mt = os.stat(d).st_mtime_ns
+            except OSError: continue
+            old = self._files.get(d)
+            if self._dirs.get(d) == mt and old is not None and not self._growing(d):
+                stack.extend(self._subdirs.get(d, ())); continue # 子目录自身的变化不影响父目录 mtime，仍要逐个 stat
+            self._dirs[d] = mt; cur = {}; subs = []
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.is_dir(follow_symlinks=False): subs.append(e.path)
+                        elif e.is_file(): st = e.stat(); cur[e.path] = (st.st_size, st.st_mtime_ns)
+            except OSError: continue
+            self._files[d] = cur; self._subdirs[d] = subs; stack.extend(subs)
+            if initial: continue
+            if old is None: self._dir_changed(os.path.dirname(d))
+            changed = False
+            for p, sig in cur.items():
+                if old is None or old.get(p) != sig: self._changed(p); changed = changed or p not in (old or {})
+            for p in (old or {}):
+                if p not in cur: self._removed(p); changed = True
+            if changed: self._dir_changed(d)
+        for d in [d for d in self._dirs if d not in seen]:
+            self._dirs.pop(d, None); self._subdirs.pop(d, None)
+            for p in self._files.pop(d, {}): self._removed(p)
+            if not initial: self._dir_changed(os.path.dirname(d))
+
+    def _growing(self, d):
+        # 目录 mtime 不会因文件追加写入而变化：有待定文件的目录每轮都要重列
+        return any(os.path.dirname(p) == d for p in self._pending)
+
+    # --- 变化处理 ---
+    def _changed(self, p):
+        try: st = os.stat(p)
+        except OSError: return
+        old = self._pending.get(p)
+        if not old or old[0] != st.st_size or old[1] != st.st_mtime_ns:
+            self._pending[p] = (st.st_size, st.st_mtime_ns, time.monotonic())
+
+    def _check_pending(self):
+        now = time.monotonic()
+        for p, (size, mt, t) in list(self._pending.items()):
+            try: st = os.stat(p)
+            except OSError: self._pending.pop(p, None); continue
+            if st.st_size != size or st.st_mtime_ns != mt: self._pending[p] = (st.st_size, st.st_mtime_ns, now); continue
+            if now - t >= self.settle: self._pending.pop(p, None); self._stable(p)
+
+    def _stable(self, p):
+        """文件已稳定 (拷贝完成)"""
+        if self._under(p, VIDEO_DIR):
+            from utils import is_video
+            if not is_video(p): return
+            from thumb_pool import thumb_pool
+            tp = os.path.join(THUMB_DIR, os.path.relpath(p, VIDEO_DIR) + ".jpg")
+            # 拷贝过程中可能已按残缺文件生成过缩略图，文件比缩略图新时强制重做
+            try: force = os.path.getmtime(tp) < os.path.getmtime(p)
+            except OSError: force = False
+            thumb_pool.submit(p, os.path.abspath(tp), force=force)
+            self._dir_changed(os.path.dirname(p))
+            bus.publish("fs", {"op": "ready", "root": "videos", "path": os.path.relpath(p, VIDEO_DIR).replace('\\', '/')})
+        elif self._under(p, IDLE_DIR):
+            self._idle_changed()
+            bus.publish("fs", {"op": "ready", "root": "idle", "path": os.path.basename(p)})
+
+    def _moved(self, old, new):
+        """文件改名/移动：元数据与缩略图跟到新路径 (本进程自己改名的由调用方迁移)，不当作删除"""
+        self._pending.pop(old, None)
+        from utils import is_video, forget_thumb_version
+        if not (self._under(old, VIDEO_DIR) and is_video(old)): return
+        if not (self._under(new, VIDEO_DIR) and is_video(new)): self._removed(old); return
+        if not self._is_own(old) | self._is_own(new):
+            from catalog import catalog
+            from decoders import decoders
+            decoders.release(old); catalog.rename(old, new)
+            forget_thumb_version(old); forget_thumb_version(new)
+            self._move_thumb(os.path.relpath(old, VIDEO_DIR) + ".jpg", os.path.relpath(new, VIDEO_DIR) + ".jpg")
+        bus.publish("fs", {"op": "removed", "root": "videos", "path": os.path.relpath(old, VIDEO_DIR).replace('\\', '/')})
+
+    def _moved_tree(self, old, new):
+        for p in [p for p in self._pending if p.startswith(old + os.sep)]: self._pending.pop(p, None)
+        if not (self._under(old, VIDEO_DIR) and self._under(new, VIDEO_DIR)): self._removed_tree(old); return
+        if not self._is_own(old) | self._is_own(new):
+            from catalog import catalog
+            from decoders import decoders
+            from utils import forget_thumb_version
+            decoders.release(old, tree=True); catalog.rename(old, new)
+            forget_thumb_version(old, tree=True); forget_thumb_version(new, tree=True)
+            self._move_thumb(os.path.relpath(old, VIDEO_DIR), os.path.relpath(new, VIDEO_DIR))
+        bus.publish("fs", {"op": "removed", "root": "videos", "path": os.path.relpath(old, VIDEO_DIR).replace('\\', '/'), "dir": True})
+
+    @staticmethod
+    def _move_thumb(orel, nrel):
+        ot = os.path.join(THUMB_DIR, orel); nt = os.path.join(THUMB_DIR, nrel)
+        try:
+            if os.path.exists(ot) and not os.path.exists(nt): os.makedirs(os.path.dirname(nt), exist_ok=True); os.rename(ot, nt)
+        except OSError as e: print(f"Watcher: thumbnail move failed ({e})")
+
+    def _removed(self, p):
+        self._pending.pop(p, None)
+        if self._under(p, VIDEO_DIR):
+            from utils import is_video, forget_thumb_version
+            if not is_video(p): return
+            if self._is_own(p): return # 本进程改名中：旧路径消失是预期的，元数据已由调用方迁移
+            from catalog import catalog
+            from decoders import decoders, sprites
+            decoders.release(p); catalog.forget(p); sprites.forget(p); forget_thumb_version(p)
+            tp = os.path.join(THUMB_DIR, os.path.relpath(p, VIDEO_DIR) + ".jpg")
+            try: os.remove(tp)
+            except OSError: pass
+            bus.publish("fs", {"op": "removed", "root": "videos", "path": os.path.relpath(p, VIDEO_DIR).replace('\\', '/')})
+        elif self._under(p, IDLE_DIR):
+            from catalog import catalog
+            catalog.forget(p); self._idle_changed()
+            bus.publish("fs", {"op": "removed", "root": "idle", "path": os.path.basename(p)})
+
+    def _removed_tree(self, d):
+        for p in [p for p in self._pending if p.startswith(d + os.sep)]: self._pending.pop(p, None)
+        if self._under(d, VIDEO_DIR):
+            if self._is_own(d): return
+            from catalog import catalog
+            from decoders import decoders, sprites
+            from utils import forget_thumb_version
+            decoders.release(d, tree=True); catalog.forget(d, tree=True); sprites.forget(d, tree=True); forget_thumb_version(d, tree=True)
+            bus.publish("fs", {"op": "removed", "root": "videos", "path": os.path.relpath(d, VIDEO_DIR).replace('\\', '/'), "dir": True})
+
+    def _dir_changed(self, d):
+        if self._under(d, VIDEO_DIR) or os.path.abspath(d) == os.path.abspath(VIDEO_DIR):
+            from library import library
+            library.invalidate(d)
+        elif os.path.abspath(d) == os.path.abspath(IDLE_DIR): self._idle_changed()
+
+    def _dirty_all(self):
+        from library import library
+        library.clear(); self._idle_changed()
+
+    def _idle_changed(self):
+        from state import state
+        state.invalidate_bg(); state.touch()
+
+    def _trust(self, on):
+        # 监视生效后，列表/状态接口直接信任缓存，不再逐次 stat 目录
+        from library import library
+        from state import state
+        library.watched = on; state.bg_watched = on
+
+    @staticmethod
+    def _under(p, root):
+        p = os.path.abspath(p); root = os.path.abspath(root)
+        return p.startswith(root + os.sep)
+
+# 全局单例
+watcher = FsWatcher([VIDEO_DIR, IDLE_DIR])